@@ -0,0 +1,217 @@
+"""
+冷数据归档
+
+几乎所有读请求都集中在最新的留言上,但 messages 表和它的索引随时间不断增长。
+长期没有新回复的帖子由本模块整帖(顶层留言及其全部回复,包括回复的回复)移入归档表 messages_archive:
+
+- 帖子本身和所有后代回复都早于 ARCHIVE_CONFIG["after_days"] 天才会归档,
+  后代回复用递归查询沿 parent_id 逐层查找,同一帖子的留言总在同一张表中
+- 按帖子ID顺序分批检查和移动,每批一个事务(先复制到归档表,再从 messages 删除),
+  单个事务只检查 chunk_threads 个帖子,两批之间暂停 chunk_pause_ms 毫秒让出写锁,
+  可以在服务运行时执行,中断后重新执行会从剩余的帖子继续
+- 删除后若 messages 中还有回复指向已移走的留言(复制之后才提交的新回复),整批回滚,
+  下次执行时该帖子会因为有新回复而保留
+- 留言列表和热门排行只读取 messages;按ID读取留言、读取回复和全文搜索会回退到归档表
+- 归档的帖子只读: 回复时返回"留言已归档",点赞/点踩按留言不存在处理
+- 全文索引保留归档留言的条目,搜索仍能找到
+
+在服务进程外执行时,服务中已缓存的列表首页最长保留到下一次写入;
+其中的归档帖子仍可按ID打开,热门排行会在下次后台重建时移除它们
+
+命令行用法:
+    python archive.py               # 按配置归档
+    python archive.py --days 365    # 只归档一年前的帖子
+    python archive.py --dry-run     # 只统计可归档的帖子数
+"""
+
+import argparse
+import datetime
+import time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, insert, literal, select
+from sqlalchemy.engine import Connection, Engine
+
+import models
+from config import ARCHIVE_CONFIG
+from hot_ranking import hotRanking
+from logger import setupLogger, logInfo
+from response_cache import responseCache
+
+logger = setupLogger("archive")
+
+MESSAGE_TABLE = models.Message.__table__
+ARCHIVE_TABLE = models.ArchivedMessage.__table__
+COLUMNS = [column.name for column in MESSAGE_TABLE.columns]
+
+# IN 列表每次最多包含的ID数
+ID_CHUNK = 500
+
+
+class ArchiveReport(NamedTuple):
+    """
+    归档结果
+
+    Attributes:
+        threads (int): 归档的帖子数
+        messages (int): 移动的留言数(帖子加回复)
+    """
+    threads: int
+    messages: int
+
+
+def chunked(ids: List[int]) -> Iterator[List[int]]:
+    for offset in range(0, len(ids), ID_CHUNK):
+        yield ids[offset:offset + ID_CHUNK]
+
+
+def threadTree(threadIds: List[int]):
+    """
+    构造帖子及其全部后代回复的递归查询
+
+    Args:
+        threadIds (List[int]): 帖子ID
+
+    Returns:
+        CTE: 列为 root(所属帖子ID)、id、timestamp
+    """
+    tree = (
+        select(MESSAGE_TABLE.c.id.label("root"), MESSAGE_TABLE.c.id, MESSAGE_TABLE.c.timestamp)
+        .where(MESSAGE_TABLE.c.id.in_(threadIds))
+        .cte("thread_tree", recursive=True)
+    )
+    child = MESSAGE_TABLE.alias("child")
+    return tree.union_all(
+        select(tree.c.root, child.c.id, child.c.timestamp).where(child.c.parent_id == tree.c.id)
+    )
+
+
+def archivableThreads(conn: Connection, cutoff: datetime.datetime, afterId: int, maxId: int,
+                      limit: int) -> Tuple[List[int], Optional[int]]:
+    """
+    检查一批候选帖子,找出可以归档的帖子
+
+    候选帖子是早于截止时间的顶层留言;任何一层后代回复不早于截止时间的帖子不归档
+
+    Args:
+        conn (Connection): 数据库连接
+        cutoff (datetime): 截止时间,帖子和所有后代回复都早于该时间才归档
+        afterId (int): 只检查ID大于该值的帖子
+        maxId (int): 早于截止时间的最大留言ID,更新的帖子不必检查
+        limit (int): 最多检查的帖子数
+
+    Returns:
+        Tuple[List[int], Optional[int]]: (可归档的帖子ID,按ID正序; 本批检查的最后一个帖子ID,没有候选时为None)
+    """
+    candidates = list(conn.execute(
+        select(MESSAGE_TABLE.c.id)
+        .where(MESSAGE_TABLE.c.parent_id == None, MESSAGE_TABLE.c.id > afterId, MESSAGE_TABLE.c.id <= maxId)
+        .where(MESSAGE_TABLE.c.timestamp < cutoff)
+        .order_by(MESSAGE_TABLE.c.id)
+        .limit(limit)
+    ).scalars())
+    if not candidates:
+        return [], None
+
+    tree = threadTree(candidates)
+    active = set(conn.execute(select(tree.c.root).where(tree.c.timestamp >= cutoff).distinct()).scalars())
+    return [threadId for threadId in candidates if threadId not in active], candidates[-1]
+
+
+def moveThreads(conn: Connection, threadIds: List[int], archivedAt: datetime.datetime) -> int:
+    """
+    把帖子及其全部后代回复从 messages 移入归档表(调用方负责事务)
+
+    Args:
+        conn (Connection): 处于事务中的数据库连接
+        threadIds (List[int]): 帖子ID
+        archivedAt (datetime): 归档时间
+
+    Returns:
+        int: 移动的留言数
+
+    Raises:
+        RuntimeError: 删除后 messages 中仍有回复指向已移走的留言,调用方应回滚整批
+    """
+    tree = threadTree(threadIds)
+    ids = list(conn.execute(select(tree.c.id)).scalars())
+    for chunk in chunked(ids):
+        source = select(*(MESSAGE_TABLE.c[name] for name in COLUMNS), literal(archivedAt)).where(
+            MESSAGE_TABLE.c.id.in_(chunk)
+        )
+        conn.execute(insert(ARCHIVE_TABLE).from_select(COLUMNS + ["archived_at"], source))
+        conn.execute(delete(MESSAGE_TABLE).where(MESSAGE_TABLE.c.id.in_(chunk)))
+
+    # 只删除了已复制的留言;SQLite 没有启用外键约束,复制之后才提交的新回复需要在这里检查
+    for chunk in chunked(ids):
+        if conn.execute(select(exists().where(MESSAGE_TABLE.c.parent_id.in_(chunk)))).scalar():
+            raise RuntimeError("归档期间有新回复,本批帖子回滚")
+    return len(ids)
+
+
+def archiveThreads(
+    engine: Engine,
+    afterDays: int = ARCHIVE_CONFIG["after_days"],
+    chunkThreads: int = ARCHIVE_CONFIG["chunk_threads"],
+    pauseMs: int = ARCHIVE_CONFIG["chunk_pause_ms"],
+    dryRun: bool = False,
+    now: Optional[datetime.datetime] = None
+) -> ArchiveReport:
+    """
+    把长期没有新回复的帖子整帖移入归档表
+
+    Args:
+        engine (Engine): 数据库引擎
+        afterDays (int): 帖子和所有回复都早于这么多天才归档
+        chunkThreads (int): 每个事务检查的帖子数
+        pauseMs (int): 两个事务之间的间隔(毫秒)
+        dryRun (bool): 只统计,不移动
+        now (Optional[datetime]): 当前时间(UTC),默认取系统时间
+
+    Returns:
+        ArchiveReport: 归档的帖子数和留言数
+    """
+    now = now or datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(days=afterDays)
+    with engine.connect() as conn:
+        # 走 timestamp 索引找到截止时间前的最大ID,之后的帖子都不必检查
+        maxId = conn.execute(select(func.max(MESSAGE_TABLE.c.id)).where(MESSAGE_TABLE.c.timestamp < cutoff)).scalar()
+    if maxId is None:
+        return ArchiveReport(0, 0)
+
+    lastId, threads, messages = 0, 0, 0
+    while True:
+        with engine.begin() as conn:
+            threadIds, lastChecked = archivableThreads(conn, cutoff, lastId, maxId, chunkThreads)
+            if lastChecked is None:
+                break
+            if threadIds and not dryRun:
+                messages += moveThreads(conn, threadIds, now)
+
+        lastId = lastChecked
+        threads += len(threadIds)
+        if threadIds and not dryRun:
+            hotRanking.remove(threadIds)
+            responseCache.invalidateTags("list", *[f"msg:{threadId}" for threadId in threadIds])
+            logInfo(logger, f"已归档 {threads} 个帖子,{messages} 条留言,当前ID: {lastId}")
+            time.sleep(pauseMs / 1000)
+
+    logInfo(logger, f"归档完成: {threads} 个帖子,{messages} 条留言,截止时间: {cutoff.isoformat()}")
+    return ArchiveReport(threads, messages)
+
+
+if __name__ == "__main__":
+    from database import createTables, engine
+    from migrations import runMigrations
+
+    parser = argparse.ArgumentParser(description="把长期没有新回复的帖子移入归档表")
+    parser.add_argument("--days", type=int, default=ARCHIVE_CONFIG["after_days"], help="帖子和所有回复都早于这么多天才归档")
+    parser.add_argument("--chunk-threads", type=int, default=ARCHIVE_CONFIG["chunk_threads"], help="每个事务检查的帖子数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计可归档的帖子数")
+    args = parser.parse_args()
+
+    createTables()
+    runMigrations(engine)
+    report = archiveThreads(engine, afterDays=args.days, chunkThreads=args.chunk_threads, dryRun=args.dry_run)
+    action = "可归档" if args.dry_run else "归档"
+    print(f"{action} {report.threads} 个帖子" + ("" if args.dry_run else f",{report.messages} 条留言"))
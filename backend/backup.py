@@ -0,0 +1,294 @@
+"""
+留言数据导出/导入
+
+导出不需要停止服务: 按ID顺序分批读取 messages 和归档表 messages_archive,
+每行写出一条留言的 JSON(NDJSON),文件名以 .gz 结尾时用 gzip 压缩。
+内存占用只与批大小有关,与留言总数无关
+
+导入时保留留言ID和回复关系(导出按ID排序,父留言总在回复之前):
+- 每批用一条 executemany 插入,多批合并为一个事务提交,减少提交和刷盘次数
+- 每个事务同时记录已导入的最后一个ID(import_checkpoints 表),中断后重新执行同一命令
+  会跳过已提交的留言,从断点继续;数据和断点在同一事务中提交,不会重复或遗漏
+- SQLite 下同时写入全文索引;服务中的热门排行会在下次后台重建时包含导入的留言
+- 所有留言都导入 messages,导入后执行 python archive.py 重新归档旧帖子
+
+命令行用法:
+    python backup.py export messages.ndjson.gz
+    python backup.py import messages.ndjson.gz
+    python backup.py import messages.ndjson.gz --restart   # 忽略断点,从头导入
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import time
+from typing import Callable, IO, Iterator, List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, insert, select, text, union_all
+
+import models
+from database import SessionLocal
+from logger import setupLogger, logInfo
+from search import INDEX_STATEMENT, isSearchSupported, tokenize
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+logger = setupLogger("backup")
+
+# 导入断点表,不属于业务模型,单独使用一个MetaData
+checkpointMetadata = MetaData()
+
+importCheckpoints = Table(
+    "import_checkpoints",
+    checkpointMetadata,
+    Column("source", String(500), primary_key=True),
+    Column("last_id", Integer, nullable=False),
+    Column("imported", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+MESSAGE_TABLE = models.Message.__table__
+ARCHIVE_TABLE = models.ArchivedMessage.__table__
+COLUMNS = [column.name for column in MESSAGE_TABLE.columns]
+DATETIME_COLUMNS = [column.name for column in MESSAGE_TABLE.columns if isinstance(column.type, DateTime)]
+
+
+def _dumps(row: dict) -> bytes:
+    return orjson.dumps(row) if orjson else json.dumps(row, ensure_ascii=False).encode("utf-8")
+
+
+_loads = orjson.loads if orjson else json.loads
+
+
+def openFile(path: str, mode: str) -> IO[bytes]:
+    """
+    打开导出文件,.gz 结尾时使用 gzip
+
+    Args:
+        path (str): 文件路径
+        mode (str): "rb" / "wb"
+
+    Returns:
+        IO[bytes]: 二进制文件对象
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode, buffering=1 << 20)
+
+
+# ==================== 导出 ====================
+
+def exportMessages(path: str, sessionFactory: Callable = SessionLocal, batchSize: int = 10000) -> int:
+    """
+    按ID顺序把全部留言(包括归档的留言)导出为 NDJSON
+
+    Args:
+        path (str): 输出文件路径
+        sessionFactory (Callable): 数据库会话工厂
+        batchSize (int): 每次查询读取的留言数
+
+    Returns:
+        int: 导出的留言数
+    """
+    # 两张表各按主键取下一批,合并后再取ID最小的一批
+    batches = [
+        select(*(table.c[name] for name in COLUMNS)).where(table.c.id > bindparam("lastId"))
+        .order_by(table.c.id).limit(batchSize).subquery()
+        for table in (MESSAGE_TABLE, ARCHIVE_TABLE)
+    ]
+    merged = union_all(*(select(batch) for batch in batches)).subquery()
+    statement = select(merged).order_by(merged.c.id).limit(batchSize)
+    lastId, total, startedAt = 0, 0, time.perf_counter()
+
+    db = sessionFactory()
+    try:
+        with openFile(path, "wb") as output:
+            while True:
+                rows = db.execute(statement, {"lastId": lastId}).all()
+                if not rows:
+                    break
+                lines = []
+                for row in rows:
+                    record = dict(zip(COLUMNS, row))
+                    for name in DATETIME_COLUMNS:
+                        if record[name] is not None:
+                            record[name] = record[name].isoformat()
+                    lines.append(_dumps(record))
+                output.write(b"\n".join(lines) + b"\n")
+                lastId = rows[-1].id
+                total += len(rows)
+                # 每批结束事务,不长时间持有读快照
+                db.rollback()
+                logInfo(logger, f"已导出 {total} 条,当前ID: {lastId}", sample=True)
+    finally:
+        db.close()
+
+    logInfo(logger, f"导出完成: {total} 条,耗时 {time.perf_counter() - startedAt:.1f}s")
+    return total
+
+
+# ==================== 导入 ====================
+
+def readRecords(path: str, afterId: int = 0) -> Iterator[dict]:
+    """
+    逐行读取导出文件,跳过ID不大于 afterId 的留言
+
+    Args:
+        path (str): 导出文件路径
+        afterId (int): 断点ID
+
+    Yields:
+        dict: 可直接插入 messages 表的字段字典
+    """
+    with openFile(path, "rb") as source:
+        for line in source:
+            if not line.strip():
+                continue
+            record = _loads(line)
+            if record["id"] <= afterId:
+                continue
+            for name in DATETIME_COLUMNS:
+                if record.get(name) is not None:
+                    record[name] = datetime.datetime.fromisoformat(record[name])
+            yield {name: record.get(name) for name in COLUMNS}
+
+
+def getCheckpoint(sessionFactory: Callable, source: str, restart: bool = False) -> int:
+    """
+    读取导入断点
+
+    Args:
+        sessionFactory (Callable): 数据库会话工厂
+        source (str): 导入来源(导出文件的绝对路径)
+        restart (bool): 删除已有断点
+
+    Returns:
+        int: 已导入的最后一个留言ID,没有断点时为0
+    """
+    db = sessionFactory()
+    try:
+        checkpointMetadata.create_all(db.get_bind())
+        if restart:
+            db.execute(importCheckpoints.delete().where(importCheckpoints.c.source == source))
+            db.commit()
+        lastId = db.execute(
+            select(importCheckpoints.c.last_id).where(importCheckpoints.c.source == source)
+        ).scalar()
+        return lastId or 0
+    finally:
+        db.close()
+
+
+def importMessages(path: str, sessionFactory: Callable = SessionLocal, batchSize: int = 5000,
+                   transactionRows: int = 100000, restart: bool = False) -> int:
+    """
+    从 NDJSON 导入留言,保留ID,支持断点续传
+
+    Args:
+        path (str): 导出文件路径
+        sessionFactory (Callable): 数据库会话工厂
+        batchSize (int): 每条 executemany 插入的留言数
+        transactionRows (int): 每个事务提交的留言数
+        restart (bool): 忽略已有断点,从头导入
+
+    Returns:
+        int: 本次导入的留言数
+    """
+    source = os.path.abspath(path)
+    lastId = getCheckpoint(sessionFactory, source, restart)
+    if lastId:
+        logInfo(logger, f"从断点继续导入,跳过ID不大于 {lastId} 的留言")
+
+    total, pending, startedAt = 0, 0, time.perf_counter()
+    db = sessionFactory()
+    try:
+        indexSearch = isSearchSupported(db.get_bind().dialect.name)
+        batch: List[dict] = []
+        for record in readRecords(path, lastId):
+            batch.append(record)
+            if len(batch) < batchSize:
+                continue
+            _insertBatch(db, batch, indexSearch)
+            pending += len(batch)
+            lastId = batch[-1]["id"]
+            batch = []
+            if pending >= transactionRows:
+                _commit(db, source, lastId, pending)
+                total += pending
+                pending = 0
+
+        if batch:
+            _insertBatch(db, batch, indexSearch)
+            pending += len(batch)
+            lastId = batch[-1]["id"]
+        if pending:
+            _commit(db, source, lastId, pending)
+            total += pending
+        _resetSequence(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    logInfo(logger, f"导入完成: {total} 条,耗时 {time.perf_counter() - startedAt:.1f}s")
+    return total
+
+
+def _insertBatch(db, batch: List[dict], indexSearch: bool):
+    db.execute(insert(MESSAGE_TABLE), batch)
+    if indexSearch:
+        db.execute(INDEX_STATEMENT, [{"id": row["id"], "tokens": tokenize(row["content"])} for row in batch])
+
+
+def _commit(db, source: str, lastId: int, count: int):
+    # 断点与本事务的数据一起提交,imported 为该来源累计导入的留言数
+    now = datetime.datetime.utcnow()
+    updated = db.execute(
+        importCheckpoints.update().where(importCheckpoints.c.source == source)
+        .values(last_id=lastId, imported=importCheckpoints.c.imported + count, updated_at=now)
+    ).rowcount
+    if not updated:
+        db.execute(importCheckpoints.insert().values(source=source, last_id=lastId, imported=count, updated_at=now))
+    db.commit()
+    logInfo(logger, f"已提交 {count} 条,当前ID: {lastId}")
+
+
+def _resetSequence(db):
+    # PostgreSQL 的自增序列不会随显式写入的ID前进;SQLite/MySQL 自动取最大ID之后的值
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT setval(pg_get_serial_sequence('messages', 'id'), "
+                        "COALESCE((SELECT MAX(id) FROM messages), 1))"))
+        db.commit()
+
+
+if __name__ == "__main__":
+    from database import createTables, engine
+    from migrations import runMigrations
+
+    parser = argparse.ArgumentParser(description="留言数据导出/导入")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    exportParser = subparsers.add_parser("export", help="导出为 NDJSON(.gz 结尾时压缩)")
+    exportParser.add_argument("path")
+    exportParser.add_argument("--batch-size", type=int, default=10000)
+    importParser = subparsers.add_parser("import", help="从 NDJSON 导入,中断后重新执行会从断点继续")
+    importParser.add_argument("path")
+    importParser.add_argument("--batch-size", type=int, default=5000)
+    importParser.add_argument("--transaction-rows", type=int, default=100000, help="每个事务提交的留言数")
+    importParser.add_argument("--restart", action="store_true", help="忽略断点,从头导入")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = exportMessages(args.path, batchSize=args.batch_size)
+        print(f"导出 {count} 条")
+    else:
+        createTables()
+        runMigrations(engine)
+        count = importMessages(args.path, batchSize=args.batch_size,
+                               transactionRows=args.transaction_rows, restart=args.restart)
+        print(f"导入 {count} 条")
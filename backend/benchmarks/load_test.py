@@ -0,0 +1,600 @@
+"""
+接口基准和压力测试
+
+按可配置的规模生成测试数据:
+- 顶层留言数可到百万级
+- 回复按幂律分布集中在少数帖子上
+- 最新的若干帖子为热门帖子,集中了大部分回复和点赞
+
+然后以固定并发按权重随机请求 main.py 中的各个接口。
+报告每个接口的吞吐量和 p50/p95/p99 延迟,结果保存为JSON,便于在不同版本或配置之间对比。
+
+地理位置查询指向本进程启动的 ip-api.com 模拟服务,运行时不需要网络。
+SSE 接口 /messages/stream 是长连接,不计入延迟统计。
+
+用法(在 backend 目录下):
+    python benchmarks/load_test.py                                   # 进程内ASGI客户端
+    python benchmarks/load_test.py --target server --workers 4       # 启动 uvicorn 子进程
+    python benchmarks/load_test.py --url http://127.0.0.1:8000       # 已在运行的服务(不生成数据)
+    python benchmarks/load_test.py --messages 2000000 --database-url sqlite:////data/bench.db
+    python benchmarks/load_test.py --database-url sqlite:////data/bench.db --skip-seed
+    python benchmarks/load_test.py --compare results/a.json results/b.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+
+# ==================== 地理位置模拟服务 ====================
+
+STUB_LOCATIONS = [
+    ("中国", "北京市", "北京"),
+    ("中国", "上海市", "上海"),
+    ("中国", "广东省", "深圳"),
+    ("中国", "浙江省", "杭州"),
+    ("美国", "加利福尼亚州", "洛杉矶"),
+    ("日本", "东京都", "东京"),
+]
+
+
+def startGeoStub(latencyMs: int = 0):
+    """
+    启动模拟 ip-api.com 的本地HTTP服务
+
+    同一IP总是返回相同的位置,latencyMs 模拟真实API的网络延迟
+
+    Args:
+        latencyMs (int): 每次响应前等待的毫秒数
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: 服务对象和可用作 GEO_REMOTE_API_URL 的地址模板
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latencyMs:
+                time.sleep(latencyMs / 1000)
+            ip = self.path.split("?")[0].rsplit("/", 1)[-1]
+            country, region, city = STUB_LOCATIONS[zlib.crc32(ip.encode()) % len(STUB_LOCATIONS)]
+            body = json.dumps({
+                "status": "success", "country": country, "regionName": region, "city": city, "query": ip
+            }, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="geo-stub", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/json/{{ip}}?lang=zh-CN"
+
+
+# ==================== 测试数据 ====================
+
+def seed(messages: int, replies: int, hotPosts: int, hotShare: float, skew: float, seedValue: int,
+         batchSize: int = 20000) -> dict:
+    """
+    生成测试数据
+
+    热门帖子是最新的 hotPosts 条顶层留言,获得 hotShare 比例的回复;
+    其余回复的父留言按 u^skew 分布偏向较新的留言,skew 越大越集中
+
+    Args:
+        messages (int): 顶层留言数
+        replies (int): 回复数
+        hotPosts (int): 热门帖子数
+        hotShare (float): 热门帖子获得的回复比例
+        skew (float): 普通回复的集中程度
+        seedValue (int): 随机数种子
+        batchSize (int): 每次批量插入的行数
+
+    Returns:
+        dict: 数据规模和耗时
+    """
+    from sqlalchemy import bindparam, func, insert, select, update
+
+    import models
+    import search
+    from database import engine, createTables
+    from migrations import runMigrations
+
+    createTables()
+    runMigrations(engine)
+
+    table = models.Message.__table__
+    rng = random.Random(seedValue)
+    started = time.perf_counter()
+    baseTime = datetime(2024, 1, 1)
+    hotPosts = min(hotPosts, messages)
+
+    with engine.begin() as conn:
+        firstId = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+        for offset in range(0, messages, batchSize):
+            conn.execute(insert(table), [
+                {
+                    "content": f"基准测试留言 {i} " + "树洞" * rng.randint(1, 40),
+                    "timestamp": baseTime + timedelta(seconds=i),
+                    "like_count": rng.randint(0, 5),
+                    "dislike_count": rng.randint(0, 2),
+                    "reply_count": 0,
+                    "ip_address": f"1.{i % 250}.{i // 250 % 250}.{i % 200 + 1}",
+                    "location": "中国 北京市",
+                }
+                for i in range(offset, min(offset + batchSize, messages))
+            ])
+        lastId = firstId + messages - 1
+
+        fanOut = Counter()
+        for _ in range(replies):
+            if hotPosts and rng.random() < hotShare:
+                parentId = lastId - rng.randrange(hotPosts)
+            else:
+                parentId = lastId - int(messages * rng.random() ** skew)
+            fanOut[parentId] += 1
+
+        parents = list(fanOut.elements())
+        rng.shuffle(parents)
+        for offset in range(0, len(parents), batchSize):
+            conn.execute(insert(table), [
+                {
+                    "content": f"基准测试回复 {offset + j}",
+                    "timestamp": baseTime + timedelta(seconds=messages + offset + j),
+                    "like_count": 0,
+                    "dislike_count": 0,
+                    "reply_count": 0,
+                    "parent_id": parentId,
+                    "ip_address": "1.2.3.4",
+                    "location": "中国 上海市",
+                }
+                for j, parentId in enumerate(parents[offset:offset + batchSize])
+            ])
+
+        if fanOut:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("pid")).values(reply_count=bindparam("count")),
+                [{"pid": parentId, "count": count} for parentId, count in fanOut.items()],
+            )
+        if hotPosts:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("pid")).values(like_count=bindparam("likes")),
+                [{"pid": lastId - k, "likes": rng.randint(500, 5000)} for k in range(hotPosts)],
+            )
+
+    # 批量插入绕过了 crud,补建全文索引,否则搜索场景查询的是空索引
+    indexed = search.backfill(engine, batchSize=batchSize) if search.isSearchSupported(engine.dialect.name) else 0
+
+    return {
+        "messages": messages,
+        "replies": replies,
+        "hot_posts": hotPosts,
+        "max_fan_out": max(fanOut.values(), default=0),
+        "search_indexed": indexed,
+        "seed_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# ==================== 请求场景 ====================
+
+class Targets(NamedTuple):
+    """从服务端发现的请求目标"""
+    newestId: int
+    hotIds: List[int]
+
+
+class Endpoint(NamedTuple):
+    """
+    一类请求
+
+    Attributes:
+        name (str): 报告中的名称
+        weight (int): 被选中的相对权重
+        build (Callable): (rng, targets) -> (method, path, params, json)
+    """
+    name: str
+    weight: int
+    build: Callable
+
+
+# 搜索接口使用的关键词,与生成的测试数据内容对应
+SEARCH_TERMS = ("树洞", "基准", "测试留言", "回复", "树")
+
+
+def randomId(rng: random.Random, targets: Targets) -> int:
+    return rng.randint(1, targets.newestId)
+
+
+def buildEndpoints() -> List[Endpoint]:
+    """
+    生成默认的请求组合,读多写少,读写集中在热门帖子
+    """
+    from utils import encode_cursor
+
+    def get(path, params=None):
+        return lambda rng, t: ("GET", path, params, None)
+
+    return [
+        Endpoint("GET /", 1, get("/")),
+        Endpoint("GET /ping", 2, get("/ping")),
+        Endpoint("GET /stats/geo", 1, get("/stats/geo")),
+        Endpoint("GET /stats/cache", 1, get("/stats/cache")),
+        Endpoint("GET /stats/stream", 1, get("/stats/stream")),
+        Endpoint("GET /metrics", 1, get("/metrics")),
+        Endpoint("GET /messages/ 首页", 25, get("/messages/")),
+        Endpoint("GET /messages/ 翻页", 8, lambda rng, t: (
+            "GET", "/messages/", {"before_id": encode_cursor(randomId(rng, t))}, None)),
+        Endpoint("GET /messages/ 嵌入回复", 5, get("/messages/", {"embed_replies": 3})),
+        Endpoint("GET /messages/hot", 5, get("/messages/hot")),
+        Endpoint("GET /messages/search", 3, lambda rng, t: (
+            "GET", "/messages/search", {"q": rng.choice(SEARCH_TERMS)}, None)),
+        Endpoint("GET /messages/replies", 5, lambda rng, t: (
+            "GET", "/messages/replies", {"parent_ids": ",".join(map(str, t.hotIds[:20]))}, None)),
+        Endpoint("GET /messages/{id}", 10, lambda rng, t: (
+            "GET", f"/messages/{randomId(rng, t)}", None, None)),
+        Endpoint("GET /messages/{id}/replies 热门", 15, lambda rng, t: (
+            "GET", f"/messages/{rng.choice(t.hotIds)}/replies", None, None)),
+        Endpoint("POST /messages/", 4, lambda rng, t: (
+            "POST", "/messages/", None, {"content": f"压测留言 {rng.random()}"})),
+        Endpoint("POST /messages/ 回复", 3, lambda rng, t: (
+            "POST", "/messages/", None, {"content": f"压测回复 {rng.random()}", "parent_id": rng.choice(t.hotIds)})),
+        Endpoint("POST /messages/{id}/like", 10, lambda rng, t: (
+            "POST", f"/messages/{rng.choice(t.hotIds)}/like", None, None)),
+        Endpoint("POST /messages/{id}/dislike", 3, lambda rng, t: (
+            "POST", f"/messages/{rng.choice(t.hotIds)}/dislike", None, None)),
+    ]
+
+
+async def discoverTargets(client: httpx.AsyncClient, hotPosts: int) -> Targets:
+    """
+    通过接口获取最新留言ID和热门帖子(首页中回复最多的留言)
+
+    Args:
+        client (httpx.AsyncClient): HTTP客户端
+        hotPosts (int): 热门帖子数
+
+    Returns:
+        Targets: 请求目标
+    """
+    response = await client.get("/messages/", params={"limit": max(hotPosts, 20)})
+    response.raise_for_status()
+    items = response.json()["data"]
+    if not items:
+        raise RuntimeError("数据库中没有留言,请先生成测试数据")
+    ranked = sorted(items, key=lambda item: item["reply_count"], reverse=True)
+    return Targets(newestId=max(item["id"] for item in items),
+                   hotIds=[item["id"] for item in ranked[:max(hotPosts, 1)]])
+
+
+# ==================== 运行和统计 ====================
+
+# 模拟客户端IP使用的公网地址段首字节
+PUBLIC_PREFIXES = (1, 14, 36, 58, 101, 114, 120, 183, 202, 223)
+
+def percentile(sortedValues: List[float], p: float) -> float:
+    """
+    最近秩法计算百分位数
+
+    Args:
+        sortedValues (List[float]): 升序排列的数值
+        p (float): 百分位(0-100)
+
+    Returns:
+        float: 百分位数,没有数据时为0
+    """
+    if not sortedValues:
+        return 0.0
+    rank = max(1, -(-len(sortedValues) * p // 100))
+    return sortedValues[int(rank) - 1]
+
+
+async def runLoad(client: httpx.AsyncClient, endpoints: List[Endpoint], targets: Targets, concurrency: int,
+                  duration: float, warmup: float, clientIps: int, seedValue: int) -> dict:
+    """
+    以固定并发持续发送请求
+
+    预热阶段的请求不计入统计
+
+    Args:
+        client (httpx.AsyncClient): HTTP客户端
+        endpoints (List[Endpoint]): 请求组合
+        targets (Targets): 请求目标
+        concurrency (int): 并发数
+        duration (float): 统计时长(秒)
+        warmup (float): 预热时长(秒)
+        clientIps (int): 模拟的客户端IP数
+        seedValue (int): 随机数种子
+
+    Returns:
+        dict: 每个接口的请求数、错误数、吞吐量和延迟分位数,以及合计
+    """
+    latencies: Dict[str, List[float]] = {endpoint.name: [] for endpoint in endpoints}
+    errors: Counter = Counter()
+    weights = [endpoint.weight for endpoint in endpoints]
+    ipRng = random.Random(seedValue)
+    ips = [f"{ipRng.choice(PUBLIC_PREFIXES)}.{ipRng.randrange(256)}.{ipRng.randrange(256)}.{ipRng.randrange(1, 255)}"
+           for _ in range(clientIps)]
+
+    loop = asyncio.get_running_loop()
+    recordFrom = loop.time() + warmup
+    stopAt = recordFrom + duration
+
+    async def worker(index: int):
+        rng = random.Random(seedValue * 1000 + index)
+        while True:
+            now = loop.time()
+            if now >= stopAt:
+                return
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, path, params, body = endpoint.build(rng, targets)
+            headers = {"X-Forwarded-For": rng.choice(ips)}
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body, headers=headers)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed = time.perf_counter() - start
+            if now >= recordFrom:
+                latencies[endpoint.name].append(elapsed)
+                if failed:
+                    errors[endpoint.name] += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+
+    results = {}
+    for name, values in latencies.items():
+        values.sort()
+        results[name] = summarize(values, errors[name], duration)
+    allValues = sorted(value for values in latencies.values() for value in values)
+    return {"endpoints": results, "total": summarize(allValues, sum(errors.values()), duration)}
+
+
+def summarize(sortedValues: List[float], errorCount: int, duration: float) -> dict:
+    """
+    汇总一组延迟
+
+    Args:
+        sortedValues (List[float]): 升序排列的延迟(秒)
+        errorCount (int): 错误数
+        duration (float): 统计时长(秒)
+
+    Returns:
+        dict: 请求数、错误数、每秒请求数和毫秒延迟
+    """
+    count = len(sortedValues)
+    return {
+        "requests": count,
+        "errors": errorCount,
+        "rps": round(count / duration, 1) if duration else 0.0,
+        "mean_ms": round(sum(sortedValues) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(sortedValues, 50) * 1000, 3),
+        "p95_ms": round(percentile(sortedValues, 95) * 1000, 3),
+        "p99_ms": round(percentile(sortedValues, 99) * 1000, 3),
+        "max_ms": round(sortedValues[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def printReport(report: dict):
+    header = f"{'接口':<34}{'请求数':>8}{'错误':>6}{'rps':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("合计", report["total"])]
+    for name, result in rows:
+        print(f"{name:<34}{result['requests']:>8}{result['errors']:>6}{result['rps']:>9}"
+              f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
+
+
+def compareReports(basePath: str, newPath: str):
+    """
+    对比两次运行结果,打印吞吐量和 p95/p99 的变化
+
+    Args:
+        basePath (str): 基准结果文件
+        newPath (str): 新结果文件
+    """
+    with open(basePath, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(newPath, encoding="utf-8") as f:
+        new = json.load(f)
+
+    def change(old, value):
+        return f"{(value - old) / old * 100:+.1f}%" if old else "-"
+
+    print(f"{'接口':<34}{'rps':>18}{'p95(ms)':>22}{'p99(ms)':>22}")
+    baseRows = dict(base["endpoints"], 合计=base["total"])
+    for name, result in dict(new["endpoints"], 合计=new["total"]).items():
+        old = baseRows.get(name)
+        if old is None:
+            continue
+        print(f"{name:<34}"
+              f"{result['rps']:>10} {change(old['rps'], result['rps']):>7}"
+              f"{result['p95_ms']:>14} {change(old['p95_ms'], result['p95_ms']):>7}"
+              f"{result['p99_ms']:>14} {change(old['p99_ms'], result['p99_ms']):>7}")
+
+
+def appConfig() -> dict:
+    """
+    记录影响性能的应用配置
+    """
+    from config import API_CONFIG, CACHE_CONFIG, DATABASE_CONFIG, RATE_LIMIT_CONFIG, VOTE_CONFIG
+
+    return {
+        "async_mode": API_CONFIG["async_mode"],
+        "json_backend": API_CONFIG["json_backend"],
+        "cache_enabled": CACHE_CONFIG["enabled"],
+        "vote_mode": VOTE_CONFIG["mode"],
+        "sqlite_profile": DATABASE_CONFIG["sqlite_profile"],
+        "rate_limit_enabled": RATE_LIMIT_CONFIG["enabled"],
+        "vote_dedup_enabled": VOTE_CONFIG["dedup_enabled"],
+    }
+
+
+def gitCommit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ==================== 被测服务 ====================
+
+def freePort() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def waitForServer(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn 已退出,返回码 {process.returncode}")
+        try:
+            if (await client.get("/ping")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("等待 uvicorn 启动超时")
+
+
+async def runBenchmark(args, endpoints: List[Endpoint]) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(30.0)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            return await measure(client, args, endpoints)
+
+    if args.target == "server":
+        port = freePort()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=os.environ.copy(),
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                         timeout=timeout) as client:
+                await waitForServer(client, process)
+                return await measure(client, args, endpoints)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    from main import app
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            return await measure(client, args, endpoints)
+
+
+async def measure(client: httpx.AsyncClient, args, endpoints: List[Endpoint]) -> dict:
+    targets = await discoverTargets(client, args.hot_posts)
+    return await runLoad(client, endpoints, targets, args.concurrency, args.duration, args.warmup,
+                         args.client_ips, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口基准和压力测试")
+    parser.add_argument("--target", choices=("asgi", "server"), default="asgi",
+                        help="asgi: 进程内调用应用; server: 启动 uvicorn 子进程")
+    parser.add_argument("--url", help="压测已在运行的服务(不生成数据,不启动地理位置模拟服务)")
+    parser.add_argument("--workers", type=int, default=1, help="server 模式的 uvicorn 进程数")
+    parser.add_argument("--database-url", help="数据库URL,默认使用临时SQLite文件")
+    parser.add_argument("--skip-seed", action="store_true", help="使用已有数据,不生成测试数据")
+    parser.add_argument("--messages", type=int, default=20000, help="顶层留言数")
+    parser.add_argument("--replies", type=int, default=20000, help="回复数")
+    parser.add_argument("--hot-posts", type=int, default=10, help="热门帖子数")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="热门帖子获得的回复比例")
+    parser.add_argument("--skew", type=float, default=3.0, help="普通回复集中在较新留言上的程度")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="统计时长(秒)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="预热时长(秒)")
+    parser.add_argument("--client-ips", type=int, default=1000, help="模拟的客户端IP数")
+    parser.add_argument("--geo-latency-ms", type=int, default=50, help="地理位置模拟服务的响应延迟")
+    parser.add_argument("--endpoints", nargs="*", help="只测试名称包含这些字符串的接口")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    parser.add_argument("--output", help="结果JSON文件,默认写入 benchmarks/results/")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="对比两个结果文件后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compareReports(*args.compare)
+        return
+
+    # 被测应用的配置在导入 config 之前通过环境变量设置
+    if not args.url:
+        tmpDir = tempfile.mkdtemp(prefix="treehole-load-")
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpDir, 'bench.db')}"
+        os.environ.setdefault("LOG_DIR", os.path.join(tmpDir, "logs"))
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        _, geoUrl = startGeoStub(args.geo_latency_ms)
+        os.environ["GEO_REMOTE_API_URL"] = geoUrl
+        os.environ.setdefault("GEO_PROVIDER", "remote")
+        # 压测流量来自少量模拟IP,默认关闭写接口限流;设置 RATE_LIMIT_ENABLED=True 可测量限流后的表现
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+        os.environ.setdefault("VOTE_DEDUP_ENABLED", "False")
+
+    dataset = None
+    if not args.url and not args.skip_seed:
+        print(f"生成测试数据: {args.messages} 条留言, {args.replies} 条回复 ...")
+        dataset = seed(args.messages, args.replies, args.hot_posts, args.hot_share, args.skew, args.seed)
+        print(f"完成,耗时 {dataset['seed_seconds']}s")
+
+    endpoints = buildEndpoints()
+    if args.endpoints:
+        endpoints = [e for e in endpoints if any(keyword in e.name for keyword in args.endpoints)]
+
+    target = args.url or args.target
+    print(f"压测 {target}: 并发 {args.concurrency}, 预热 {args.warmup}s, 统计 {args.duration}s")
+    report = asyncio.run(runBenchmark(args, endpoints))
+    printReport(report)
+
+    report["meta"] = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": target,
+        "workers": args.workers if args.target == "server" and not args.url else None,
+        "args": vars(args),
+        "config": None if args.url else appConfig(),
+    }
+    report["dataset"] = dataset
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+读接口查询方式基准
+
+对比按ORM实体查询(db.query(models.Message))与只读列投影(crud.fetchRows)
+在不同分页大小下每行的耗时和单次请求的内存峰值
+
+用法(在 backend 目录下):
+    python benchmarks/read_queries.py
+    python benchmarks/read_queries.py --rows 5000 --sizes 100 1000 --repeat 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 使用临时数据库并放开分页上限,不影响项目数据
+_tmpDir = tempfile.mkdtemp(prefix="treehole-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpDir, 'bench.db')}"
+os.environ.setdefault("MAX_PAGE_SIZE", "100000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+import crud  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, createTables  # noqa: E402
+
+
+def seed(rows: int):
+    db = SessionLocal()
+    try:
+        db.execute(insert(models.Message), [
+            {"content": f"基准测试留言 {i} " * 4, "like_count": i % 13, "dislike_count": i % 3,
+             "reply_count": 0, "ip_address": "203.0.113.7", "location": "中国 北京"}
+            for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def queryEntities(db, limit: int):
+    return (db.query(models.Message)
+            .filter(models.Message.parent_id == None)
+            .order_by(models.Message.id.desc())
+            .limit(limit)
+            .all())
+
+
+def queryRows(db, limit: int):
+    return crud.fetchRows(db, select(*models.PUBLIC_COLUMNS)
+                          .where(models.Message.parent_id == None)
+                          .order_by(models.Message.id.desc())
+                          .limit(limit))
+
+
+def measure(query, limit: int, repeat: int):
+    # 每次使用新会话,模拟一次请求
+    elapsed = 0.0
+    for _ in range(repeat):
+        db = SessionLocal()
+        start = time.perf_counter()
+        query(db, limit)
+        elapsed += time.perf_counter() - start
+        db.close()
+
+    db = SessionLocal()
+    tracemalloc.start()
+    result = query(db, limit)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    db.close()
+    return elapsed / repeat / limit * 1e6, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读接口查询方式基准")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    createTables()
+    seed(args.rows)
+
+    for size in args.sizes:
+        print(f"\n每页 {size} 条:")
+        for name, query in (("ORM实体", queryEntities), ("列投影 MessageRow", queryRows)):
+            perRow, peak = measure(query, size, args.repeat)
+            print(f"  {name:<20} {perRow:7.2f} µs/行   内存峰值 {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
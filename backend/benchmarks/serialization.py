@@ -0,0 +1,87 @@
+"""
+响应序列化微基准
+
+对比 api_response 原实现(jsonable_encoder + JSONResponse)与 serializers 中各编码后端
+编码一页留言的耗时,输出每条留言的平均微秒数
+
+用法(在 backend 目录下):
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --sizes 20 100 500 --repeat 200
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import models  # noqa: E402
+import serializers  # noqa: E402
+
+
+def makeMessages(count: int):
+    timestamp = datetime.datetime(2025, 12, 30, 10, 30, 0, 123456)
+    return [
+        models.Message(
+            id=i,
+            content="今天的树洞有点安静,留下一句话给路过的人。" * 2,
+            timestamp=timestamp,
+            like_count=i % 17,
+            dislike_count=i % 5,
+            reply_count=i % 3,
+            parent_id=None,
+            ip_address="203.0.113.7",
+            location="中国 广东 深圳",
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def legacyResponse(data) -> bytes:
+    # 优化前的 api_response
+    content = {"code": 0, "message": "success", "data": jsonable_encoder(data)}
+    content["next_cursor"] = None
+    return JSONResponse(content=content).body
+
+
+def makeEncoder(backend: str):
+    dumps = serializers.getEncoder(backend)
+
+    def encode(data) -> bytes:
+        content = {"code": 0, "message": "success", "data": serializers.toSerializable(data), "next_cursor": None}
+        return dumps(content)
+
+    return encode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    candidates = [("jsonable_encoder+JSONResponse(优化前)", legacyResponse)]
+    for backend in ("pydantic", "orjson"):
+        try:
+            candidates.append((backend, makeEncoder(backend)))
+        except ValueError as e:
+            print(f"跳过 {backend}: {e}")
+
+    for size in args.sizes:
+        messages = makeMessages(size)
+        print(f"\n每页 {size} 条:")
+        baseline = None
+        for name, encode in candidates:
+            seconds = min(timeit.repeat(lambda: encode(messages), number=args.repeat, repeat=3))
+            perItem = seconds / args.repeat / size * 1e6
+            baseline = baseline or perItem
+            print(f"  {name:<40} {perItem:8.2f} µs/条  ({baseline / perItem:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
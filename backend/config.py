@@ -53,9 +53,108 @@ def getEnvBool(key: str, default: bool = False) -> bool:
 
 # ==================== 数据库配置 ====================
 
+# SQLite存储配置预设,每次建立新连接时以PRAGMA方式应用
+# cache_size 为负数时单位是KiB; busy_timeout 单位是毫秒
+SQLITE_PROFILES = {
+    # 生产环境: WAL模式读写互不阻塞, synchronous=NORMAL 在WAL下断电也不会损坏数据库
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # 与 production 相同,但每次提交都完整刷盘
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # SQLite默认行为,只设置锁等待时间
+    "default": {
+        "busy_timeout": 5000,
+    },
+}
+
+def resolveSqlitePragmas(profile: str) -> dict:
+    """
+    计算SQLite连接使用的PRAGMA
+
+    以 SQLITE_PROFILES 中的预设为基础,可用 SQLITE_<PRAGMA名> 环境变量单独覆盖,
+    如 SQLITE_BUSY_TIMEOUT=10000
+
+    Args:
+        profile (str): 预设名称,未知名称按 production 处理
+
+    Returns:
+        dict: PRAGMA名称到值的映射
+    """
+    pragmas = dict(SQLITE_PROFILES.get(profile, SQLITE_PROFILES["production"]))
+    for name in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+        value = getEnv(f"SQLITE_{name.upper()}")
+        if value:
+            pragmas[name] = int(value) if value.lstrip("-").isdigit() else value
+    return pragmas
+
 DATABASE_CONFIG = {
     "url": getEnv("DATABASE_URL", "sqlite:///./treehole.db"),
-    "connect_args": {"check_same_thread": False}
+    "connect_args": {"check_same_thread": False},
+    "sqlite_profile": getEnv("SQLITE_PROFILE", "production"),
+    "sqlite_pragmas": resolveSqlitePragmas(getEnv("SQLITE_PROFILE", "production")),
+    "pool_size": getEnvInt("DB_POOL_SIZE", 10),        # 连接池常驻连接数
+    "max_overflow": getEnvInt("DB_MAX_OVERFLOW", 20),  # 高峰时允许额外创建的连接数
+    "pool_timeout": getEnvInt("DB_POOL_TIMEOUT", 30)   # 等待空闲连接的秒数
+}
+
+# ==================== 日志配置 ====================
+
+def parseLogLevels(levelsStr: str) -> dict:
+    """
+    解析按日志记录器设置的级别
+
+    Args:
+        levelsStr (str): 形如 "crud=WARNING,ip_utils=DEBUG" 的字符串
+
+    Returns:
+        dict: 日志记录器名称到级别名称的映射
+    """
+    levels = {}
+    for item in levelsStr.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+LOG_CONFIG = {
+    "level": getEnv("LOG_LEVEL", "INFO").upper(),          # 默认日志级别
+    "levels": parseLogLevels(getEnv("LOG_LEVELS", "")),    # 单独设置某些日志记录器的级别
+    "dir": getEnv("LOG_DIR", "logs"),                      # 日志文件目录
+    "queue_size": getEnvInt("LOG_QUEUE_SIZE", 10000),      # 待写入日志的队列长度,队列满时丢弃
+    # 高频信息日志(如每次读取列表)的采样: 同一条日志语句每N次只写1次,1表示不采样
+    "sample_every": getEnvInt("LOG_SAMPLE_EVERY", 100),
+    "rotation": getEnv("LOG_ROTATION", "time"),            # 文件轮转方式: time(按时间) / size(按大小)
+    "rotate_when": getEnv("LOG_ROTATE_WHEN", "midnight"),  # 按时间轮转的周期,取值同 TimedRotatingFileHandler
+    "max_bytes": getEnvInt("LOG_MAX_BYTES", 10 * 1024 * 1024),  # 按大小轮转时单个文件的最大字节数
+    "backup_count": getEnvInt("LOG_BACKUP_COUNT", 7)       # 保留的历史日志文件数
+}
+
+# ==================== 监控指标配置 ====================
+
+METRICS_CONFIG = {
+    "enabled": getEnvBool("METRICS_ENABLED", True)  # 是否启用 /metrics 和请求、SQL计时
+}
+
+# ==================== 性能分析配置 ====================
+
+PROFILING_CONFIG = {
+    # 管理员令牌,请求头 X-Admin-Token 与之一致时才允许 X-Profile 分析请求;为空时关闭该功能
+    "admin_token": getEnv("ADMIN_TOKEN", ""),
+    "profile_dir": getEnv("PROFILE_DIR", "logs/profiles"),  # 分析结果保存目录
+    "slow_query_ms": getEnvInt("SLOW_QUERY_MS", 200)       # 慢查询阈值(毫秒),0表示关闭慢查询日志
 }
 
 # ==================== 留言相关配置 ====================
@@ -66,6 +165,100 @@ MESSAGE_CONFIG = {
     "max_page_size": getEnvInt("MAX_PAGE_SIZE", 100)             # 最大分页大小
 }
 
+# ==================== 热门排行配置 ====================
+
+HOT_CONFIG = {
+    "capacity": getEnvInt("HOT_CAPACITY", 1000),        # 热门排行保留的留言数
+    "candidates": getEnvInt("HOT_CANDIDATES", 5000),    # 重建排行时读取的最新顶层留言数
+    "rebuild_interval_seconds": getEnvInt("HOT_REBUILD_INTERVAL_SECONDS", 300),  # 后台重建间隔,0表示不重建
+    # 发表时间每晚这么多秒,相当于净赞数(点赞-点踩)多10倍
+    "gravity_seconds": getEnvInt("HOT_GRAVITY_SECONDS", 45000)
+}
+
+# ==================== 全文搜索配置 ====================
+
+SEARCH_CONFIG = {
+    "enabled": getEnvBool("SEARCH_ENABLED", True),           # 是否启用全文搜索(仅SQLite支持)
+    "max_query_length": getEnvInt("SEARCH_MAX_QUERY_LENGTH", 50)  # 搜索关键词最大字符数
+}
+
+# ==================== 冷数据归档配置 ====================
+
+ARCHIVE_CONFIG = {
+    # 帖子及其所有回复都早于这么多天时,整帖移入归档表
+    "after_days": getEnvInt("ARCHIVE_AFTER_DAYS", 180),
+    "chunk_threads": getEnvInt("ARCHIVE_CHUNK_THREADS", 200),   # 每个事务检查的帖子数
+    "chunk_pause_ms": getEnvInt("ARCHIVE_CHUNK_PAUSE_MS", 50)   # 两个事务之间的间隔,让出写锁
+}
+
+# ==================== 响应缓存配置 ====================
+
+CACHE_CONFIG = {
+    "enabled": getEnvBool("RESPONSE_CACHE_ENABLED", True),              # 是否缓存热点读接口的响应
+    "max_bytes": getEnvInt("RESPONSE_CACHE_MAX_BYTES", 8 * 1024 * 1024)  # 缓存内容总字节数上限
+}
+
+# ==================== 实时推送配置 ====================
+
+SSE_CONFIG = {
+    "max_subscribers": getEnvInt("SSE_MAX_SUBSCRIBERS", 5000),  # 单进程最大SSE连接数
+    "buffer_size": getEnvInt("SSE_BUFFER_SIZE", 100),           # 每个连接最多积压的事件数,超出即断开
+    "heartbeat_seconds": getEnvInt("SSE_HEARTBEAT_SECONDS", 15),  # 心跳间隔
+    "coalesce_ms": getEnvInt("SSE_COALESCE_MS", 250)            # 计数事件合并窗口
+}
+
+# ==================== 点赞/点踩配置 ====================
+
+VOTE_CONFIG = {
+    # direct: 每次点击立即原子更新; buffered: 内存聚合后定时批量写入
+    "mode": getEnv("VOTE_MODE", "direct"),
+    "flush_interval_ms": getEnvInt("VOTE_FLUSH_INTERVAL_MS", 500),  # buffered 模式的刷新间隔
+    # 同一IP在窗口内对同一留言的重复点赞/点踩直接拒绝(409),不访问数据库
+    "dedup_enabled": getEnvBool("VOTE_DEDUP_ENABLED", True),
+    "dedup_window_seconds": getEnvInt("VOTE_DEDUP_WINDOW_SECONDS", 86400),     # 去重窗口(秒)
+    "dedup_max_bytes": getEnvInt("VOTE_DEDUP_MAX_BYTES", 4 * 1024 * 1024),    # 去重过滤器内存上限(字节)
+    # 误判率: 首次投票被误当作重复投票拒绝的概率
+    "dedup_false_positive_rate": float(getEnv("VOTE_DEDUP_FALSE_POSITIVE_RATE", "0.001"))
+}
+
+# ==================== 限流配置 ====================
+
+RATE_LIMIT_CONFIG = {
+    "enabled": getEnvBool("RATE_LIMIT_ENABLED", True),            # 是否按客户端IP限制写接口
+    "message_per_minute": getEnvInt("RATE_LIMIT_MESSAGE_PER_MINUTE", 10),  # 发表留言/回复: 每分钟恢复的次数
+    "message_burst": getEnvInt("RATE_LIMIT_MESSAGE_BURST", 5),             # 发表留言/回复: 允许的突发次数
+    "vote_per_minute": getEnvInt("RATE_LIMIT_VOTE_PER_MINUTE", 60),        # 点赞/点踩: 每分钟恢复的次数
+    "vote_burst": getEnvInt("RATE_LIMIT_VOTE_BURST", 20),                  # 点赞/点踩: 允许的突发次数
+    "max_clients": getEnvInt("RATE_LIMIT_MAX_CLIENTS", 100000)    # 每类接口最多记录的客户端IP数
+}
+
+# ==================== 反向代理配置 ====================
+
+PROXY_CONFIG = {
+    # 服务前面可信的反向代理层数: 客户端IP取 X-Forwarded-For 从右数第这么多个地址,
+    # 最左边的地址可以由客户端伪造;0表示直接对外服务,忽略代理请求头
+    "trusted_proxy_count": getEnvInt("TRUSTED_PROXY_COUNT", 0)
+}
+
+# ==================== IP地理位置配置 ====================
+
+GEO_CONFIG = {
+    # 数据源: remote(远程API) / local(本地IP数据库) / auto(先本地,查不到再远程)
+    "provider": getEnv("GEO_PROVIDER", "remote"),
+    "local_db_path": getEnv("GEO_LOCAL_DB_PATH", "./data/ip_region.db"),  # 本地IP数据库文件
+    # 远程地理位置API地址,{ip} 替换为查询的IP;基准测试时指向本地模拟服务
+    "remote_api_url": getEnv("GEO_REMOTE_API_URL", "http://ip-api.com/json/{ip}?lang=zh-CN"),
+    "remote_api_timeout": getEnvInt("GEO_REMOTE_API_TIMEOUT", 2),  # 远程API超时秒数
+    "cache_size": getEnvInt("GEO_CACHE_SIZE", 10000),            # 查询结果缓存条数,0表示不缓存
+    "cache_ttl": getEnvInt("GEO_CACHE_TTL", 86400),              # 查询成功结果缓存秒数
+    "cache_negative_ttl": getEnvInt("GEO_CACHE_NEGATIVE_TTL", 300),  # 查询失败/无结果缓存秒数
+    "cache_group_ipv4": getEnvBool("GEO_CACHE_GROUP_IPV4", True),    # 公网IPv4按/24网段共用缓存
+    # 是否在后台异步补全留言的地理位置(关闭后在请求中同步查询)
+    "async_enrichment": getEnvBool("GEO_ASYNC_ENRICHMENT", True),
+    "queue_size": getEnvInt("GEO_QUEUE_SIZE", 1000),    # 待查询队列最大长度,队列满时丢弃
+    "worker_count": getEnvInt("GEO_WORKER_COUNT", 1)    # 后台查询线程数
+}
+
 # ==================== CORS配置 ====================
 
 # 从环境变量读取允许的源,多个源用逗号分隔
@@ -94,13 +287,21 @@ CORS_CONFIG = {
 API_CONFIG = {
     "title": "TreeHole API",
     "description": "树洞留言板API接口",
-    "version": "1.0.0"
+    "version": "1.0.0",
+    # 响应JSON编码方式: auto(已安装orjson时使用orjson,否则使用pydantic) / orjson / pydantic / json(通用编码,最慢)
+    "json_backend": getEnv("JSON_BACKEND", "auto").lower(),
+    # 异步模式: 路由直接在事件循环中通过异步数据库驱动(aiosqlite/asyncpg)访问数据库,
+    # 并发不再受线程池大小限制;关闭时数据库操作在线程池中执行
+    "async_mode": getEnvBool("ASYNC_MODE", False)
 }
 
 # 错误消息
 ERROR_MESSAGES = {
     "content_too_long": f"内容不能超过{MESSAGE_CONFIG['max_content_length']}字",
     "message_not_found": "留言不存在",
+    "parent_not_found": "回复的留言不存在",
+    "message_archived": "留言已归档,不能再回复",
+    "duplicate_vote": "已经投过票了",
     "invalid_input": "输入数据无效",
     "database_error": "数据库操作失败"
 }
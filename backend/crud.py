@@ -1,15 +1,26 @@
+from sqlalchemy import Select, Update, func, select, union_all, update
 from sqlalchemy.orm import Session
 import models
 import schemas
-from config import ERROR_MESSAGES, MESSAGE_CONFIG
+from config import ERROR_MESSAGES, MESSAGE_CONFIG, VOTE_CONFIG
+from vote_buffer import voteBuffer
+from response_cache import responseCache
+from event_hub import eventHub
+from hot_ranking import hotRanking
+from search import INDEX_STATEMENT, SNAPSHOT_STATEMENT, indexParams, isSearchSupported, searchStatement, toResults
 from logger import setupLogger, logError, logInfo
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import datetime
 
 # 设置日志
 logger = setupLogger("crud")
 
-def getMessage(db: Session, messageId: int) -> Optional[models.Message]:
+# buffered 模式下票数批量写入后,失效包含这些留言的缓存响应
+voteBuffer.addFlushListener(
+    lambda messageIds: responseCache.invalidateTags(*[f"msg:{messageId}" for messageId in messageIds])
+)
+
+def getMessage(db: Session, messageId: int) -> Union[models.Message, models.MessageRow, None]:
     """
     根据ID获取留言
     
@@ -18,45 +29,315 @@ def getMessage(db: Session, messageId: int) -> Optional[models.Message]:
         messageId (int): 留言ID
         
     Returns:
-        Optional[Message]: 留言对象，如果不存在则返回None
+        Union[Message, MessageRow, None]: 留言对象，已归档的留言返回只读留言行，如果不存在则返回None
     """
     try:
         message = db.query(models.Message).filter(models.Message.id == messageId).first()
+        if message is None:
+            message = next(iter(fetchRows(db, archivedMessageStatement(messageId))), None)
         if message:
-            logInfo(logger, f"成功获取留言 ID: {messageId}")
+            logInfo(logger, f"成功获取留言 ID: {messageId}", sample=True)
         return message
     except Exception as e:
         logError(logger, e, f"获取留言失败 ID: {messageId}")
         return None
 
-def getMessages(db: Session, skip: int = 0, limit: Optional[int] = None) -> List[models.Message]:
+def resolvePageSize(limit: Optional[int] = None) -> int:
     """
-    获取留言列表
-    
+    计算实际使用的分页大小
+
+    Args:
+        limit (Optional[int]): 请求的分页大小,为空时使用配置文件中的默认值
+
+    Returns:
+        int: 限制在 [1, max_page_size] 范围内的分页大小
+    """
+    if limit is None:
+        limit = MESSAGE_CONFIG["default_page_size"]
+
+    # 限制最大页面大小
+    if limit > MESSAGE_CONFIG["max_page_size"]:
+        limit = MESSAGE_CONFIG["max_page_size"]
+
+    return max(limit, 1)
+
+# ==================== 查询语句 ====================
+# 同步(本模块)和异步(crud_async)两套实现共用的语句构造,保证两种模式行为一致
+
+# 热数据表和归档表各自的公开列
+PUBLIC_COLUMNS = {
+    models.Message: models.PUBLIC_COLUMNS,
+    models.ArchivedMessage: models.ARCHIVE_PUBLIC_COLUMNS,
+}
+
+def messagesStatement(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> Tuple[Select, bool]:
+    """
+    构造留言列表查询
+
+    Args:
+        skip (int): 跳过的记录数,仅在未提供游标时生效
+        limit (Optional[int]): 分页大小
+        beforeId (Optional[int]): 游标,只返回ID小于该值的留言
+        afterId (Optional[int]): 游标,只返回ID大于该值的留言
+
+    Returns:
+        Tuple[Select, bool]: (查询语句, 结果是否需要翻转为倒序)
+    """
+    limit = resolvePageSize(limit)
+    query = select(*models.PUBLIC_COLUMNS).where(models.Message.parent_id == None)
+
+    if afterId is not None:
+        # 向新的方向翻页: 先按升序取紧邻游标的一页,再翻转为倒序
+        return query.where(models.Message.id > afterId).order_by(models.Message.id.asc()).limit(limit), True
+
+    if beforeId is not None:
+        query = query.where(models.Message.id < beforeId)
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(models.Message.id.desc()).limit(limit), False
+
+def repliesStatement(
+    parentId: int,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None,
+    model=models.Message
+) -> Tuple[Select, bool]:
+    """
+    构造回复列表查询
+
+    Args:
+        parentId (int): 父留言ID
+        limit (Optional[int]): 分页大小
+        beforeId (Optional[int]): 游标,只返回ID小于该值的回复
+        afterId (Optional[int]): 游标,只返回ID大于该值的回复
+        model: 查询的表,Message 或 ArchivedMessage
+
+    Returns:
+        Tuple[Select, bool]: (查询语句, 结果是否需要翻转为正序)
+    """
+    limit = resolvePageSize(limit)
+    query = select(*PUBLIC_COLUMNS[model]).where(model.parent_id == parentId)
+
+    if beforeId is not None:
+        # 向前翻页: 先按倒序取紧邻游标的一页,再翻转为正序
+        return query.where(model.id < beforeId).order_by(model.id.desc()).limit(limit), True
+
+    if afterId is not None:
+        query = query.where(model.id > afterId)
+    return query.order_by(model.id.asc()).limit(limit), False
+
+def repliesForParentsStatement(parentIds: List[int], limit: Optional[int] = None, model=models.Message) -> Select:
+    """
+    构造批量回复查询
+
+    每个父留言一个带 LIMIT 的子查询,用 UNION ALL 合并。每个子查询沿 (parent_id, id) 索引
+    只读取需要的前若干行,回复很多的热门帖子也不会扫描它的全部回复
+
+    Args:
+        parentIds (List[int]): 父留言ID列表
+        limit (Optional[int]): 每个父留言最多返回的回复数
+        model: 查询的表,Message 或 ArchivedMessage
+
+    Returns:
+        Select: 按父留言、ID排序的查询语句
+    """
+    limit = resolvePageSize(limit)
+    # SQLite 不允许 UNION 的成员直接带 ORDER BY/LIMIT,每个成员再包一层子查询
+    perParent = [
+        select(select(*PUBLIC_COLUMNS[model]).where(model.parent_id == parentId)
+               .order_by(model.id).limit(limit).subquery())
+        for parentId in parentIds
+    ]
+    merged = union_all(*perParent).subquery()
+    return select(*(merged.c[name] for name in models.PUBLIC_FIELDS)).order_by(merged.c.parent_id, merged.c.id)
+
+def archivedMessageStatement(messageId: int) -> Select:
+    """
+    构造按ID查询归档留言的语句
+
+    Args:
+        messageId (int): 留言ID
+
+    Returns:
+        Select: 选择公开列的查询语句
+    """
+    return select(*models.ARCHIVE_PUBLIC_COLUMNS).where(models.ArchivedMessage.id == messageId)
+
+def counterStatement(messageId: int, column: str, amount: int = 1) -> Update:
+    """
+    构造原子增加计数字段的更新语句
+
+    Args:
+        messageId (int): 留言ID
+        column (str): 计数字段名,如 like_count
+        amount (int): 增加的数量
+
+    Returns:
+        Update: UPDATE ... SET col = col + N 语句
+    """
+    counter = getattr(models.Message, column)
+    return (update(models.Message)
+            .where(models.Message.id == messageId)
+            .values({counter: counter + amount}))
+
+def buildMessage(message: schemas.MessageCreate, ip_address: str = None, location: str = None) -> models.Message:
+    """
+    构造待插入的留言对象
+
+    Args:
+        message (MessageCreate): 留言创建数据
+        ip_address (str): 留言者IP地址
+        location (str): IP地理位置
+
+    Returns:
+        Message: 留言对象
+
+    Raises:
+        ValueError: 当内容超过字符限制时
+    """
+    if len(message.content) > MESSAGE_CONFIG["max_content_length"]:
+        raise ValueError(ERROR_MESSAGES["content_too_long"])
+
+    return models.Message(
+        content=message.content,
+        parent_id=message.parent_id,
+        timestamp=datetime.datetime.utcnow(),
+        ip_address=ip_address,
+        location=location
+    )
+
+def notifyMessageCreated(dbMessage: models.Message):
+    """
+    新留言写入后失效相关缓存并推送事件
+
+    新留言影响列表首页和热门排行;新回复影响该帖子的回复列表和父留言的回复数
+
+    Args:
+        dbMessage (Message): 已提交的留言对象
+    """
+    if dbMessage.parent_id:
+        responseCache.invalidateTags(f"replies:{dbMessage.parent_id}", f"msg:{dbMessage.parent_id}")
+    else:
+        responseCache.invalidateTags("list")
+        hotRanking.update(dbMessage)
+    eventHub.publishMessage(dbMessage)
+
+def groupReplies(parentIds: List[int], replies: List[models.MessageRow]) -> Dict[int, List[models.MessageRow]]:
+    """
+    把批量查询的回复按父留言分组
+
+    Args:
+        parentIds (List[int]): 父留言ID列表
+        replies (List[MessageRow]): 回复列表
+
+    Returns:
+        Dict[int, List[MessageRow]]: 父留言ID到回复列表的映射,没有回复的父留言对应空列表
+    """
+    grouped: Dict[int, List[models.MessageRow]] = {parentId: [] for parentId in parentIds}
+    for item in replies:
+        grouped[item.parent_id].append(item)
+    return grouped
+
+def missingParents(parentIds: List[int], replies: List[models.MessageRow]) -> List[int]:
+    """
+    找出在查询结果中没有回复的父留言
+
+    Args:
+        parentIds (List[int]): 父留言ID列表
+        replies (List[MessageRow]): 回复列表
+
+    Returns:
+        List[int]: 没有回复的父留言ID,需要再查询归档表
+    """
+    found = {item.parent_id for item in replies}
+    return [parentId for parentId in parentIds if parentId not in found]
+
+def orderByIds(messageIds: List[int], rows: List[models.MessageRow]) -> List[models.MessageRow]:
+    """
+    把 IN 查询的结果按给定的ID顺序排列
+
+    Args:
+        messageIds (List[int]): 留言ID列表
+        rows (List[MessageRow]): 查询结果
+
+    Returns:
+        List[MessageRow]: 排序后的留言行,不存在的ID被跳过
+    """
+    byId = {row.id: row for row in rows}
+    return [byId[messageId] for messageId in messageIds if messageId in byId]
+
+def applyPendingVotes(message: models.Message, messageId: int) -> models.Message:
+    """
+    把缓冲中尚未写入的票数加到(已脱离会话的)留言对象上,只影响本次响应
+
+    Args:
+        message (Message): 已脱离会话的留言对象
+        messageId (int): 留言ID
+
+    Returns:
+        Message: 同一个留言对象
+    """
+    pendingLikes, pendingDislikes = voteBuffer.pending(messageId)
+    message.like_count = (message.like_count or 0) + pendingLikes
+    message.dislike_count = (message.dislike_count or 0) + pendingDislikes
+    return message
+
+# ==================== 同步实现 ====================
+
+def fetchRows(db: Session, statement) -> List[models.MessageRow]:
+    """
+    执行只读查询并转换为只读留言行
+
+    不经过ORM实体,结果不会进入会话的身份映射
+
+    Args:
+        db (Session): 数据库会话
+        statement: 按 models.PUBLIC_COLUMNS 顺序选择列的查询语句
+
+    Returns:
+        List[MessageRow]: 只读留言行列表
+    """
+    return [models.MessageRow(*row) for row in db.execute(statement)]
+
+def getMessages(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> List[models.MessageRow]:
+    """
+    获取留言列表(按ID倒序,最新的在前)
+
+    优先使用游标分页: beforeId 返回比该ID更早的留言, afterId 返回比该ID更新的留言,
+    两者都基于主键范围查询,无论翻到第几页代价都相同。
+    skip 仅为兼容旧客户端保留,在未提供游标时才生效
+
+    只查询对外公开的列,返回只读留言行而不是ORM实体
+
     Args:
         db (Session): 数据库会话
         skip (int): 跳过的记录数，默认为0
         limit (Optional[int]): 限制返回的记录数，默认使用配置文件中的值
-        
+        beforeId (Optional[int]): 游标,只返回ID小于该值的留言
+        afterId (Optional[int]): 游标,只返回ID大于该值的留言
+
     Returns:
-        List[Message]: 留言列表
+        List[MessageRow]: 留言列表
     """
     try:
-        if limit is None:
-            limit = MESSAGE_CONFIG["default_page_size"]
-        
-        # 限制最大页面大小
-        if limit > MESSAGE_CONFIG["max_page_size"]:
-            limit = MESSAGE_CONFIG["max_page_size"]
-            
-        messages = (db.query(models.Message)
-                   .filter(models.Message.parent_id == None)
-                   .order_by(models.Message.id.desc())
-                   .offset(skip)
-                   .limit(limit)
-                   .all())
-        
-        logInfo(logger, f"成功获取 {len(messages)} 条留言")
+        statement, reverse = messagesStatement(skip, limit, beforeId, afterId)
+        messages = fetchRows(db, statement)
+        if reverse:
+            messages.reverse()
+
+        logInfo(logger, f"成功获取 {len(messages)} 条留言", sample=True)
         return messages
     except Exception as e:
         logError(logger, e, "获取留言列表失败")
@@ -76,32 +357,32 @@ def createMessage(db: Session, message: schemas.MessageCreate, ip_address: str =
         Optional[Message]: 创建的留言对象，失败时返回None
 
     Raises:
-        ValueError: 当内容超过字符限制时
+        ValueError: 当内容超过字符限制、回复的留言不存在或已归档时
     """
     try:
-        # 验证内容长度
-        if len(message.content) > MESSAGE_CONFIG["max_content_length"]:
-            raise ValueError(ERROR_MESSAGES["content_too_long"])
-
-        dbMessage = models.Message(
-            content=message.content,
-            parent_id=message.parent_id,
-            timestamp=datetime.datetime.utcnow(),
-            ip_address=ip_address,
-            location=location
-        )
+        dbMessage = buildMessage(message, ip_address, location)
 
+        # 回复: 在SQL中把父留言的回复数加一,更新行数为0说明父留言不存在;
+        # 与插入回复在同一事务中提交,只提交一次,并发回复不会互相覆盖计数
+        if message.parent_id:
+            result = db.execute(counterStatement(message.parent_id, "reply_count"),
+                                execution_options={"synchronize_session": False})
+            if not result.rowcount:
+                db.rollback()
+                archived = db.execute(archivedMessageStatement(message.parent_id)).first()
+                raise ValueError(ERROR_MESSAGES["message_archived" if archived else "parent_not_found"])
+
+        # 留言和全文索引在同一事务中写入
         db.add(dbMessage)
+        db.flush()
+        if isSearchSupported(db.get_bind().dialect.name):
+            db.execute(INDEX_STATEMENT, indexParams(dbMessage))
+
+        # 脱离会话后提交,提交时不会过期对象,返回前无需再查询一次
+        db.expunge(dbMessage)
         db.commit()
-        db.refresh(dbMessage)
 
-        # 如果是回复，更新父留言的回复数
-        if message.parent_id:
-            parent = getMessage(db, message.parent_id)
-            if parent:
-                setattr(parent, 'reply_count', (getattr(parent, 'reply_count', 0) or 0) + 1)
-                db.commit()
-                logInfo(logger, f"更新父留言 {message.parent_id} 的回复数")
+        notifyMessageCreated(dbMessage)
 
         logInfo(logger, f"成功创建留言 ID: {dbMessage.id}, IP: {ip_address}, 位置: {location}")
         return dbMessage
@@ -114,24 +395,115 @@ def createMessage(db: Session, message: schemas.MessageCreate, ip_address: str =
         db.rollback()
         return None
 
+def updateMessageLocation(db: Session, messageId: int, location: str) -> bool:
+    """
+    更新留言的地理位置
+
+    供后台地理位置补全任务使用,只更新单个字段,不加载整个对象
+
+    Args:
+        db (Session): 数据库会话
+        messageId (int): 留言ID
+        location (str): 地理位置
+
+    Returns:
+        bool: 是否更新成功
+    """
+    try:
+        updated = (db.query(models.Message)
+                   .filter(models.Message.id == messageId)
+                   .update({models.Message.location: location}, synchronize_session=False))
+        db.commit()
+        responseCache.invalidateTags(f"msg:{messageId}")
+        return updated > 0
+    except Exception as e:
+        logError(logger, e, f"更新留言位置失败 ID: {messageId}")
+        db.rollback()
+        return False
+
+def incrementCounter(db: Session, messageId: int, column: str, amount: int = 1) -> Optional[models.Message]:
+    """
+    在SQL中原子地增加留言的计数字段
+
+    使用 UPDATE ... SET col = col + N ... RETURNING 一次完成读改写,
+    并发点击不会互相覆盖;数据库不支持 RETURNING 时在同一事务中回读
+
+    Args:
+        db (Session): 数据库会话
+        messageId (int): 留言ID
+        column (str): 计数字段名,如 like_count
+        amount (int): 增加的数量
+
+    Returns:
+        Optional[Message]: 更新后的留言对象(已脱离会话),留言不存在时返回None
+    """
+    statement = counterStatement(messageId, column, amount)
+
+    if db.get_bind().dialect.update_returning:
+        message = db.scalars(
+            statement.returning(models.Message),
+            execution_options={"synchronize_session": False, "populate_existing": True}
+        ).first()
+    else:
+        db.execute(statement, execution_options={"synchronize_session": False})
+        message = db.get(models.Message, messageId, populate_existing=True)
+
+    if message is None:
+        db.rollback()
+        return None
+
+    # 脱离会话后提交,提交时不会过期对象,序列化时无需再查询一次
+    db.expunge(message)
+    db.commit()
+    responseCache.invalidateTags(f"msg:{messageId}")
+    return message
+
+def bufferVote(db: Session, messageId: int, likes: int = 0, dislikes: int = 0) -> Optional[models.Message]:
+    """
+    buffered 模式下记录一次投票
+
+    票数只累加到内存缓冲,由后台线程批量写入;
+    返回的留言计数包含尚未写入的票数
+
+    Args:
+        db (Session): 数据库会话
+        messageId (int): 留言ID
+        likes (int): 增加的点赞数
+        dislikes (int): 增加的点踩数
+
+    Returns:
+        Optional[Message]: 留言对象(已脱离会话),留言不存在或已归档时返回None
+    """
+    message = db.get(models.Message, messageId)
+    if not message:
+        return None
+
+    voteBuffer.add(messageId, likes=likes, dislikes=dislikes)
+
+    # 脱离会话后再修改计数,只影响本次响应,不会被提交到数据库
+    db.expunge(message)
+    return applyPendingVotes(message, messageId)
+
 def likeMessage(db: Session, messageId: int) -> Optional[models.Message]:
     """
     给留言点赞
-    
+
     Args:
         db (Session): 数据库会话
         messageId (int): 留言ID
-        
+
     Returns:
         Optional[Message]: 更新后的留言对象，失败时返回None
     """
     try:
-        message = getMessage(db, messageId)
+        if VOTE_CONFIG["mode"] == "buffered":
+            message = bufferVote(db, messageId, likes=1)
+        else:
+            message = incrementCounter(db, messageId, "like_count")
         if message:
-            setattr(message, 'like_count', (getattr(message, 'like_count', 0) or 0) + 1)
-            db.commit()
-            db.refresh(message)
-            logInfo(logger, f"留言 {messageId} 点赞成功，当前点赞数: {message.like_count}")
+            eventHub.publishCounts(message)
+            hotRanking.update(message)
+            logInfo(logger, f"留言 {messageId} 点赞成功，当前点赞数: {message.like_count}", sample=True)
             return message
         else:
             logError(logger, Exception(ERROR_MESSAGES["message_not_found"]), f"点赞失败，留言不存在 ID: {messageId}")
@@ -153,12 +525,14 @@ def dislikeMessage(db: Session, messageId: int) -> Optional[models.Message]:
         Optional[Message]: 更新后的留言对象，失败时返回None
     """
     try:
-        message = getMessage(db, messageId)
+        if VOTE_CONFIG["mode"] == "buffered":
+            message = bufferVote(db, messageId, dislikes=1)
+        else:
+            message = incrementCounter(db, messageId, "dislike_count")
         if message:
-            setattr(message, 'dislike_count', (getattr(message, 'dislike_count', 0) or 0) + 1)
-            db.commit()
-            db.refresh(message)
-            logInfo(logger, f"留言 {messageId} 踩成功，当前踩数: {message.dislike_count}")
+            eventHub.publishCounts(message)
+            hotRanking.update(message)
+            logInfo(logger, f"留言 {messageId} 踩成功，当前踩数: {message.dislike_count}", sample=True)
             return message
         else:
             logError(logger, Exception(ERROR_MESSAGES["message_not_found"]), f"踩失败，留言不存在 ID: {messageId}")
@@ -168,25 +542,177 @@ def dislikeMessage(db: Session, messageId: int) -> Optional[models.Message]:
         db.rollback()
         return None
 
-def getReplies(db: Session, parentId: int) -> List[models.Message]:
+def getReplies(
+    db: Session,
+    parentId: int,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> List[models.MessageRow]:
     """
-    获取指定留言的所有回复
+    获取指定留言的回复(按ID正序,最早的在前)
+
+    与留言列表使用相同的分页大小限制, afterId 返回该游标之后的回复,
+    beforeId 返回该游标之前的回复。返回只读留言行。
+    热数据表中没有结果时再查询归档表(整帖一起归档,不会两边各有一部分)
 
     Args:
         db (Session): 数据库会话
         parentId (int): 父留言ID
+        limit (Optional[int]): 限制返回的记录数，默认使用配置文件中的值
+        beforeId (Optional[int]): 游标,只返回ID小于该值的回复
+        afterId (Optional[int]): 游标,只返回ID大于该值的回复
 
     Returns:
-        List[Message]: 回复列表
+        List[MessageRow]: 回复列表
     """
     try:
-        replies = (db.query(models.Message)
-                   .filter(models.Message.parent_id == parentId)
-                   .order_by(models.Message.id.asc())
-                   .all())
+        statement, reverse = repliesStatement(parentId, limit, beforeId, afterId)
+        replies = fetchRows(db, statement)
+        if not replies:
+            statement, reverse = repliesStatement(parentId, limit, beforeId, afterId, models.ArchivedMessage)
+            replies = fetchRows(db, statement)
+        if reverse:
+            replies.reverse()
 
-        logInfo(logger, f"成功获取留言 {parentId} 的 {len(replies)} 条回复")
+        logInfo(logger, f"成功获取留言 {parentId} 的 {len(replies)} 条回复", sample=True)
         return replies
     except Exception as e:
         logError(logger, e, f"获取回复失败 父留言ID: {parentId}")
         return []
+
+def getRepliesOfMessage(
+    db: Session,
+    parentId: int,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> Optional[List[models.MessageRow]]:
+    """
+    检查父留言存在并获取它的回复,供接口在一次线程池调用中完成
+
+    Args:
+        db (Session): 数据库会话
+        parentId (int): 父留言ID
+        limit (Optional[int]): 限制返回的记录数，默认使用配置文件中的值
+        beforeId (Optional[int]): 游标,只返回ID小于该值的回复
+        afterId (Optional[int]): 游标,只返回ID大于该值的回复
+
+    Returns:
+        Optional[List[MessageRow]]: 回复列表,父留言不存在时返回None
+    """
+    if not getMessage(db, parentId):
+        return None
+    return getReplies(db, parentId, limit=limit, beforeId=beforeId, afterId=afterId)
+
+def getRepliesForParents(
+    db: Session,
+    parentIds: Iterable[int],
+    limit: Optional[int] = None
+) -> Dict[int, List[models.MessageRow]]:
+    """
+    批量获取多条留言的前若干条回复(按ID正序)
+
+    用一条查询代替逐个帖子查询,每个父留言的回复各自沿 (parent_id, id) 索引
+    只读取前若干条,再用 UNION ALL 合并。
+    热数据表中没有回复的父留言再到归档表中查询一次
+
+    Args:
+        db (Session): 数据库会话
+        parentIds (Iterable[int]): 父留言ID列表
+        limit (Optional[int]): 每个父留言最多返回的回复数，默认使用配置文件中的值
+
+    Returns:
+        Dict[int, List[MessageRow]]: 父留言ID到回复列表(只读留言行)的映射,
+        没有回复或不存在的父留言对应空列表
+    """
+    parentIds = list(dict.fromkeys(parentIds))
+    if not parentIds:
+        return {}
+
+    try:
+        replies = fetchRows(db, repliesForParentsStatement(parentIds, limit))
+        missing = missingParents(parentIds, replies)
+        if missing:
+            replies += fetchRows(db, repliesForParentsStatement(missing, limit, models.ArchivedMessage))
+        logInfo(logger, f"成功批量获取 {len(parentIds)} 条留言的 {len(replies)} 条回复", sample=True)
+        return groupReplies(parentIds, replies)
+    except Exception as e:
+        logError(logger, e, f"批量获取回复失败 父留言ID: {parentIds}")
+        return groupReplies(parentIds, [])
+
+def getMessagesWithReplies(
+    db: Session,
+    replyLimit: int,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> Tuple[List[models.MessageRow], Dict[int, List[models.MessageRow]]]:
+    """
+    获取一页留言及每条留言的前若干条回复,供接口在一次线程池调用中完成
+
+    只为有回复的留言查询回复,所有回复通过一次批量查询获得
+
+    Args:
+        db (Session): 数据库会话
+        replyLimit (int): 每条留言嵌入的回复数
+        skip, limit, beforeId, afterId: 见 getMessages
+
+    Returns:
+        Tuple[List[MessageRow], Dict[int, List[MessageRow]]]: (留言列表, 留言ID到回复列表的映射)
+    """
+    messages = getMessages(db, skip=skip, limit=limit, beforeId=beforeId, afterId=afterId)
+    return messages, getRepliesForParents(db, [item.id for item in messages if item.reply_count], replyLimit)
+
+def getMessagesByIds(db: Session, messageIds: List[int]) -> List[models.MessageRow]:
+    """
+    按给定顺序批量获取留言
+
+    Args:
+        db (Session): 数据库会话
+        messageIds (List[int]): 留言ID列表
+
+    Returns:
+        List[MessageRow]: 只读留言行,顺序与 messageIds 一致,不存在的留言被跳过
+    """
+    if not messageIds:
+        return []
+    try:
+        rows = fetchRows(db, select(*models.PUBLIC_COLUMNS).where(models.Message.id.in_(messageIds)))
+        return orderByIds(messageIds, rows)
+    except Exception as e:
+        logError(logger, e, f"批量获取留言失败 ID: {messageIds}")
+        return []
+
+def searchMessages(
+    db: Session,
+    matchQuery: str,
+    limit: Optional[int] = None,
+    snapshotId: Optional[int] = None,
+    offset: int = 0
+) -> Tuple[List[Tuple[models.MessageRow, float]], int]:
+    """
+    全文搜索留言(包括回复),按相关度排序
+
+    Args:
+        db (Session): 数据库会话
+        matchQuery (str): search.buildMatchQuery 生成的查询表达式
+        limit (Optional[int]): 返回的结果数,默认使用配置文件中的值
+        snapshotId (Optional[int]): 游标中的快照ID,第一页为None,此时以当前索引中的最大ID作为快照
+        offset (int): 游标中的偏移量
+
+    Returns:
+        Tuple[List[Tuple[MessageRow, float]], int]: ((只读留言行, 相关度分数) 列表, 快照ID),
+        分数越小越相关
+    """
+    try:
+        if snapshotId is None:
+            snapshotId = db.execute(SNAPSHOT_STATEMENT).scalar()
+        statement, params = searchStatement(matchQuery, resolvePageSize(limit), snapshotId, offset)
+        results = toResults(db.execute(statement, params))
+        logInfo(logger, f"搜索 {matchQuery} 返回 {len(results)} 条结果", sample=True)
+        return results, snapshotId
+    except Exception as e:
+        logError(logger, e, f"搜索留言失败: {matchQuery}")
+        return [], snapshotId or 0
@@ -0,0 +1,389 @@
+"""
+crud 的异步版本
+
+API_CONFIG["async_mode"] 开启时由 main 中的路由调用,使用 AsyncSession 在事件循环中访问数据库。
+函数名、参数和返回值与 crud 中的同名函数一致;查询语句、缓存失效和事件推送
+复用 crud 中的公共函数,两种模式的行为相同,只有执行方式不同
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from config import ERROR_MESSAGES, VOTE_CONFIG
+from crud import (
+    applyPendingVotes,
+    archivedMessageStatement,
+    buildMessage,
+    counterStatement,
+    groupReplies,
+    messagesStatement,
+    missingParents,
+    notifyMessageCreated,
+    orderByIds,
+    repliesForParentsStatement,
+    repliesStatement,
+    resolvePageSize,
+)
+from event_hub import eventHub
+from hot_ranking import hotRanking
+from logger import setupLogger, logError, logInfo
+from response_cache import responseCache
+from search import INDEX_STATEMENT, SNAPSHOT_STATEMENT, indexParams, isSearchSupported, searchStatement, toResults
+from vote_buffer import voteBuffer
+
+logger = setupLogger("crud_async")
+
+
+async def fetchRows(db: AsyncSession, statement) -> List[models.MessageRow]:
+    """
+    执行只读查询并转换为只读留言行
+
+    Args:
+        db (AsyncSession): 异步数据库会话
+        statement: 按 models.PUBLIC_COLUMNS 顺序选择列的查询语句
+
+    Returns:
+        List[MessageRow]: 只读留言行列表
+    """
+    result = await db.execute(statement)
+    return [models.MessageRow(*row) for row in result]
+
+
+async def getMessage(db: AsyncSession, messageId: int) -> Union[models.Message, models.MessageRow, None]:
+    """
+    根据ID获取留言
+
+    Args:
+        db (AsyncSession): 异步数据库会话
+        messageId (int): 留言ID
+
+    Returns:
+        Union[Message, MessageRow, None]: 留言对象，已归档的留言返回只读留言行，如果不存在则返回None
+    """
+    try:
+        message = await db.get(models.Message, messageId)
+        if message is None:
+            message = next(iter(await fetchRows(db, archivedMessageStatement(messageId))), None)
+        if message:
+            logInfo(logger, f"成功获取留言 ID: {messageId}", sample=True)
+        return message
+    except Exception as e:
+        logError(logger, e, f"获取留言失败 ID: {messageId}")
+        return None
+
+
+async def getMessages(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> List[models.MessageRow]:
+    """
+    获取留言列表(按ID倒序,最新的在前),参数含义见 crud.getMessages
+
+    Returns:
+        List[MessageRow]: 留言列表
+    """
+    try:
+        statement, reverse = messagesStatement(skip, limit, beforeId, afterId)
+        messages = await fetchRows(db, statement)
+        if reverse:
+            messages.reverse()
+
+        logInfo(logger, f"成功获取 {len(messages)} 条留言", sample=True)
+        return messages
+    except Exception as e:
+        logError(logger, e, "获取留言列表失败")
+        return []
+
+
+async def getReplies(
+    db: AsyncSession,
+    parentId: int,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> List[models.MessageRow]:
+    """
+    获取指定留言的回复(按ID正序,最早的在前),参数含义见 crud.getReplies
+
+    Returns:
+        List[MessageRow]: 回复列表
+    """
+    try:
+        statement, reverse = repliesStatement(parentId, limit, beforeId, afterId)
+        replies = await fetchRows(db, statement)
+        if not replies:
+            statement, reverse = repliesStatement(parentId, limit, beforeId, afterId, models.ArchivedMessage)
+            replies = await fetchRows(db, statement)
+        if reverse:
+            replies.reverse()
+
+        logInfo(logger, f"成功获取留言 {parentId} 的 {len(replies)} 条回复", sample=True)
+        return replies
+    except Exception as e:
+        logError(logger, e, f"获取回复失败 父留言ID: {parentId}")
+        return []
+
+
+async def getRepliesOfMessage(
+    db: AsyncSession,
+    parentId: int,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> Optional[List[models.MessageRow]]:
+    """
+    检查父留言存在并获取它的回复,参数含义见 crud.getRepliesOfMessage
+
+    Returns:
+        Optional[List[MessageRow]]: 回复列表,父留言不存在时返回None
+    """
+    if not await getMessage(db, parentId):
+        return None
+    return await getReplies(db, parentId, limit=limit, beforeId=beforeId, afterId=afterId)
+
+
+async def getRepliesForParents(
+    db: AsyncSession,
+    parentIds: Iterable[int],
+    limit: Optional[int] = None
+) -> Dict[int, List[models.MessageRow]]:
+    """
+    批量获取多条留言的前若干条回复(按ID正序),参数含义见 crud.getRepliesForParents
+
+    Returns:
+        Dict[int, List[MessageRow]]: 父留言ID到回复列表的映射
+    """
+    parentIds = list(dict.fromkeys(parentIds))
+    if not parentIds:
+        return {}
+
+    try:
+        replies = await fetchRows(db, repliesForParentsStatement(parentIds, limit))
+        missing = missingParents(parentIds, replies)
+        if missing:
+            replies += await fetchRows(db, repliesForParentsStatement(missing, limit, models.ArchivedMessage))
+        logInfo(logger, f"成功批量获取 {len(parentIds)} 条留言的 {len(replies)} 条回复", sample=True)
+        return groupReplies(parentIds, replies)
+    except Exception as e:
+        logError(logger, e, f"批量获取回复失败 父留言ID: {parentIds}")
+        return groupReplies(parentIds, [])
+
+
+async def createMessage(
+    db: AsyncSession,
+    message: schemas.MessageCreate,
+    ip_address: str = None,
+    location: str = None
+) -> Optional[models.Message]:
+    """
+    创建新留言,参数含义见 crud.createMessage
+
+    Returns:
+        Optional[Message]: 创建的留言对象，失败时返回None
+
+    Raises:
+        ValueError: 当内容超过字符限制、回复的留言不存在或已归档时
+    """
+    try:
+        dbMessage = buildMessage(message, ip_address, location)
+
+        # 回复: 父留言回复数加一兼作存在性检查,与插入回复在同一事务中提交
+        if message.parent_id:
+            result = await db.execute(counterStatement(message.parent_id, "reply_count"),
+                                      execution_options={"synchronize_session": False})
+            if not result.rowcount:
+                await db.rollback()
+                archived = (await db.execute(archivedMessageStatement(message.parent_id))).first()
+                raise ValueError(ERROR_MESSAGES["message_archived" if archived else "parent_not_found"])
+
+        # 留言和全文索引在同一事务中写入
+        db.add(dbMessage)
+        await db.flush()
+        if isSearchSupported(db.bind.dialect.name):
+            await db.execute(INDEX_STATEMENT, indexParams(dbMessage))
+
+        db.expunge(dbMessage)
+        await db.commit()
+
+        notifyMessageCreated(dbMessage)
+
+        logInfo(logger, f"成功创建留言 ID: {dbMessage.id}, IP: {ip_address}, 位置: {location}")
+        return dbMessage
+
+    except ValueError:
+        raise
+    except Exception as e:
+        logError(logger, e, "创建留言失败")
+        await db.rollback()
+        return None
+
+
+async def incrementCounter(db: AsyncSession, messageId: int, column: str, amount: int = 1) -> Optional[models.Message]:
+    """
+    在SQL中原子地增加留言的计数字段,参数含义见 crud.incrementCounter
+
+    Returns:
+        Optional[Message]: 更新后的留言对象(已脱离会话),留言不存在时返回None
+    """
+    statement = counterStatement(messageId, column, amount)
+
+    if db.bind.dialect.update_returning:
+        result = await db.scalars(
+            statement.returning(models.Message),
+            execution_options={"synchronize_session": False, "populate_existing": True}
+        )
+        message = result.first()
+    else:
+        await db.execute(statement, execution_options={"synchronize_session": False})
+        message = await db.get(models.Message, messageId, populate_existing=True)
+
+    if message is None:
+        await db.rollback()
+        return None
+
+    db.expunge(message)
+    await db.commit()
+    responseCache.invalidateTags(f"msg:{messageId}")
+    return message
+
+
+async def bufferVote(db: AsyncSession, messageId: int, likes: int = 0, dislikes: int = 0) -> Optional[models.Message]:
+    """
+    buffered 模式下记录一次投票,参数含义见 crud.bufferVote
+
+    Returns:
+        Optional[Message]: 留言对象(已脱离会话),留言不存在或已归档时返回None
+    """
+    message = await db.get(models.Message, messageId)
+    if not message:
+        return None
+
+    voteBuffer.add(messageId, likes=likes, dislikes=dislikes)
+    db.expunge(message)
+    return applyPendingVotes(message, messageId)
+
+
+async def likeMessage(db: AsyncSession, messageId: int) -> Optional[models.Message]:
+    """
+    给留言点赞
+
+    Args:
+        db (AsyncSession): 异步数据库会话
+        messageId (int): 留言ID
+
+    Returns:
+        Optional[Message]: 更新后的留言对象，失败时返回None
+    """
+    return await vote(db, messageId, "like_count")
+
+
+async def dislikeMessage(db: AsyncSession, messageId: int) -> Optional[models.Message]:
+    """
+    给留言踩
+
+    Args:
+        db (AsyncSession): 异步数据库会话
+        messageId (int): 留言ID
+
+    Returns:
+        Optional[Message]: 更新后的留言对象，失败时返回None
+    """
+    return await vote(db, messageId, "dislike_count")
+
+
+async def vote(db: AsyncSession, messageId: int, column: str) -> Optional[models.Message]:
+    """
+    点赞或点踩的公共实现
+
+    Args:
+        db (AsyncSession): 异步数据库会话
+        messageId (int): 留言ID
+        column (str): like_count 或 dislike_count
+
+    Returns:
+        Optional[Message]: 更新后的留言对象，失败时返回None
+    """
+    try:
+        if VOTE_CONFIG["mode"] == "buffered":
+            isLike = column == "like_count"
+            message = await bufferVote(db, messageId, likes=int(isLike), dislikes=int(not isLike))
+        else:
+            message = await incrementCounter(db, messageId, column)
+        if message:
+            eventHub.publishCounts(message)
+            hotRanking.update(message)
+            logInfo(logger, f"留言 {messageId} 投票成功({column}): {getattr(message, column)}", sample=True)
+            return message
+        logError(logger, Exception(ERROR_MESSAGES["message_not_found"]), f"投票失败，留言不存在 ID: {messageId}")
+        return None
+    except Exception as e:
+        logError(logger, e, f"投票失败 ID: {messageId}")
+        await db.rollback()
+        return None
+
+
+async def getMessagesWithReplies(
+    db: AsyncSession,
+    replyLimit: int,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    beforeId: Optional[int] = None,
+    afterId: Optional[int] = None
+) -> Tuple[List[models.MessageRow], Dict[int, List[models.MessageRow]]]:
+    """
+    获取一页留言及每条留言的前若干条回复,参数含义见 crud.getMessagesWithReplies
+
+    Returns:
+        Tuple[List[MessageRow], Dict[int, List[MessageRow]]]: (留言列表, 留言ID到回复列表的映射)
+    """
+    messages = await getMessages(db, skip=skip, limit=limit, beforeId=beforeId, afterId=afterId)
+    return messages, await getRepliesForParents(db, [item.id for item in messages if item.reply_count], replyLimit)
+
+
+async def getMessagesByIds(db: AsyncSession, messageIds: List[int]) -> List[models.MessageRow]:
+    """
+    按给定顺序批量获取留言,参数含义见 crud.getMessagesByIds
+
+    Returns:
+        List[MessageRow]: 只读留言行,顺序与 messageIds 一致
+    """
+    if not messageIds:
+        return []
+    try:
+        rows = await fetchRows(db, select(*models.PUBLIC_COLUMNS).where(models.Message.id.in_(messageIds)))
+        return orderByIds(messageIds, rows)
+    except Exception as e:
+        logError(logger, e, f"批量获取留言失败 ID: {messageIds}")
+        return []
+
+
+async def searchMessages(
+    db: AsyncSession,
+    matchQuery: str,
+    limit: Optional[int] = None,
+    snapshotId: Optional[int] = None,
+    offset: int = 0
+) -> Tuple[List[Tuple[models.MessageRow, float]], int]:
+    """
+    全文搜索留言,参数含义见 crud.searchMessages
+
+    Returns:
+        Tuple[List[Tuple[MessageRow, float]], int]: ((只读留言行, 相关度分数) 列表, 快照ID)
+    """
+    try:
+        if snapshotId is None:
+            snapshotId = (await db.execute(SNAPSHOT_STATEMENT)).scalar()
+        statement, params = searchStatement(matchQuery, resolvePageSize(limit), snapshotId, offset)
+        results = toResults(await db.execute(statement, params))
+        logInfo(logger, f"搜索 {matchQuery} 返回 {len(results)} 条结果", sample=True)
+        return results, snapshotId
+    except Exception as e:
+        logError(logger, e, f"搜索留言失败: {matchQuery}")
+        return [], snapshotId or 0
@@ -1,21 +1,166 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from config import DATABASE_CONFIG
+from config import API_CONFIG, DATABASE_CONFIG
 from logger import setupLogger, logInfo, logError
 import os
 
 # 设置日志
 logger = setupLogger("database")
 
+def isSqliteMemoryUrl(url) -> bool:
+    """
+    判断是否为SQLite内存数据库
+
+    Args:
+        url: 数据库URL
+
+    Returns:
+        bool: 是否为内存数据库
+    """
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def toAsyncUrl(url: str) -> str:
+    """
+    把数据库URL转换为使用异步驱动的URL
+
+    Args:
+        url (str): 数据库URL,如 sqlite:///./treehole.db
+
+    Returns:
+        str: 异步驱动URL,如 sqlite+aiosqlite:///./treehole.db;已指定异步驱动时原样返回
+
+    Raises:
+        ValueError: 当数据库类型没有对应的异步驱动时
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername in ASYNC_DRIVERS.values():
+        return url
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"数据库 {backend} 不支持异步模式")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def engineOptions(url: str) -> dict:
+    """
+    生成创建引擎的公共参数
+
+    Args:
+        url (str): 数据库URL
+
+    Returns:
+        dict: connect_args 和连接池参数(内存数据库不设置连接池大小)
+    """
+    isSqlite = make_url(url).get_backend_name() == "sqlite"
+    options = {"connect_args": DATABASE_CONFIG["connect_args"] if isSqlite else {}}
+    if not isSqliteMemoryUrl(url):
+        options.update(
+            pool_size=DATABASE_CONFIG["pool_size"],
+            max_overflow=DATABASE_CONFIG["max_overflow"],
+            pool_timeout=DATABASE_CONFIG["pool_timeout"],
+            pool_pre_ping=not isSqlite,
+        )
+    return options
+
+def applySqlitePragmas(targetEngine: Engine, pragmas: dict = None):
+    """
+    在SQLite引擎的每个新连接上应用PRAGMA配置
+
+    Args:
+        targetEngine (Engine): 同步引擎(异步引擎传入其 sync_engine)
+        pragmas (dict): SQLite PRAGMA配置,默认使用 DATABASE_CONFIG["sqlite_pragmas"]
+    """
+    sqlitePragmas = DATABASE_CONFIG["sqlite_pragmas"] if pragmas is None else pragmas
+
+    @event.listens_for(targetEngine, "connect")
+    def onConnect(dbapiConnection, connectionRecord):
+        cursor = dbapiConnection.cursor()
+        try:
+            for name, value in sqlitePragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def createDatabaseEngine(url: str, pragmas: dict = None) -> Engine:
+    """
+    创建数据库引擎
+
+    SQLite数据库在每个新连接上应用 pragmas 中的存储配置(WAL、同步级别、mmap等);
+    文件数据库和其他数据库使用 DATABASE_CONFIG 中的连接池大小
+
+    Args:
+        url (str): 数据库URL
+        pragmas (dict): SQLite PRAGMA配置,默认使用 DATABASE_CONFIG["sqlite_pragmas"]
+
+    Returns:
+        Engine: 数据库引擎
+    """
+    newEngine = create_engine(url, **engineOptions(url))
+    if newEngine.dialect.name == "sqlite":
+        applySqlitePragmas(newEngine, pragmas)
+    return newEngine
+
+def createAsyncDatabaseEngine(url: str, pragmas: dict = None) -> AsyncEngine:
+    """
+    创建异步数据库引擎
+
+    使用与同步引擎相同的连接池大小和SQLite存储配置,驱动替换为 aiosqlite / asyncpg
+
+    Args:
+        url (str): 数据库URL(同步或异步驱动均可)
+        pragmas (dict): SQLite PRAGMA配置,默认使用 DATABASE_CONFIG["sqlite_pragmas"]
+
+    Returns:
+        AsyncEngine: 异步数据库引擎
+    """
+    newEngine = create_async_engine(toAsyncUrl(url), **engineOptions(url))
+    if newEngine.dialect.name == "sqlite":
+        applySqlitePragmas(newEngine.sync_engine, pragmas)
+    return newEngine
+
+def getStorageSettings(targetEngine: Engine) -> dict:
+    """
+    读取数据库连接实际生效的存储配置
+
+    Args:
+        targetEngine (Engine): 数据库引擎
+
+    Returns:
+        dict: SQLite返回各PRAGMA的实际值,其他数据库只返回连接池配置
+    """
+    pool = targetEngine.pool
+    settings = {"dialect": targetEngine.dialect.name, "pool": type(pool).__name__}
+    if hasattr(pool, "overflow"):
+        settings["pool_size"] = pool.size()
+        settings["max_overflow"] = DATABASE_CONFIG["max_overflow"]
+    if targetEngine.dialect.name == "sqlite":
+        with targetEngine.connect() as conn:
+            for name in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+                settings[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_CONFIG["url"], 
-    connect_args=DATABASE_CONFIG["connect_args"]
-)
+engine = createDatabaseEngine(DATABASE_CONFIG["url"])
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# 异步模式下的引擎和会话工厂;建表、迁移和后台线程仍使用同步引擎
+# 提交后不过期对象,异步会话中访问过期属性需要再次查询数据库
+asyncEngine = createAsyncDatabaseEngine(DATABASE_CONFIG["url"]) if API_CONFIG["async_mode"] else None
+AsyncSessionLocal = (
+    async_sessionmaker(asyncEngine, autoflush=False, expire_on_commit=False) if asyncEngine else None
+)
+
 def createTables():
     """
     创建数据库表
@@ -23,9 +168,10 @@ def createTables():
     try:
         # 确保logs目录存在
         os.makedirs("logs", exist_ok=True)
-        
+
         Base.metadata.create_all(bind=engine)
         logInfo(logger, "数据库表创建成功")
+        logInfo(logger, f"数据库存储配置(profile={DATABASE_CONFIG['sqlite_profile']}): {getStorageSettings(engine)}")
     except Exception as e:
         logError(logger, e, "创建数据库表失败")
         raise
@@ -33,7 +179,7 @@ def createTables():
 def getDatabase():
     """
     获取数据库会话
-    
+
     Yields:
         Session: 数据库会话对象
     """
@@ -46,3 +192,18 @@ def getDatabase():
         raise
     finally:
         db.close()
+
+async def getAsyncDatabase():
+    """
+    获取异步数据库会话(仅异步模式可用)
+
+    Yields:
+        AsyncSession: 异步数据库会话对象
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logError(logger, e, "数据库会话错误")
+            await db.rollback()
+            raise
@@ -0,0 +1,258 @@
+"""
+留言板事件推送(Server-Sent Events)
+
+crud 中的写操作把事件发布到进程内唯一的 EventHub,
+EventHub 把事件编码一次后分发给所有 SSE 订阅者
+
+- 每个订阅者有独立的有界缓冲,缓冲写满(客户端消费太慢)时直接断开该订阅者,
+  客户端的 EventSource 会自动重连并重新拉取列表
+- 点赞/点踩计数事件在短时间窗口内按留言合并,热门留言的连续点击只推送最新计数
+- 空闲连接定时发送心跳注释,防止被代理服务器断开
+- 事件只分发给本进程的订阅者;多 worker 部署时其他进程的写入不会推送,
+  前端在连接正常时仍低频重新拉取列表进行校对
+
+事件类型:
+- message: 新留言, data 为留言内容
+- reply: 新回复, data 为回复内容(含 parent_id)
+- counts: 计数变化, data 为 [{"id", "like_count", "dislike_count", "reply_count"}, ...]
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from config import SSE_CONFIG
+from logger import setupLogger, logInfo
+from models import PUBLIC_FIELDS
+
+logger = setupLogger("event_hub")
+
+
+def messageEventData(message) -> dict:
+    """
+    提取留言中可以推送给客户端的字段
+
+    Args:
+        message: 留言对象
+
+    Returns:
+        dict: 可JSON序列化的字段字典
+    """
+    data = {field: getattr(message, field, None) for field in PUBLIC_FIELDS}
+    if data["timestamp"] is not None:
+        data["timestamp"] = data["timestamp"].isoformat()
+    return data
+
+
+class Subscriber:
+    """
+    单个SSE订阅者
+
+    只在事件循环线程中访问
+
+    Attributes:
+        maxBuffer (int): 缓冲的最大事件数
+        closed (bool): 是否已被断开
+    """
+
+    def __init__(self, maxBuffer: int):
+        self.maxBuffer = maxBuffer
+        self.buffer: Deque[bytes] = deque()
+        self.closed = False
+        self.wakeup = asyncio.Event()
+
+    def push(self, payload: bytes) -> bool:
+        """
+        放入一个已编码的事件
+
+        Args:
+            payload (bytes): SSE事件文本
+
+        Returns:
+            bool: 缓冲已满时返回False,订阅者被标记为断开
+        """
+        if self.closed:
+            return False
+        if len(self.buffer) >= self.maxBuffer:
+            self.closed = True
+            self.buffer.clear()
+            self.wakeup.set()
+            return False
+        self.buffer.append(payload)
+        self.wakeup.set()
+        return True
+
+
+class EventHub:
+    """
+    进程内事件分发中心
+
+    publish 可以在任意线程调用(crud 运行在线程池中),
+    实际分发通过 call_soon_threadsafe 交给事件循环执行,每个事件只跨线程一次
+    """
+
+    def __init__(
+        self,
+        maxSubscribers: int = SSE_CONFIG["max_subscribers"],
+        bufferSize: int = SSE_CONFIG["buffer_size"],
+        heartbeatSeconds: float = SSE_CONFIG["heartbeat_seconds"],
+        coalesceMs: int = SSE_CONFIG["coalesce_ms"]
+    ):
+        self.maxSubscribers = maxSubscribers
+        self.bufferSize = bufferSize
+        self.heartbeatSeconds = heartbeatSeconds
+        self.coalesceMs = coalesceMs
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._eventId = 0
+        self._pendingCounts: Dict[int, dict] = {}
+        self._countsScheduled = False
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.evicted = 0
+
+    @property
+    def subscriberCount(self) -> int:
+        """
+        当前订阅者数量
+        """
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscriber]:
+        """
+        注册订阅者,必须在事件循环中调用
+
+        Returns:
+            Optional[Subscriber]: 订阅者,超过最大订阅数时返回None
+        """
+        if len(self._subscribers) >= self.maxSubscribers:
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.bufferSize)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """
+        注销订阅者
+
+        Args:
+            subscriber (Subscriber): 订阅者
+        """
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data):
+        """
+        发布事件(线程安全)
+
+        没有订阅者时直接返回,几乎没有开销
+
+        Args:
+            event (str): 事件类型
+            data: 可JSON序列化的事件数据
+        """
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        loop.call_soon_threadsafe(self._fanout, event, body)
+
+    def publishMessage(self, message):
+        """
+        发布新留言或新回复事件(线程安全)
+
+        Args:
+            message: 留言对象,有 parent_id 时作为 reply 事件发布
+        """
+        if not self._subscribers:
+            return
+        self.publish("reply" if message.parent_id else "message", messageEventData(message))
+
+    def publishCounts(self, message):
+        """
+        发布计数变化(线程安全),同一留言在合并窗口内只推送最后一次
+
+        Args:
+            message: 留言对象
+        """
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        counts = {
+            "id": message.id,
+            "like_count": message.like_count,
+            "dislike_count": message.dislike_count,
+            "reply_count": message.reply_count,
+        }
+        with self._lock:
+            self._pendingCounts[message.id] = counts
+            if self._countsScheduled:
+                return
+            self._countsScheduled = True
+        loop.call_soon_threadsafe(loop.call_later, self.coalesceMs / 1000, self._flushCounts)
+
+    def getStats(self) -> dict:
+        """
+        获取推送统计
+
+        Returns:
+            dict: 订阅者数、已发布事件数、因消费过慢被断开的订阅者数
+        """
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.maxSubscribers,
+            "published": self.published,
+            "evicted": self.evicted,
+        }
+
+    async def stream(self, subscriber: Subscriber, isDisconnected):
+        """
+        生成订阅者的SSE字节流
+
+        Args:
+            subscriber (Subscriber): 订阅者
+            isDisconnected: 返回客户端是否已断开的协程函数
+
+        Yields:
+            bytes: SSE文本
+        """
+        try:
+            yield b"retry: 3000\n\n"
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), timeout=self.heartbeatSeconds)
+                except asyncio.TimeoutError:
+                    if await isDisconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+                subscriber.wakeup.clear()
+                while subscriber.buffer:
+                    yield subscriber.buffer.popleft()
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _fanout(self, event: str, body: str):
+        # 在事件循环线程中执行
+        self._eventId += 1
+        self.published += 1
+        payload = f"id: {self._eventId}\nevent: {event}\ndata: {body}\n\n".encode("utf-8")
+        for subscriber in list(self._subscribers):
+            if not subscriber.push(payload):
+                self._subscribers.discard(subscriber)
+                self.evicted += 1
+                logInfo(logger, "SSE订阅者消费过慢,已断开")
+
+    def _flushCounts(self):
+        with self._lock:
+            counts, self._pendingCounts = list(self._pendingCounts.values()), {}
+            self._countsScheduled = False
+        if counts:
+            self._fanout("counts", json.dumps(counts, separators=(",", ":")))
+
+
+# 全局实例
+eventHub = EventHub()
@@ -0,0 +1,160 @@
+"""
+留言地理位置后台补全
+
+创建留言时不再同步查询IP地理位置,而是先以空位置入库,
+再把 (留言ID, IP) 放入有界队列,由后台线程查询后回写 location 字段
+
+队列满时新任务直接丢弃(该留言不显示位置),保证发帖请求永远不会被地理位置查询阻塞
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import crud
+from config import GEO_CONFIG
+from database import SessionLocal
+from ip_utils import get_ip_location
+from logger import setupLogger, logError, logInfo
+
+logger = setupLogger("geo_worker")
+
+
+class GeoEnrichmentWorker:
+    """
+    地理位置补全工作线程池
+
+    Attributes:
+        queueSize (int): 队列最大长度
+        workerCount (int): 工作线程数
+    """
+
+    def __init__(
+        self,
+        sessionFactory: Callable = SessionLocal,
+        lookup: Callable[[str], Optional[str]] = get_ip_location,
+        queueSize: int = GEO_CONFIG["queue_size"],
+        workerCount: int = GEO_CONFIG["worker_count"]
+    ):
+        self.sessionFactory = sessionFactory
+        self.lookup = lookup
+        self.queueSize = queueSize
+        self.workerCount = max(workerCount, 1)
+        self._queue = queue.Queue(maxsize=queueSize)
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # 统计数据,只由工作线程或持锁时修改
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.resolved = 0
+        self.failed = 0
+        self.lastLagMs = 0.0
+        self.maxLagMs = 0.0
+        self._totalLagMs = 0.0
+
+    def start(self):
+        """
+        启动工作线程(重复调用无副作用)
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workerCount):
+                thread = threading.Thread(target=self._run, name=f"geo-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logInfo(logger, f"地理位置补全线程已启动,线程数: {self.workerCount}, 队列长度: {self.queueSize}")
+
+    def submit(self, messageId: int, ipAddress: str) -> bool:
+        """
+        提交一个地理位置补全任务
+
+        首次提交时自动启动工作线程
+
+        Args:
+            messageId (int): 留言ID
+            ipAddress (str): 留言者IP地址
+
+        Returns:
+            bool: 是否成功入队,队列已满时返回False
+        """
+        if not ipAddress or ipAddress == "未知":
+            return False
+        if not self._threads:
+            self.start()
+        try:
+            self._queue.put_nowait((messageId, ipAddress, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def join(self):
+        """
+        等待队列中所有任务处理完毕
+        """
+        self._queue.join()
+
+    def getStats(self) -> dict:
+        """
+        获取队列和处理统计
+
+        Returns:
+            dict: 队列深度、延迟(入队到开始处理的时间)、成功和失败次数等
+        """
+        with self._lock:
+            return {
+                "running": bool(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self.queueSize,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "resolved": self.resolved,
+                "failed": self.failed,
+                "last_lag_ms": round(self.lastLagMs, 2),
+                "max_lag_ms": round(self.maxLagMs, 2),
+                "avg_lag_ms": round(self._totalLagMs / self.processed, 2) if self.processed else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            messageId, ipAddress, enqueuedAt = self._queue.get()
+            try:
+                self._process(messageId, ipAddress, enqueuedAt)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, messageId: int, ipAddress: str, enqueuedAt: float):
+        lagMs = (time.monotonic() - enqueuedAt) * 1000
+        ok = False
+        try:
+            location = self.lookup(ipAddress)
+            if location:
+                db = self.sessionFactory()
+                try:
+                    ok = crud.updateMessageLocation(db, messageId, location)
+                finally:
+                    db.close()
+        except Exception as e:
+            logError(logger, e, f"补全留言位置失败 ID: {messageId}")
+
+        with self._lock:
+            self.processed += 1
+            if ok:
+                self.resolved += 1
+            else:
+                self.failed += 1
+            self.lastLagMs = lagMs
+            self.maxLagMs = max(self.maxLagMs, lagMs)
+            self._totalLagMs += lagMs
+
+
+# 全局实例,由 main.py 在创建留言后提交任务
+geoWorker = GeoEnrichmentWorker()
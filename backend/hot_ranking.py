@@ -0,0 +1,283 @@
+"""
+热门留言排行
+
+GET /messages/hot 的排序不在请求中计算,而是读取进程内维护好的排行榜,读取一页只需 O(页大小)
+
+热度分数(与 reddit 的 hot 排序相同):
+    score = sign(s) * log10(max(|s|, 1)) + (发表时间 - 基准时间) / gravitySeconds
+    其中 s = 点赞数 - 点踩数
+发表时间越晚分数越高,每晚 gravitySeconds 秒相当于净赞数多10倍。
+分数只取决于票数和发表时间,不随当前时间衰减,因此排行可以增量维护:
+- 发表顶层留言、点赞、点踩时由 crud 调用 update,按最新计数重新计算该留言的分数
+- 后台线程随服务启动(main.lifespan),启动后立即建立排行,之后每隔 rebuild_interval_seconds 秒
+  从数据库重建一次,修正多进程部署时其他进程的投票、以及被挤出排行后又获得投票的留言;服务退出时停止
+
+排行只保留分数最高的 capacity 条留言,保存在按 (-分数, -ID) 排序的列表中;
+重建时只需要考虑最新的 candidates 条顶层留言,更早的留言需要多出数量级的净赞数才能进入排行
+"""
+
+import bisect
+import datetime
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+import models
+from config import HOT_CONFIG
+from database import SessionLocal
+from logger import setupLogger, logError, logInfo
+
+logger = setupLogger("hot_ranking")
+
+# 分数的时间基准,只影响分数的绝对值,不影响排序
+EPOCH = datetime.datetime(2024, 1, 1)
+
+
+def hotScore(likes: int, dislikes: int, timestamp: Optional[datetime.datetime],
+             gravitySeconds: int = HOT_CONFIG["gravity_seconds"]) -> float:
+    """
+    计算热度分数
+
+    Args:
+        likes (int): 点赞数
+        dislikes (int): 点踩数
+        timestamp (Optional[datetime]): 发表时间(UTC)
+        gravitySeconds (int): 净赞数多10倍所抵消的时间差(秒)
+
+    Returns:
+        float: 热度分数,越大越热门
+    """
+    net = (likes or 0) - (dislikes or 0)
+    order = math.log10(max(abs(net), 1))
+    sign = (net > 0) - (net < 0)
+    seconds = ((timestamp or EPOCH) - EPOCH).total_seconds()
+    return round(sign * order + seconds / gravitySeconds, 7)
+
+
+class HotRanking:
+    """
+    热门留言排行榜
+
+    Attributes:
+        capacity (int): 排行保留的留言数
+        candidates (int): 重建时读取的最新顶层留言数
+        rebuildIntervalSeconds (int): 后台重建间隔(秒)
+    """
+
+    def __init__(
+        self,
+        sessionFactory: Callable = SessionLocal,
+        capacity: int = HOT_CONFIG["capacity"],
+        candidates: int = HOT_CONFIG["candidates"],
+        rebuildIntervalSeconds: int = HOT_CONFIG["rebuild_interval_seconds"]
+    ):
+        self.sessionFactory = sessionFactory
+        self.capacity = max(capacity, 1)
+        self.candidates = candidates
+        self.rebuildIntervalSeconds = rebuildIntervalSeconds
+        # 按 (-分数, -ID) 升序排列,即分数高的在前,同分时新的在前
+        self._keys: List[Tuple[float, int]] = []
+        self._scores: Dict[int, float] = {}
+        self._built = False
+        # 重建期间发生的更新,重建完成后重新应用,避免被重建读到的旧数据覆盖
+        self._dirty: Optional[Dict[int, float]] = None
+        self._lock = threading.Lock()
+        self._buildLock = threading.Lock()
+        self._thread = None
+        self._stopEvent = threading.Event()
+
+        self.rebuilds = 0
+        self.updates = 0
+
+    @property
+    def built(self) -> bool:
+        """
+        是否已从数据库建立过排行
+        """
+        return self._built
+
+    def update(self, message):
+        """
+        按留言的最新计数更新排行(线程安全)
+
+        回复不参与排行;排行尚未建立时忽略,建立时会从数据库读取最新计数
+
+        Args:
+            message: 留言对象,需要 id、parent_id、like_count、dislike_count、timestamp
+        """
+        if message.parent_id or not self._built:
+            return
+        score = hotScore(message.like_count, message.dislike_count, message.timestamp)
+        with self._lock:
+            if self._dirty is not None:
+                self._dirty[message.id] = score
+            self._set(message.id, score)
+            self.updates += 1
+
+    def remove(self, messageIds):
+        """
+        从排行中移除留言(线程安全),用于归档后的帖子
+
+        Args:
+            messageIds: 留言ID列表
+        """
+        with self._lock:
+            for messageId in messageIds:
+                if self._dirty is not None:
+                    self._dirty.pop(messageId, None)
+                score = self._scores.pop(messageId, None)
+                if score is not None:
+                    del self._keys[bisect.bisect_left(self._keys, (-score, -messageId))]
+
+    def page(self, limit: int, after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+        """
+        读取一页排行
+
+        Args:
+            limit (int): 返回的留言数
+            after (Optional[Tuple[float, int]]): 游标,上一页最后一条的 (分数, 留言ID)
+
+        Returns:
+            List[Tuple[int, float]]: (留言ID, 分数) 列表,按热度从高到低
+        """
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._keys, (-after[0], -after[1]))
+            return [(-negId, -negScore) for negScore, negId in self._keys[start:start + limit]]
+
+    def rebuild(self) -> int:
+        """
+        从数据库重建排行
+
+        Returns:
+            int: 排行中的留言数
+        """
+        with self._buildLock:
+            with self._lock:
+                self._dirty = {}
+            try:
+                scores = self._loadScores()
+            except Exception:
+                with self._lock:
+                    self._dirty = None
+                raise
+
+            keys = sorted((-score, -messageId) for messageId, score in scores.items())[:self.capacity]
+            with self._lock:
+                dirty, self._dirty = self._dirty, None
+                self._keys = keys
+                self._scores = {-negId: -negScore for negScore, negId in keys}
+                for messageId, score in dirty.items():
+                    self._set(messageId, score)
+                self._built = True
+                self.rebuilds += 1
+                return len(self._keys)
+
+    def ensureBuilt(self):
+        """
+        后台线程尚未建立排行(或未启动)时,在读取前建立一次
+        """
+        if not self._built:
+            self.rebuild()
+
+    def clear(self):
+        """
+        清空排行,下次读取时重新从数据库建立
+        """
+        with self._lock:
+            self._keys = []
+            self._scores = {}
+            self._built = False
+
+    def start(self):
+        """
+        启动后台重建线程(重复调用无副作用;重建间隔为0时不启动)
+        """
+        if self.rebuildIntervalSeconds <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopEvent.clear()
+            self._thread = threading.Thread(target=self._run, name="hot-ranking", daemon=True)
+            self._thread.start()
+        logInfo(logger, f"热门排行后台重建已启动,间隔: {self.rebuildIntervalSeconds}s")
+
+    def stop(self, timeout: float = 5.0):
+        """
+        停止后台重建线程,等待正在进行的重建完成
+
+        Args:
+            timeout (float): 最多等待的秒数
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopEvent.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def getStats(self) -> dict:
+        """
+        获取排行统计
+
+        Returns:
+            dict: 排行中的留言数、重建和增量更新次数
+        """
+        with self._lock:
+            return {
+                "entries": len(self._keys),
+                "capacity": self.capacity,
+                "rebuilds": self.rebuilds,
+                "updates": self.updates,
+            }
+
+    def _set(self, messageId: int, score: float):
+        # 调用方需持有锁;分数低于排行末尾且排行已满时不加入
+        keys = self._keys
+        old = self._scores.pop(messageId, None)
+        if old is not None:
+            del keys[bisect.bisect_left(keys, (-old, -messageId))]
+        key = (-score, -messageId)
+        if len(keys) >= self.capacity and key > keys[-1]:
+            return
+        bisect.insort(keys, key)
+        self._scores[messageId] = score
+        if len(keys) > self.capacity:
+            _, negId = keys.pop()
+            del self._scores[-negId]
+
+    def _loadScores(self) -> Dict[int, float]:
+        table = models.Message.__table__
+        columns = (table.c.id, table.c.like_count, table.c.dislike_count, table.c.timestamp)
+        with self._lock:
+            current = list(self._scores)
+
+        db = self.sessionFactory()
+        try:
+            rows = db.execute(
+                select(*columns).where(table.c.parent_id == None).order_by(table.c.id.desc()).limit(self.candidates)
+            ).all()
+            # 当前排行中更早的留言也重新计算,票数可能已被其他进程改变
+            for offset in range(0, len(current), 500):
+                rows += db.execute(
+                    select(*columns).where(table.c.id.in_(current[offset:offset + 500]))
+                ).all()
+        finally:
+            db.close()
+        return {row.id: hotScore(row.like_count, row.dislike_count, row.timestamp) for row in rows}
+
+    def _run(self):
+        # 启动后立即建立排行,之后按间隔重建
+        interval = 0
+        while not self._stopEvent.wait(interval):
+            interval = self.rebuildIntervalSeconds
+            try:
+                count = self.rebuild()
+                logInfo(logger, f"热门排行已重建,共 {count} 条", sample=True)
+            except Exception as e:
+                logError(logger, e, "重建热门排行失败")
+
+
+# 全局实例
+hotRanking = HotRanking()
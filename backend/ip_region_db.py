@@ -0,0 +1,214 @@
+"""
+本地IP区段数据库
+
+把 "起始IP,结束IP,国家,省份,城市" 形式的CSV区段表转换为紧凑的二进制文件,
+查询时通过内存映射(mmap)直接在文件上二分查找,不需要把整张表读入内存,也不需要网络
+
+文件格式(所有整数均为小端序):
+    文件头  magic(8字节) IPv4条数(u32) IPv6条数(u32) IPv4表偏移(u64) IPv6表偏移(u64) 字符串表偏移(u64)
+    IPv4表  每条12字节: 起始IP(u32) 结束IP(u32) 位置字符串偏移(u32),按起始IP升序
+    IPv6表  每条36字节: 起始IP(16字节大端) 结束IP(16字节大端) 位置字符串偏移(u32),按起始IP升序
+    字符串表 每条: 长度(u16) + UTF-8内容,相同的位置字符串只存一份
+
+命令行用法:
+    python ip_region_db.py build ranges.csv data/ip_region.db
+    python ip_region_db.py lookup data/ip_region.db 1.2.3.4
+"""
+
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from ip_utils import format_location
+
+MAGIC = b"THIPDB01"
+HEADER = struct.Struct("<8sIIQQQ")
+V4_RECORD = struct.Struct("<III")
+V6_RECORD = struct.Struct("<16s16sI")
+STRING_LENGTH = struct.Struct("<H")
+
+
+class IpRegionDatabase:
+    """
+    内存映射的IP区段数据库(只读)
+
+    Attributes:
+        path (str): 数据库文件路径
+        v4Count (int): IPv4区段数
+        v6Count (int): IPv6区段数
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"IP数据库文件格式错误: {path}")
+        magic, self.v4Count, self.v6Count, self._v4Offset, self._v6Offset, self._stringsOffset = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"IP数据库文件格式错误: {path}")
+
+    def close(self):
+        """
+        关闭内存映射
+        """
+        self._mm.close()
+
+    def lookup(self, ip_address: str) -> Optional[str]:
+        """
+        查询IP地址所在区段的位置
+
+        IPv4映射的IPv6地址(::ffff:a.b.c.d)按IPv4查询
+
+        Args:
+            ip_address (str): IP地址
+
+        Returns:
+            Optional[str]: 位置字符串,未收录时返回None
+
+        Raises:
+            ValueError: 当IP地址格式无效时
+        """
+        ip = ipaddress.ip_address(ip_address)
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+
+        if ip.version == 4:
+            offset = self._search(int(ip), self._v4Offset, self.v4Count, V4_RECORD)
+        else:
+            offset = self._search(ip.packed, self._v6Offset, self.v6Count, V6_RECORD)
+
+        return None if offset is None else self._readString(offset)
+
+    def _search(self, key, tableOffset: int, count: int, record: struct.Struct) -> Optional[int]:
+        # 二分查找最后一个起始IP <= key 的区段
+        mm = self._mm
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            start = record.unpack_from(mm, tableOffset + mid * record.size)[0]
+            if start <= key:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low == 0:
+            return None
+        _, end, stringOffset = record.unpack_from(mm, tableOffset + (low - 1) * record.size)
+        return stringOffset if key <= end else None
+
+    def _readString(self, offset: int) -> str:
+        position = self._stringsOffset + offset
+        (length,) = STRING_LENGTH.unpack_from(self._mm, position)
+        start = position + STRING_LENGTH.size
+        return self._mm[start:start + length].decode("utf-8")
+
+
+# ==================== CSV转换 ====================
+
+def _parseRow(row: List[str]) -> Optional[Tuple[ipaddress._BaseAddress, ipaddress._BaseAddress, str]]:
+    if len(row) < 3:
+        return None
+    start = ipaddress.ip_address(row[0].strip())
+    end = ipaddress.ip_address(row[1].strip())
+    if start.version != end.version or start > end:
+        raise ValueError(f"无效的IP区段: {row[0]} - {row[1]}")
+
+    fields = [field.strip() for field in row[2:5]] + [""] * (5 - len(row))
+    location = format_location(*fields[:3])
+    return start, end, location
+
+
+def buildFromCsv(csvPath: str, outputPath: str) -> Tuple[int, int]:
+    """
+    将CSV区段表转换为二进制IP数据库
+
+    CSV每行: 起始IP,结束IP,国家,省份,城市(省份、城市可为空),
+    第一行如果不是IP地址则视为表头跳过。位置字符串的组合规则与远程API查询一致
+
+    Args:
+        csvPath (str): CSV文件路径
+        outputPath (str): 输出文件路径
+
+    Returns:
+        Tuple[int, int]: (IPv4区段数, IPv6区段数)
+
+    Raises:
+        ValueError: 当区段格式无效或相互重叠时
+    """
+    v4: List[Tuple[int, int, str]] = []
+    v6: List[Tuple[bytes, bytes, str]] = []
+
+    with open(csvPath, newline="", encoding="utf-8") as f:
+        for lineNo, row in enumerate(csv.reader(f), start=1):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                parsed = _parseRow(row)
+            except ValueError:
+                if lineNo == 1:
+                    continue  # 表头
+                raise
+            if not parsed or not parsed[2]:
+                continue
+            start, end, location = parsed
+            if start.version == 4:
+                v4.append((int(start), int(end), location))
+            else:
+                v6.append((start.packed, end.packed, location))
+
+    strings: Dict[str, int] = {}
+    stringTable = bytearray()
+
+    def stringOffset(location: str) -> int:
+        if location not in strings:
+            encoded = location.encode("utf-8")
+            strings[location] = len(stringTable)
+            stringTable.extend(STRING_LENGTH.pack(len(encoded)))
+            stringTable.extend(encoded)
+        return strings[location]
+
+    tables = []
+    for ranges, record in ((v4, V4_RECORD), (v6, V6_RECORD)):
+        ranges.sort()
+        table = bytearray()
+        for i, (start, end, location) in enumerate(ranges):
+            if i and start <= ranges[i - 1][1]:
+                raise ValueError(f"IP区段重叠: 第 {i} 条与第 {i + 1} 条")
+            table.extend(record.pack(start, end, stringOffset(location)))
+        tables.append(table)
+
+    v4Offset = HEADER.size
+    v6Offset = v4Offset + len(tables[0])
+    stringsOffset = v6Offset + len(tables[1])
+
+    os.makedirs(os.path.dirname(os.path.abspath(outputPath)), exist_ok=True)
+    tmpPath = outputPath + ".tmp"
+    with open(tmpPath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), v4Offset, v6Offset, stringsOffset))
+        f.write(tables[0])
+        f.write(tables[1])
+        f.write(stringTable)
+    # 原子替换,正在使用旧文件的进程不受影响
+    os.replace(tmpPath, outputPath)
+
+    return len(v4), len(v6)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "build":
+        v4Count, v6Count = buildFromCsv(sys.argv[2], sys.argv[3])
+        print(f"已生成 {sys.argv[3]}: IPv4区段 {v4Count} 条, IPv6区段 {v6Count} 条")
+    elif len(sys.argv) == 4 and sys.argv[1] == "lookup":
+        print(IpRegionDatabase(sys.argv[2]).lookup(sys.argv[3]) or "未收录")
+    else:
+        print("用法:")
+        print("  python ip_region_db.py build <ranges.csv> <output.db>")
+        print("  python ip_region_db.py lookup <database.db> <ip>")
+        sys.exit(1)
@@ -1,35 +1,73 @@
 """
 IP地理位置查询工具
 
-使用免费的IP地理位置API查询IP地址的地理位置信息
+支持两种数据源(由 GEO_CONFIG["provider"] 选择):
+- remote: 使用免费的IP地理位置API查询
+- local: 使用本地内存映射的IP区段数据库(见 ip_region_db.py),无需网络
+- auto: 优先查本地数据库,查不到时再查询远程API
 """
 
+import ipaddress
+import threading
+import time
+import httpx
 import requests
-from typing import Optional
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from config import GEO_CONFIG, PROXY_CONFIG
 from logger import setupLogger, logError, logInfo
+from metrics import observeGeoLookup
 
 logger = setupLogger("ip_utils")
 
+# 本地IP数据库实例,首次使用时加载
+_local_db = None
+_local_db_lock = threading.Lock()
+_local_db_failed = False
 
-def get_client_ip(request) -> str:
+# 没有配置可信代理却收到代理请求头时只警告一次
+_proxy_headers_warned = False
+
+# 异步模式使用的HTTP客户端,首次查询时创建,复用连接
+_async_client: Optional[httpx.AsyncClient] = None
+
+# 远程地理位置API(默认为 ip-api.com 免费接口,无需API key)
+REMOTE_API_URL = GEO_CONFIG["remote_api_url"]
+REMOTE_API_TIMEOUT = GEO_CONFIG["remote_api_timeout"]
+
+
+def get_client_ip(request, trusted_proxy_count: Optional[int] = None) -> str:
     """
     从请求中获取客户端真实IP地址
 
+    只信任可信代理添加的地址: 每层代理把它看到的对端地址追加到 X-Forwarded-For 末尾,
+    因此客户端IP是从右数第 trusted_proxy_count 个地址,更左边的地址可以由客户端任意伪造。
+    没有可信代理时忽略代理请求头,直接使用连接的对端地址
+
     Args:
         request: FastAPI请求对象
+        trusted_proxy_count (Optional[int]): 可信代理层数,默认使用 PROXY_CONFIG["trusted_proxy_count"]
 
     Returns:
         str: 客户端IP地址
     """
-    # 尝试从各种可能的头部获取IP
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        # X-Forwarded-For可能包含多个IP，取第一个
-        return forwarded.split(",")[0].strip()
+    if trusted_proxy_count is None:
+        trusted_proxy_count = PROXY_CONFIG["trusted_proxy_count"]
 
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
+    if trusted_proxy_count <= 0:
+        _warn_proxy_headers_ignored(request)
+    else:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if hops:
+                # 地址数少于代理层数时说明前面的代理没有追加地址,取最左边(最远)的一个
+                return hops[-min(trusted_proxy_count, len(hops))]
+
+        # 没有 X-Forwarded-For 时使用最近一层代理设置的 X-Real-IP
+        real_ip = request.headers.get("X-Real-IP")
+        if real_ip:
+            return real_ip.strip()
 
     # 如果没有代理，直接从客户端地址获取
     if hasattr(request, "client") and request.client:
@@ -38,11 +76,224 @@ def get_client_ip(request) -> str:
     return "未知"
 
 
+def _warn_proxy_headers_ignored(request):
+    """
+    没有可信代理却收到代理请求头时记录一次警告
+
+    服务部署在 nginx 等反向代理之后却没有设置 TRUSTED_PROXY_COUNT 时,
+    所有请求都会被识别为代理的地址,限流和投票去重对全站共用同一个IP
+
+    Args:
+        request: FastAPI请求对象
+    """
+    global _proxy_headers_warned
+    if _proxy_headers_warned:
+        return
+    if request.headers.get("X-Forwarded-For") or request.headers.get("X-Real-IP"):
+        _proxy_headers_warned = True
+        logger.warning(
+            "收到 X-Forwarded-For/X-Real-IP 请求头,但 TRUSTED_PROXY_COUNT 为0,已忽略;"
+            "服务部署在反向代理之后时请把 TRUSTED_PROXY_COUNT 设为代理层数"
+        )
+
+
+def format_location(country: str, region_name: str, city: str) -> Optional[str]:
+    """
+    将国家、省份、城市组合为位置字符串
+
+    国内地址省略国家,城市与省份相同时(直辖市)只保留一个
+
+    Args:
+        country (str): 国家
+        region_name (str): 省份/地区
+        city (str): 城市
+
+    Returns:
+        Optional[str]: 位置字符串,如 "北京市" 或 "美国 加利福尼亚 洛杉矶",全部为空时返回None
+    """
+    location_parts = []
+    if country and country != "中国":
+        location_parts.append(country)
+    if region_name:
+        location_parts.append(region_name)
+    if city and city != region_name:
+        location_parts.append(city)
+
+    return " ".join(location_parts) if location_parts else None
+
+
+class LocationCache:
+    """
+    带过期时间的LRU缓存,用于缓存IP地理位置查询结果
+
+    查询失败或无结果(None)同样缓存,但使用更短的过期时间,
+    避免对同一个查不到的IP反复请求远程API
+
+    Attributes:
+        max_size (int): 最大条数,超出时淘汰最久未使用的条目
+        ttl (float): 有结果时的缓存秒数
+        negative_ttl (float): 无结果时的缓存秒数
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        读取缓存
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            Tuple[bool, Optional[str]]: (是否命中, 缓存的位置)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, location = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if location is None:
+                self.negative_hits += 1
+            return True, location
+
+    def set(self, key: str, location: Optional[str]):
+        """
+        写入缓存
+
+        Args:
+            key (str): 缓存键
+            location (Optional[str]): 位置,None表示查询失败或无结果
+        """
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if location else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, location)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        清空缓存(统计计数保留)
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中、未命中、淘汰、过期次数以及当前条数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+location_cache = LocationCache(
+    GEO_CONFIG["cache_size"],
+    GEO_CONFIG["cache_ttl"],
+    GEO_CONFIG["cache_negative_ttl"]
+)
+
+
+def location_cache_key(ip_address: str) -> str:
+    """
+    计算IP地址的缓存键
+
+    公网IPv4地址按/24网段分组(同一网段的地理位置在常见IP库中是一致的),
+    内网、保留地址和IPv6地址按完整地址缓存
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        str: 缓存键
+    """
+    if GEO_CONFIG["cache_group_ipv4"]:
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return ip_address
+        if ip.version == 4 and ip.is_global:
+            return str(ipaddress.ip_network(f"{ip}/24", strict=False))
+    return ip_address
+
+
+def get_location_cache_stats() -> dict:
+    """
+    获取地理位置缓存统计
+
+    Returns:
+        dict: 缓存统计
+    """
+    return location_cache.stats()
+
+
+def get_local_database():
+    """
+    获取本地IP数据库实例
+
+    首次调用时打开 GEO_CONFIG["local_db_path"] 指向的文件,加载失败只记录一次日志
+
+    Returns:
+        Optional[IpRegionDatabase]: 数据库实例,文件不存在或格式错误时返回None
+    """
+    global _local_db, _local_db_failed
+
+    if _local_db is not None or _local_db_failed:
+        return _local_db
+
+    with _local_db_lock:
+        if _local_db is None and not _local_db_failed:
+            from ip_region_db import IpRegionDatabase
+            try:
+                _local_db = IpRegionDatabase(GEO_CONFIG["local_db_path"])
+                logInfo(logger, f"加载本地IP数据库: {GEO_CONFIG['local_db_path']}")
+            except Exception as e:
+                _local_db_failed = True
+                logError(logger, e, f"加载本地IP数据库失败: {GEO_CONFIG['local_db_path']}")
+    return _local_db
+
+
 def get_ip_location(ip_address: str) -> Optional[str]:
     """
     查询IP地址的地理位置
 
-    使用免费的IP地理位置API
+    根据 GEO_CONFIG["provider"] 选择本地数据库或远程API,
+    结果(包括查不到的情况)会缓存在 location_cache 中
     失败时返回None
 
     Args:
@@ -54,39 +305,182 @@ def get_ip_location(ip_address: str) -> Optional[str]:
     if not ip_address or ip_address == "未知":
         return None
 
+    key = location_cache_key(ip_address)
+    hit, location = location_cache.get(key)
+    if hit:
+        return location
+
+    location = resolve_location(ip_address)
+    location_cache.set(key, location)
+    return location
+
+
+async def async_get_ip_location(ip_address: str) -> Optional[str]:
+    """
+    查询IP地址的地理位置(异步版本,供异步模式的路由使用)
+
+    与 get_ip_location 共用缓存和本地数据库,远程查询使用异步HTTP客户端,不阻塞事件循环
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置，如 "北京市" 或 "中国 北京市"
+    """
+    if not ip_address or ip_address == "未知":
+        return None
+
+    key = location_cache_key(ip_address)
+    hit, location = location_cache.get(key)
+    if hit:
+        return location
+
+    location = None
+    provider = GEO_CONFIG["provider"]
+    if provider in ("local", "auto"):
+        location = lookup_local_location(ip_address)
+    if not location and provider != "local":
+        location = await async_query_remote_location(ip_address)
+
+    location_cache.set(key, location)
+    return location
+
+
+def resolve_location(ip_address: str) -> Optional[str]:
+    """
+    按配置的数据源查询地理位置(不经过缓存)
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置,查不到时返回None
+    """
+    provider = GEO_CONFIG["provider"]
+    if provider in ("local", "auto"):
+        location = lookup_local_location(ip_address)
+        if location or provider == "local":
+            return location
+
+    return query_remote_location(ip_address)
+
+
+def lookup_local_location(ip_address: str) -> Optional[str]:
+    """
+    在本地IP数据库中查询地理位置
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置,未收录或数据库不可用时返回None
+    """
+    database = get_local_database()
+    if database is None:
+        return None
+    start = time.perf_counter()
+    try:
+        return database.lookup(ip_address)
+    except ValueError:
+        # 不是合法的IP地址
+        return None
+    finally:
+        observeGeoLookup("local", start)
+
+
+def query_remote_location(ip_address: str) -> Optional[str]:
+    """
+    通过远程API查询IP地址的地理位置
+
+    使用免费的IP地理位置API
+    失败时返回None
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置，如 "北京市" 或 "中国 北京市"
+    """
+    start = time.perf_counter()
+    failed = True
     try:
-        # 使用免费的IP地理位置API
-        # 这里使用 ip-api.com 的免费API（无需API key）
-        url = f"http://ip-api.com/json/{ip_address}?lang=zh-CN"
-
-        response = requests.get(url, timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-
-            if data.get("status") == "success":
-                # 组合地理位置信息
-                country = data.get("country", "")
-                region_name = data.get("regionName", "")
-                city = data.get("city", "")
-
-                # 构建位置字符串
-                location_parts = []
-                if country and country != "中国":
-                    location_parts.append(country)
-                if region_name:
-                    location_parts.append(region_name)
-                if city and city != region_name:
-                    location_parts.append(city)
-
-                location = " ".join(location_parts) if location_parts else None
-
-                if location:
-                    logInfo(logger, f"IP {ip_address} 位置: {location}")
-                    return location
-
-        logInfo(logger, f"无法获取IP {ip_address} 的位置信息")
+        response = requests.get(REMOTE_API_URL.format(ip=ip_address), timeout=REMOTE_API_TIMEOUT)
+        location = parse_remote_response(ip_address, response.status_code, response.json)
+        failed = response.status_code != 200
+        return location
+    except Exception as e:
+        logError(logger, e, f"查询IP位置失败: {ip_address}")
         return None
+    finally:
+        # 每次查询只记录一次,解析响应时抛出异常也按失败记录
+        observeGeoLookup("remote", start, failed=failed)
 
+
+async def async_query_remote_location(ip_address: str) -> Optional[str]:
+    """
+    通过远程API查询IP地址的地理位置(异步版本)
+
+    失败时返回None
+
+    Args:
+        ip_address (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置，如 "北京市" 或 "中国 北京市"
+    """
+    global _async_client
+    start = time.perf_counter()
+    failed = True
+    try:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(timeout=REMOTE_API_TIMEOUT)
+        response = await _async_client.get(REMOTE_API_URL.format(ip=ip_address))
+        location = parse_remote_response(ip_address, response.status_code, response.json)
+        failed = response.status_code != 200
+        return location
     except Exception as e:
         logError(logger, e, f"查询IP位置失败: {ip_address}")
         return None
+    finally:
+        observeGeoLookup("remote", start, failed=failed)
+
+
+async def close_async_client():
+    """
+    关闭异步HTTP客户端,在应用退出时调用
+    """
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def parse_remote_response(ip_address: str, status_code: int, read_json: Callable[[], dict]) -> Optional[str]:
+    """
+    解析远程API的响应
+
+    Args:
+        ip_address (str): 查询的IP地址
+        status_code (int): HTTP状态码
+        read_json (Callable[[], dict]): 读取响应JSON的函数,仅在状态码为200时调用
+
+    Returns:
+        Optional[str]: 地理位置,查询失败时返回None
+    """
+    if status_code == 200:
+        data = read_json()
+
+        if data.get("status") == "success":
+            # 组合地理位置信息
+            location = format_location(
+                data.get("country", ""),
+                data.get("regionName", ""),
+                data.get("city", "")
+            )
+
+            if location:
+                logInfo(logger, f"IP {ip_address} 位置: {location}")
+                return location
+
+    logInfo(logger, f"无法获取IP {ip_address} 的位置信息")
+    return None
@@ -1,11 +1,155 @@
 """
 日志系统配置
+
+所有日志记录器共用一个有界队列: 业务线程只把日志放入队列(队列满时丢弃并计数,不会阻塞请求),
+由一个后台监听线程统一写入控制台和按时间或大小轮转的日志文件
+
+- 日志级别: LOG_LEVEL 为默认级别, LOG_LEVELS 可单独设置某些日志记录器的级别
+- 采样: 以 logInfo(..., sample=True) 记录的高频信息日志,同一条日志语句每 LOG_SAMPLE_EVERY 次只写1次
 """
 
+import atexit
+import itertools
 import logging
-import sys
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import LOG_CONFIG
+
+_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 所有日志记录器共用的队列处理器和监听线程,首次调用 setupLogger 时创建
+_queueHandler: Optional["DroppingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_setupLock = threading.Lock()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的队列日志处理器
+
+    队列满时丢弃日志而不是等待,保证日志不会拖慢请求
+
+    Attributes:
+        dropped (int): 因队列满被丢弃的日志条数
+    """
+
+    def __init__(self, logQueue: queue.Queue):
+        super().__init__(logQueue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """
+    高频日志采样过滤器
+
+    只作用于带有 sample 标记的INFO及以下级别日志,
+    同一条日志语句(文件+行号)每 every 次只放行1次,放行的日志末尾注明本次代表的条数
+
+    Attributes:
+        every (int): 采样间隔,小于等于1时不采样
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counters: Dict[Tuple[str, int], itertools.count] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or not getattr(record, "sample", False) or record.levelno > logging.INFO:
+            return True
+        key = (record.pathname, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        # itertools.count 的 next() 在CPython中是原子操作,无需加锁
+        if next(counter) % self.every:
+            return False
+        record.msg = f"{record.msg} (采样: 每{self.every}条记录1条)"
+        return True
+
+
+def createFileHandler(logDir: str) -> logging.Handler:
+    """
+    按配置创建轮转的文件处理器
+
+    Args:
+        logDir (str): 日志目录
+
+    Returns:
+        logging.Handler: 按时间(TimedRotatingFileHandler)或大小(RotatingFileHandler)轮转的处理器
+    """
+    os.makedirs(logDir, exist_ok=True)
+    logFile = os.path.join(logDir, "treehole.log")
+    if LOG_CONFIG["rotation"] == "size":
+        return logging.handlers.RotatingFileHandler(
+            logFile,
+            maxBytes=LOG_CONFIG["max_bytes"],
+            backupCount=LOG_CONFIG["backup_count"],
+            encoding="utf-8"
+        )
+    return logging.handlers.TimedRotatingFileHandler(
+        logFile,
+        when=LOG_CONFIG["rotate_when"],
+        backupCount=LOG_CONFIG["backup_count"],
+        encoding="utf-8"
+    )
+
+
+def getQueueHandler() -> DroppingQueueHandler:
+    """
+    获取共用的队列处理器,首次调用时启动后台写入线程
+
+    Returns:
+        DroppingQueueHandler: 队列处理器
+    """
+    global _queueHandler, _listener
+    with _setupLock:
+        if _queueHandler is not None:
+            return _queueHandler
+
+        formatter = logging.Formatter(_FORMAT)
+        consoleHandler = logging.StreamHandler(sys.stdout)
+        fileHandler = createFileHandler(LOG_CONFIG["dir"])
+        for handler in (consoleHandler, fileHandler):
+            handler.setFormatter(formatter)
+
+        handler = DroppingQueueHandler(queue.Queue(LOG_CONFIG["queue_size"]))
+        handler.addFilter(SamplingFilter(LOG_CONFIG["sample_every"]))
+
+        _listener = logging.handlers.QueueListener(handler.queue, consoleHandler, fileHandler)
+        _listener.start()
+        # 退出时写完队列中剩余的日志
+        atexit.register(_listener.stop)
+
+        _queueHandler = handler
+        return handler
+
+
+def resolveLevel(name: str) -> int:
+    """
+    获取日志记录器的级别
+
+    Args:
+        name (str): 日志记录器名称
+
+    Returns:
+        int: LOG_LEVELS 中单独配置的级别,否则为 LOG_LEVEL
+    """
+    levelName = LOG_CONFIG["levels"].get(name, LOG_CONFIG["level"])
+    level = logging.getLevelName(levelName)
+    return level if isinstance(level, int) else logging.INFO
+
 
 def setupLogger(name: str = "treehole") -> logging.Logger:
     """
@@ -22,37 +166,25 @@ def setupLogger(name: str = "treehole") -> logging.Logger:
     if logger.handlers:
         return logger
 
-    logger.setLevel(logging.INFO)
-
-    # 创建控制台处理器
-    consoleHandler = logging.StreamHandler(sys.stdout)
-    consoleHandler.setLevel(logging.INFO)
+    logger.setLevel(resolveLevel(name))
+    logger.addHandler(getQueueHandler())
+    # 已由队列处理器输出,不再传给根日志记录器,避免重复
+    logger.propagate = False
 
-    # 确保logs目录存在
-    log_dir = "logs"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-
-    # 创建文件处理器
-    log_file = os.path.join(log_dir, f"treehole_{datetime.now().strftime('%Y%m%d')}.log")
-    fileHandler = logging.FileHandler(
-        log_file,
-        encoding='utf-8'
-    )
-    fileHandler.setLevel(logging.INFO)
+    return logger
 
-    # 创建格式器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
 
-    consoleHandler.setFormatter(formatter)
-    fileHandler.setFormatter(formatter)
+def getLogStats() -> dict:
+    """
+    获取日志队列统计
 
-    logger.addHandler(consoleHandler)
-    logger.addHandler(fileHandler)
+    Returns:
+        dict: 队列中待写入条数和因队列满丢弃的条数
+    """
+    if _queueHandler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queueHandler.queue.qsize(), "dropped": _queueHandler.dropped}
 
-    return logger
 
 def logError(logger: logging.Logger, error: Exception, context: str = ""):
     """
@@ -64,14 +196,20 @@ def logError(logger: logging.Logger, error: Exception, context: str = ""):
         context (str): 错误上下文信息
     """
     errorMessage = f"{context}: {str(error)}" if context else str(error)
-    logger.error(errorMessage, exc_info=True)
+    logger.error(errorMessage, exc_info=True, stacklevel=2)
+
 
-def logInfo(logger: logging.Logger, message: str):
+def logInfo(logger: logging.Logger, message: str, sample: bool = False):
     """
     记录信息日志
     
     Args:
         logger (logging.Logger): 日志记录器
         message (str): 日志消息
+        sample (bool): 是否为可采样的高频日志(如每次读取列表),见 LOG_SAMPLE_EVERY
     """
-    logger.info(message)
+    # stacklevel=2: 记录调用方的文件和行号,采样也按调用方的日志语句区分
+    if sample:
+        logger.info(message, extra={"sample": True}, stacklevel=2)
+    else:
+        logger.info(message, stacklevel=2)
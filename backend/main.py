@@ -16,28 +16,60 @@ TreeHole API主程序
 - SQLite: 数据库
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from typing import Callable, List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from config import API_CONFIG, CORS_CONFIG, ERROR_MESSAGES
+from config import API_CONFIG, CORS_CONFIG, ERROR_MESSAGES, GEO_CONFIG, MESSAGE_CONFIG, METRICS_CONFIG, RATE_LIMIT_CONFIG, SEARCH_CONFIG
 from logger import setupLogger, logInfo
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 import schemas
 import crud
-from database import engine, getDatabase, createTables
+import crud_async
+from database import engine, asyncEngine, getDatabase, getAsyncDatabase, createTables
 import models
-from utils import sanitize_html
-from ip_utils import get_client_ip, get_ip_location
+from migrations import runMigrations
+import uuid
+from utils import (sanitize_html, encode_cursor, decode_cursor, encode_score_cursor, decode_score_cursor,
+                   encode_snapshot_cursor, decode_snapshot_cursor)
+from search import buildMatchQuery, isSearchSupported
+from hot_ranking import hotRanking
+from ip_utils import get_client_ip, get_ip_location, async_get_ip_location, close_async_client, get_location_cache_stats
+from geo_worker import geoWorker
+from response_cache import DataVersionWatcher, responseCache, messageTags
+from event_hub import eventHub
+from serializers import encodeResponse, messageToDict
+from metrics import registry, MetricsMiddleware, instrumentEngine, threadpoolStats
+from rate_limiter import RateLimitMiddleware, limiters
+from vote_dedup import voteDeduplicator
+from profiling import ProfilingMiddleware, instrumentSlowQueries, profilingActive, currentCrudCall
+from vote_buffer import voteBuffer
+from logger import getLogStats
 
 # ==================== 应用初始化 ====================
 
 # 设置日志记录器
 logger = setupLogger("main")
 
-# 创建数据库表
-models.Base.metadata.create_all(bind=engine)
+# 创建数据库表,并对已有数据库执行待执行的结构迁移
+createTables()
+runMigrations(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期: 启动时开始后台重建热门排行;退出时停止重建,关闭异步HTTP客户端和异步数据库引擎
+    """
+    logInfo(logger, f"运行模式: {'异步' if API_CONFIG['async_mode'] else '同步'}")
+    hotRanking.start()
+    yield
+    await run_in_threadpool(hotRanking.stop)
+    await close_async_client()
+    if asyncEngine is not None:
+        await asyncEngine.dispose()
 
 # 创建FastAPI应用实例
 # title: API文档标题
@@ -46,9 +78,16 @@ models.Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title=API_CONFIG["title"],
     description=API_CONFIG["description"],
-    version=API_CONFIG["version"]
+    version=API_CONFIG["version"],
+    lifespan=lifespan
 )
 
+# ==================== 限流 ====================
+
+# 位于CORS中间件内层,429响应同样带有CORS头,前端可以读取
+if RATE_LIMIT_CONFIG["enabled"]:
+    app.add_middleware(RateLimitMiddleware)
+
 # ==================== CORS配置 ====================
 
 # 配置CORS中间件
@@ -63,14 +102,46 @@ app.add_middleware(
     allow_headers=["*"],   # 允许所有请求头
 )
 
+# ==================== 性能分析 ====================
+
+# 管理员通过 X-Profile 请求头分析单个请求;慢查询日志始终开启(SLOW_QUERY_MS=0 时关闭)
+app.add_middleware(ProfilingMiddleware)
+instrumentSlowQueries(engine)
+if asyncEngine is not None:
+    instrumentSlowQueries(asyncEngine.sync_engine)
+
+# ==================== 监控指标 ====================
+
+if METRICS_CONFIG["enabled"]:
+    # 放在最外层,统计的耗时包含其他中间件
+    app.add_middleware(MetricsMiddleware)
+    instrumentEngine(engine)
+    if asyncEngine is not None:
+        instrumentEngine(asyncEngine.sync_engine)
+
+    # 导出时读取的瞬时值
+    registry.gauge("treehole_threadpool_busy_threads", "线程池中正在执行的任务数", lambda: threadpoolStats()["borrowed"])
+    registry.gauge("treehole_threadpool_max_threads", "线程池大小上限", lambda: threadpoolStats()["total"])
+    registry.gauge("treehole_geo_queue_depth", "地理位置补全队列积压数", lambda: geoWorker.getStats()["queue_depth"])
+    registry.collectedCounter("treehole_geo_dropped_total", "地理位置补全队列满被丢弃的任务数", lambda: geoWorker.getStats()["dropped"])
+    registry.gauge("treehole_geo_cache_hit_ratio", "地理位置缓存命中率", lambda: get_location_cache_stats()["hit_rate"])
+    registry.gauge("treehole_response_cache_hit_ratio", "响应缓存命中率", lambda: responseCache.stats()["hit_rate"])
+    registry.gauge("treehole_response_cache_bytes", "响应缓存占用字节数", lambda: responseCache.stats()["bytes"])
+    registry.gauge("treehole_vote_buffer_pending", "等待批量写入的留言数", lambda: voteBuffer.getStats()["pending_messages"])
+    registry.gauge("treehole_sse_subscribers", "实时推送连接数", lambda: eventHub.subscriberCount)
+    registry.collectedCounter("treehole_rate_limited_total", "因请求过于频繁被拒绝的写请求数",
+                              lambda: sum(limiter.rejected for limiter in limiters.values()))
+    if voteDeduplicator is not None:
+        registry.collectedCounter("treehole_vote_duplicates_total", "被去重拒绝的重复投票数", lambda: voteDeduplicator.rejected)
+    registry.collectedCounter("treehole_log_dropped_total", "日志队列满被丢弃的日志数", lambda: getLogStats()["dropped"])
+
 # ==================== 数据库依赖 ====================
 
 from database import SessionLocal
 
-# 数据库依赖注入函数
-def getDb():
+def getSyncDb():
     """
-    获取数据库会话的依赖注入函数
+    获取同步数据库会话
 
     Yields:
         Session: 数据库会话对象
@@ -81,9 +152,74 @@ def getDb():
     finally:
         db.close()
 
+# 数据库依赖注入函数: 异步模式下提供 AsyncSession,否则提供同步 Session
+getDb = getAsyncDatabase if API_CONFIG["async_mode"] else getSyncDb
+DbSession = Union[Session, AsyncSession]
+
+# 接口使用的 crud 函数及其在 crud_async 中的异步实现
+ASYNC_CRUD = {
+    crud.getMessage: crud_async.getMessage,
+    crud.getMessages: crud_async.getMessages,
+    crud.getMessagesWithReplies: crud_async.getMessagesWithReplies,
+    crud.getMessagesByIds: crud_async.getMessagesByIds,
+    crud.getRepliesOfMessage: crud_async.getRepliesOfMessage,
+    crud.getRepliesForParents: crud_async.getRepliesForParents,
+    crud.searchMessages: crud_async.searchMessages,
+    crud.createMessage: crud_async.createMessage,
+    crud.likeMessage: crud_async.likeMessage,
+    crud.dislikeMessage: crud_async.dislikeMessage,
+}
+
+async def runCrud(func, db: DbSession, *args, **kwargs):
+    """
+    按会话类型调用数据库操作
+
+    异步会话调用 ASYNC_CRUD 中对应的异步实现,在事件循环中直接执行;
+    同步会话调用 crud 中的函数,放到线程池执行,不阻塞事件循环。
+    每个接口只调用一次 runCrud(需要多次查询的组合成一个 crud 函数),
+    同步模式下与原先的同步接口一样每个请求只进入线程池一次;
+    正在被分析的请求直接在当前线程执行,使分析结果包含数据库操作
+
+    Args:
+        func: crud 模块中的函数,必须在 ASYNC_CRUD 中登记
+        db (DbSession): Session 或 AsyncSession
+        *args: 传给数据库操作的参数
+        **kwargs: 传给数据库操作的关键字参数
+
+    Returns:
+        数据库操作的返回值
+    """
+    if isinstance(db, AsyncSession):
+        # 异步会话的SQL在greenlet中执行,慢查询日志无法从调用栈找到调用方,在这里记录
+        asyncFunc = ASYNC_CRUD[func]
+        token = currentCrudCall.set(f"{asyncFunc.__module__}.{asyncFunc.__name__}")
+        try:
+            return await asyncFunc(db, *args, **kwargs)
+        finally:
+            currentCrudCall.reset(token)
+    if profilingActive.get():
+        return func(db, *args, **kwargs)
+    return await run_in_threadpool(func, db, *args, **kwargs)
+
+async def lookupLocation(ipAddress: str) -> Optional[str]:
+    """
+    在请求中查询IP地理位置,异步模式使用异步HTTP客户端,否则在线程池中查询
+
+    Args:
+        ipAddress (str): IP地址
+
+    Returns:
+        Optional[str]: 地理位置
+    """
+    if API_CONFIG["async_mode"]:
+        return await async_get_ip_location(ipAddress)
+    if profilingActive.get():
+        return get_ip_location(ipAddress)
+    return await run_in_threadpool(get_ip_location, ipAddress)
+
 # ==================== 工具函数 ====================
 
-def api_response(data=None, code=0, message="success"):
+def api_response(data=None, code=0, message="success", **extra):
     """
     统一API响应格式
 
@@ -93,9 +229,10 @@ def api_response(data=None, code=0, message="success"):
         data: 响应数据,可以是任意类型
         code (int): 响应状态码,0表示成功,非0表示失败
         message (str): 响应消息,描述操作结果
+        **extra: 附加到响应顶层的字段,如分页接口的 next_cursor
 
     Returns:
-        JSONResponse: JSON格式的响应对象
+        Response: JSON格式的响应对象,响应体由 serializers.encodeResponse 一次编码生成
 
     Response Format:
         {
@@ -104,7 +241,163 @@ def api_response(data=None, code=0, message="success"):
             "data": {...}
         }
     """
-    return JSONResponse(content={"code": code, "message": message, "data": jsonable_encoder(data)})
+    return Response(content=encodeResponse(data, code, message, **extra), media_type="application/json")
+
+def parseCursors(before_id: Optional[str], after_id: Optional[str]):
+    """
+    解析分页游标参数
+
+    Args:
+        before_id (Optional[str]): 向旧数据方向翻页的游标
+        after_id (Optional[str]): 向新数据方向翻页的游标
+
+    Returns:
+        tuple: (beforeId, afterId) 解析后的留言ID,未提供时为None
+
+    Raises:
+        HTTPException: 当游标无效或同时提供两个游标时返回400错误
+    """
+    if before_id and after_id:
+        raise HTTPException(status_code=400, detail="before_id 和 after_id 不能同时使用")
+    try:
+        beforeId = decode_cursor(before_id) if before_id else None
+        afterId = decode_cursor(after_id) if after_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return beforeId, afterId
+
+def nextCursor(items, limit: int, useFirst: bool = False) -> Optional[str]:
+    """
+    生成下一页的游标
+
+    只有当本页已取满时才可能还有下一页,否则返回None
+
+    Args:
+        items: 本页数据
+        limit (int): 本页的分页大小
+        useFirst (bool): 为True时以本页第一条为游标,否则以最后一条为游标
+
+    Returns:
+        Optional[str]: 下一页游标
+    """
+    if len(items) < limit:
+        return None
+    return encode_cursor(items[0].id if useFirst else items[-1].id)
+
+def parseIdList(raw: str) -> List[int]:
+    """
+    解析逗号分隔的留言ID列表
+
+    Args:
+        raw (str): 形如 "1,2,3" 的字符串
+
+    Returns:
+        List[int]: 去重后的留言ID列表,保持原顺序
+
+    Raises:
+        HTTPException: 当格式无效、列表为空或数量超过最大分页大小时返回400错误
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="parent_ids 必须是逗号分隔的留言ID")
+    if not ids:
+        raise HTTPException(status_code=400, detail="parent_ids 不能为空")
+    maxIds = MESSAGE_CONFIG["max_page_size"]
+    if len(ids) > maxIds:
+        raise HTTPException(status_code=400, detail=f"parent_ids 最多包含 {maxIds} 个留言ID")
+    return ids
+
+def embedReplies(messages, grouped: dict):
+    """
+    为留言列表嵌入每条留言的前若干条回复
+
+    Args:
+        messages: 留言对象列表
+        grouped (dict): 留言ID到回复列表的映射,见 crud.getMessagesWithReplies
+
+    Returns:
+        tuple: (带 replies 字段的留言字典列表, 所有嵌入的回复对象列表)
+    """
+    data = [{**messageToDict(item), "replies": grouped.get(item.id, [])} for item in messages]
+    return data, [reply for replies in grouped.values() for reply in replies]
+
+# 进程启动标识,保证不同进程(或重启前)生成的ETag不会误匹配
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# 检测其他进程的写入;不支持检测的数据库(非SQLite)只能单进程部署
+dataVersionWatcher = DataVersionWatcher(engine)
+if not dataVersionWatcher.supported:
+    logInfo(logger, "当前数据库无法检测其他进程的写入,ETag和响应缓存要求单进程部署(--workers 1)")
+# 本进程的写入已由 crud 按标签精确失效,提交后不再清空整个缓存
+dataVersionWatcher.ignoreLocalCommits(engine, responseCache.clear)
+if asyncEngine is not None:
+    dataVersionWatcher.ignoreLocalCommits(asyncEngine.sync_engine, responseCache.clear)
+
+def currentETag() -> str:
+    """
+    根据留言板版本号生成强ETag
+
+    版本号在每次写操作(发帖、回复、点赞、点踩、位置补全)时递增,
+    因此同一个URL在两次写操作之间的响应内容不变。
+    其他进程提交过写入时先清空响应缓存,版本号随之递增
+
+    Returns:
+        str: 带引号的ETag
+    """
+    if dataVersionWatcher.changed():
+        responseCache.clear()
+    return f'"{BOOT_ID}-{responseCache.generation}"'
+
+def notModified(request: Request, etag: str, found: bool = True) -> Optional[Response]:
+    """
+    检查条件请求,ETag匹配时返回304响应
+
+    Args:
+        request (Request): 请求对象
+        etag (str): 当前ETag
+        found (bool): 资源是否已确认存在;If-None-Match: * 只匹配存在的资源
+
+    Returns:
+        Optional[Response]: If-None-Match 匹配时返回304响应,否则返回None
+    """
+    ifNoneMatch = request.headers.get("if-none-match")
+    if not ifNoneMatch:
+        return None
+    candidates = [tag.strip().removeprefix("W/") for tag in ifNoneMatch.split(",")]
+    if etag in candidates or (found and "*" in candidates):
+        return withETag(Response(status_code=304), etag)
+    return None
+
+def withETag(response: Response, etag: str) -> Response:
+    """
+    为响应添加ETag,并要求客户端每次使用前重新验证
+
+    Args:
+        response (Response): 响应对象
+        etag (str): ETag
+
+    Returns:
+        Response: 原响应对象
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def cachedResponse(key) -> Optional[Response]:
+    """
+    从响应缓存中取出已编码的响应
+
+    Args:
+        key: 缓存键
+
+    Returns:
+        Optional[Response]: 命中时返回响应对象,否则返回None
+    """
+    body = responseCache.get(key)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json")
 
 # ==================== API路由 ====================
 
@@ -136,27 +429,97 @@ def ping():
     """
     return {"status": "ok", "message": "服务正常运行"}
 
+@app.get("/stats/geo", tags=["基础"])
+def readGeoStats():
+    """
+    地理位置后台补全统计
+
+    用于观察补全队列是否积压,以及查询结果缓存的命中情况
+
+    Returns:
+        JSONResponse: 包含队列深度、处理延迟、失败次数和缓存命中统计的响应
+    """
+    stats = geoWorker.getStats()
+    stats["cache"] = get_location_cache_stats()
+    return api_response(stats)
+
+@app.get("/stats/cache", tags=["基础"])
+def readCacheStats():
+    """
+    响应缓存统计
+
+    Returns:
+        JSONResponse: 包含条目数、占用字节数、命中率等统计的响应
+    """
+    return api_response(responseCache.stats())
+
+@app.get("/stats/stream", tags=["基础"])
+def readStreamStats():
+    """
+    实时推送统计
+
+    Returns:
+        JSONResponse: 包含订阅者数量、已发布事件数等统计的响应
+    """
+    return api_response(eventHub.getStats())
+
+@app.get("/metrics", tags=["基础"], include_in_schema=False)
+async def readMetrics():
+    """
+    Prometheus 指标
+
+    包含按路由的请求数和耗时直方图、SQL语句次数和耗时、地理位置查询耗时和失败次数,
+    以及线程池占用、后台队列深度等瞬时值。在事件循环中执行,以便读取线程池占用
+
+    Returns:
+        PlainTextResponse: Prometheus 文本格式的指标
+
+    Raises:
+        HTTPException: 当 METRICS_ENABLED 关闭时返回404错误
+    """
+    if not METRICS_CONFIG["enabled"]:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/messages/", tags=["留言"])
-def readMessages(
+async def readMessages(
+    request: Request,
     skip: int = 0,
     limit: Optional[int] = None,
-    db: Session = Depends(getDb)
+    before_id: Optional[str] = None,
+    after_id: Optional[str] = None,
+    embed_replies: Optional[int] = None,
+    db: DbSession = Depends(getDb)
 ):
     """
     获取留言列表
 
-    获取所有留言,支持分页功能
+    获取所有留言,支持游标分页(推荐)和skip分页(兼容旧客户端)
+
+    翻页时将响应中的 next_cursor 原样传给 before_id 继续获取更早的留言;
+    若本次请求使用 after_id,则 next_cursor 应继续传给 after_id 获取更新的留言
+
+    提供 embed_replies 时每条留言带有 replies 字段,包含其最早的 embed_replies 条回复,
+    展开了回复的页面一次请求即可获得全部数据
 
     Args:
-        skip (int): 跳过的留言数量,用于分页,默认为0
+        skip (int): 跳过的留言数量,仅在未提供游标时生效,默认为0
         limit (Optional[int]): 返回的留言数量限制,默认使用配置文件中的值
-        db (Session): 数据库会话
+        before_id (Optional[str]): 游标,返回比该游标更早的留言
+        after_id (Optional[str]): 游标,返回比该游标更新的留言
+        embed_replies (Optional[int]): 每条留言嵌入的回复数,不超过最大分页大小,默认不嵌入
+        request (Request): 请求对象,用于 If-None-Match 条件请求
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
-        JSONResponse: 包含留言列表的响应
+        JSONResponse: 包含留言列表和下一页游标的响应,带ETag;
+        If-None-Match 匹配时返回304且不查询数据库
+
+    Raises:
+        HTTPException: 当游标无效时返回400错误
 
     Example:
-        GET /messages/?skip=0&limit=10
+        GET /messages/?limit=10&before_id=bTox
         Response: {
             "code": 0,
             "message": "success",
@@ -170,14 +533,218 @@ def readMessages(
                     "reply_count": 0
                 },
                 ...
-            ]
+            ],
+            "next_cursor": "bTox"
+        }
+    """
+    beforeId, afterId = parseCursors(before_id, after_id)
+    limit = crud.resolvePageSize(limit)
+    embedLimit = crud.resolvePageSize(embed_replies) if embed_replies else 0
+
+    # ETag在查询之前生成: 查询期间若有写入,客户端下次请求时会因版本不一致重新获取
+    etag = currentETag()
+    unchanged = notModified(request, etag)
+    if unchanged:
+        return unchanged
+
+    # 只缓存列表首页,翻页请求直接查询
+    cacheKey = ("messages", limit, embedLimit) if beforeId is None and afterId is None and not skip else None
+    if cacheKey:
+        cached = cachedResponse(cacheKey)
+        if cached:
+            return withETag(cached, etag)
+        generation = responseCache.generation
+
+    if embedLimit:
+        messages, grouped = await runCrud(crud.getMessagesWithReplies, db, embedLimit,
+                                          skip=skip, limit=limit, beforeId=beforeId, afterId=afterId)
+        data, replies = embedReplies(messages, grouped)
+    else:
+        messages = await runCrud(crud.getMessages, db, skip=skip, limit=limit, beforeId=beforeId, afterId=afterId)
+        data, replies = messages, []
+    response = api_response(data, next_cursor=nextCursor(messages, limit, useFirst=afterId is not None))
+    if cacheKey:
+        tags = {"list"} | messageTags(messages) | messageTags(replies)
+        responseCache.set(cacheKey, response.body, tags, generation)
+    return withETag(response, etag)
+
+@app.get("/messages/stream", tags=["留言"])
+async def streamMessages(request: Request):
+    """
+    订阅留言板实时事件(Server-Sent Events)
+
+    替代定时轮询: 客户端用 EventSource 连接后,新留言、新回复和计数变化会被主动推送
+
+    Args:
+        request (Request): 请求对象
+
+    Returns:
+        StreamingResponse: text/event-stream 响应
+
+    Raises:
+        HTTPException: 当连接数达到上限时返回503错误
+
+    Example:
+        GET /messages/stream
+        Response:
+            event: message
+            data: {"id": 3, "content": "新留言", ...}
+
+            event: counts
+            data: [{"id": 1, "like_count": 11, "dislike_count": 2, "reply_count": 0}]
+    """
+    subscriber = eventHub.subscribe()
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="实时连接数已达上限,请稍后重试")
+
+    return StreamingResponse(
+        eventHub.stream(subscriber, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/messages/hot", tags=["留言"])
+async def readHotMessages(limit: Optional[int] = None, cursor: Optional[str] = None, db: DbSession = Depends(getDb)):
+    """
+    获取热门留言
+
+    按热度(净赞数的对数加发表时间)从高到低排列,只包含顶层留言。
+    排行在内存中增量维护,读取一页只按ID查询本页的留言;翻页时将 next_cursor 原样传给 cursor
+
+    Args:
+        limit (Optional[int]): 返回的留言数量,默认使用配置文件中的值
+        cursor (Optional[str]): 上一页返回的游标
+        db (Session | AsyncSession): 数据库会话
+
+    Returns:
+        JSONResponse: 包含热门留言列表和下一页游标的响应
+
+    Raises:
+        HTTPException: 当游标无效时返回400错误
+
+    Example:
+        GET /messages/hot?limit=10
+        Response: {
+            "code": 0,
+            "message": "success",
+            "data": [{"id": 7, "content": "...", "like_count": 120, ...}, ...],
+            "next_cursor": "czo0Mi4xOjc"
+        }
+    """
+    try:
+        after = decode_score_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not hotRanking.built:
+        await run_in_threadpool(hotRanking.ensureBuilt)
+    limit = crud.resolvePageSize(limit)
+    ranked = hotRanking.page(limit, after)
+    messages = await runCrud(crud.getMessagesByIds, db, [messageId for messageId, _ in ranked])
+    nextPage = encode_score_cursor(ranked[-1][1], ranked[-1][0]) if len(ranked) == limit else None
+    return api_response(messages, next_cursor=nextPage)
+
+@app.get("/messages/search", tags=["留言"])
+async def searchMessages(q: str, limit: Optional[int] = None, cursor: Optional[str] = None, db: DbSession = Depends(getDb)):
+    """
+    全文搜索留言和回复
+
+    中文按相邻两字切分建立索引,关键词中的每个词都必须命中;结果按相关度排序,
+    相关度相同时新的在前。翻页时将响应中的 next_cursor 原样传给 cursor,
+    翻页只在第一页请求时已有的留言中进行;每页按当时的全表统计量重新排序,
+    翻页期间有新留言时,页边界附近的结果可能重复或遗漏
+
+    Args:
+        q (str): 搜索关键词
+        limit (Optional[int]): 返回的结果数,默认使用配置文件中的值
+        cursor (Optional[str]): 上一页返回的游标
+        db (Session | AsyncSession): 数据库会话
+
+    Returns:
+        JSONResponse: 包含匹配留言列表和下一页游标的响应
+
+    Raises:
+        HTTPException: 关键词为空或过长、游标无效时返回400错误;数据库不支持全文搜索时返回501错误
+
+    Example:
+        GET /messages/search?q=树洞&limit=10
+        Response: {
+            "code": 0,
+            "message": "success",
+            "data": [{"id": 12, "content": "今天的树洞很安静", ...}, ...],
+            "next_cursor": "bzoxMjA6MTA"
         }
     """
-    messages = crud.getMessages(db, skip=skip, limit=limit)
-    return api_response(messages)
+    if not isSearchSupported(engine.dialect.name):
+        raise HTTPException(status_code=501, detail="当前数据库不支持全文搜索")
+    q = q.strip()
+    if len(q) > SEARCH_CONFIG["max_query_length"]:
+        raise HTTPException(status_code=400, detail=f"搜索关键词不能超过{SEARCH_CONFIG['max_query_length']}字")
+    matchQuery = buildMatchQuery(q)
+    if not matchQuery:
+        raise HTTPException(status_code=400, detail="搜索关键词不能为空")
+    try:
+        snapshotId, offset = decode_snapshot_cursor(cursor) if cursor else (None, 0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limit = crud.resolvePageSize(limit)
+    results, snapshotId = await runCrud(crud.searchMessages, db, matchQuery, limit, snapshotId, offset)
+    nextPage = encode_snapshot_cursor(snapshotId, offset + limit) if len(results) == limit else None
+    return api_response([row for row, _ in results], next_cursor=nextPage)
+
+@app.get("/messages/replies", tags=["留言"])
+async def readRepliesBatch(
+    request: Request,
+    parent_ids: str,
+    limit: Optional[int] = None,
+    db: DbSession = Depends(getDb)
+):
+    """
+    批量获取多条留言的回复
+
+    一次请求、一条查询获取多个帖子的第一页回复,代替逐个请求 /messages/{id}/replies
+
+    Args:
+        parent_ids (str): 逗号分隔的父留言ID,数量不超过最大分页大小
+        limit (Optional[int]): 每个父留言返回的回复数量限制,默认使用配置文件中的值
+        request (Request): 请求对象,用于 If-None-Match 条件请求
+        db (Session | AsyncSession): 数据库会话
+
+    Returns:
+        JSONResponse: data 为父留言ID到回复列表的映射(不存在的父留言对应空列表),
+        next_cursors 为各父留言继续获取回复时传给 /messages/{id}/replies 的 after_id;
+        带ETag,If-None-Match 匹配时返回304
+
+    Raises:
+        HTTPException: 当 parent_ids 无效时返回400错误
+
+    Example:
+        GET /messages/replies?parent_ids=1,5&limit=2
+        Response: {
+            "code": 0,
+            "message": "success",
+            "data": {
+                "1": [{"id": 2, "content": "回复", "parent_id": 1, ...}, ...],
+                "5": []
+            },
+            "next_cursors": {"1": "bToz", "5": null}
+        }
+    """
+    parentIds = parseIdList(parent_ids)
+    limit = crud.resolvePageSize(limit)
+
+    etag = currentETag()
+    unchanged = notModified(request, etag)
+    if unchanged:
+        return unchanged
+
+    grouped = await runCrud(crud.getRepliesForParents, db, parentIds, limit)
+    cursors = {parentId: nextCursor(replies, limit) for parentId, replies in grouped.items()}
+    return withETag(api_response(grouped, next_cursors=cursors), etag)
 
-@app.get("/messages/{messageId}", response_model=schemas.Message, tags=["留言"])
-def readMessage(messageId: int, db: Session = Depends(getDb)):
+@app.get("/messages/{messageId}", response_model=schemas.PublicMessage, tags=["留言"])
+async def readMessage(messageId: int, request: Request, db: DbSession = Depends(getDb)):
     """
     获取单条留言详情
 
@@ -185,10 +752,11 @@ def readMessage(messageId: int, db: Session = Depends(getDb)):
 
     Args:
         messageId (int): 留言的唯一标识符
-        db (Session): 数据库会话
+        request (Request): 请求对象,用于 If-None-Match 条件请求
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
-        JSONResponse: 包含留言详情的响应
+        JSONResponse: 包含留言详情的响应,带ETag;If-None-Match 匹配时返回304
 
     Raises:
         HTTPException: 当留言不存在时返回404错误
@@ -208,27 +776,53 @@ def readMessage(messageId: int, db: Session = Depends(getDb)):
             }
         }
     """
-    message = crud.getMessage(db, messageId)
+    etag = currentETag()
+    unchanged = notModified(request, etag, found=False)
+    if unchanged:
+        return unchanged
+
+    message = await runCrud(crud.getMessage, db, messageId)
     if not message:
         raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
-    return api_response(message)
+    unchanged = notModified(request, etag)
+    if unchanged:
+        return unchanged
+    return withETag(api_response(message), etag)
 
 @app.get("/messages/{messageId}/replies", tags=["留言"])
-def readReplies(messageId: int, db: Session = Depends(getDb)):
+async def readReplies(
+    messageId: int,
+    request: Request,
+    limit: Optional[int] = None,
+    before_id: Optional[str] = None,
+    after_id: Optional[str] = None,
+    db: DbSession = Depends(getDb)
+):
     """
-    获取留言的所有回复
+    获取留言的回复
+
+    根据父留言ID分页获取回复,按时间正序排列,分页大小限制与留言列表一致
 
-    根据父留言ID获取所有回复
+    翻页时将响应中的 next_cursor 原样传给 after_id 继续获取后续回复;
+    若本次请求使用 before_id,则 next_cursor 应继续传给 before_id
 
     Args:
         messageId (int): 父留言的唯一标识符
-        db (Session): 数据库会话
+        limit (Optional[int]): 返回的回复数量限制,默认使用配置文件中的值
+        before_id (Optional[str]): 游标,返回该游标之前的回复
+        after_id (Optional[str]): 游标,返回该游标之后的回复
+        request (Request): 请求对象,用于 If-None-Match 条件请求
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
-        JSONResponse: 包含回复列表的响应
+        JSONResponse: 包含回复列表和下一页游标的响应,带ETag;
+        If-None-Match 匹配时返回304且不查询数据库
+
+    Raises:
+        HTTPException: 当父留言不存在时返回404错误,游标无效时返回400错误
 
     Example:
-        GET /messages/1/replies
+        GET /messages/1/replies?limit=20
         Response: {
             "code": 0,
             "message": "success",
@@ -243,34 +837,57 @@ def readReplies(messageId: int, db: Session = Depends(getDb)):
                     "parent_id": 1
                 },
                 ...
-            ]
+            ],
+            "next_cursor": null
         }
     """
-    # 先检查父留言是否存在
-    parent = crud.getMessage(db, messageId)
-    if not parent:
+    beforeId, afterId = parseCursors(before_id, after_id)
+    limit = crud.resolvePageSize(limit)
+
+    etag = currentETag()
+    unchanged = notModified(request, etag, found=False)
+    if unchanged:
+        return unchanged
+
+    # 只缓存回复的第一页,命中时连父留言是否存在的检查也可以省去
+    cacheKey = ("replies", messageId, limit) if beforeId is None and afterId is None else None
+    if cacheKey:
+        cached = cachedResponse(cacheKey)
+        if cached:
+            return withETag(cached, etag)
+        generation = responseCache.generation
+
+    # 父留言存在检查和回复查询在同一次调用中完成
+    replies = await runCrud(crud.getRepliesOfMessage, db, messageId, limit=limit, beforeId=beforeId, afterId=afterId)
+    if replies is None:
         raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
+    unchanged = notModified(request, etag)
+    if unchanged:
+        return unchanged
 
-    replies = crud.getReplies(db, messageId)
-    return api_response(replies)
+    response = api_response(replies, next_cursor=nextCursor(replies, limit, useFirst=beforeId is not None))
+    if cacheKey:
+        responseCache.set(cacheKey, response.body, {f"replies:{messageId}"} | messageTags(replies), generation)
+    return withETag(response, etag)
 
-@app.post("/messages/", response_model=schemas.Message, tags=["留言"])
-def createMessage(
+@app.post("/messages/", response_model=schemas.PublicMessage, tags=["留言"])
+async def createMessage(
     message: schemas.MessageCreate,
     request: Request,
-    db: Session = Depends(getDb)
+    db: DbSession = Depends(getDb)
 ):
     """
     创建新留言或回复
 
     创建一条新的匿名留言,内容不能超过140个字符
     如果提供parent_id,则创建回复
-    自动获取客户端IP地址并查询地理位置
+    自动获取客户端IP地址,地理位置默认由后台线程异步补全,
+    因此新创建的留言 location 可能暂时为空
 
     Args:
         message (MessageCreate): 留言创建请求,包含content和parent_id字段
         request (Request): FastAPI请求对象
-        db (Session): 数据库会话
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
         JSONResponse: 包含新创建留言信息的响应
@@ -292,7 +909,7 @@ def createMessage(
                 "dislike_count": 0,
                 "reply_count": 0,
                 "parent_id": null,
-                "location": "北京市"
+                "location": null
             }
         }
     """
@@ -300,11 +917,13 @@ def createMessage(
         # XSS防护: 过滤用户输入中的HTML标签
         message.content = sanitize_html(message.content)
 
-        # 获取客户端IP和地理位置
+        # 获取客户端IP,地理位置在后台补全,不阻塞请求
         client_ip = get_client_ip(request)
-        location = get_ip_location(client_ip)
+        asyncLocation = GEO_CONFIG["async_enrichment"]
+        location = None if asyncLocation else await lookupLocation(client_ip)
 
-        dbMessage = crud.createMessage(
+        dbMessage = await runCrud(
+            crud.createMessage,
             db,
             message,
             ip_address=client_ip,
@@ -312,12 +931,56 @@ def createMessage(
         )
         if not dbMessage:
             raise HTTPException(status_code=400, detail="创建留言失败")
+        if asyncLocation:
+            geoWorker.submit(dbMessage.id, client_ip)
         return api_response(dbMessage)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/messages/{messageId}/like", response_model=schemas.Message, tags=["留言"])
-def likeMessage(messageId: int, db: Session = Depends(getDb)):
+async def applyVote(request: Request, db: DbSession, messageId: int, voteType: str, crudFunc: Callable):
+    """
+    去重后执行一次点赞/点踩
+
+    先在去重器中占用该投票(同一投票的并发请求只有一个能占用),
+    写入成功后确认记录;留言不存在或写入失败时释放占用,重试不会被误判为重复投票
+
+    Args:
+        request (Request): 请求对象,用于获取客户端IP
+        db (Session | AsyncSession): 数据库会话
+        messageId (int): 留言ID
+        voteType (str): like / dislike
+        crudFunc (Callable): crud.likeMessage / crud.dislikeMessage
+
+    Returns:
+        Message: 更新后的留言
+
+    Raises:
+        HTTPException: 同一IP在窗口内已对该留言投过同类票时返回409错误,留言不存在时返回404错误
+    """
+    dedup = voteDeduplicator
+    if dedup is None:
+        message = await runCrud(crudFunc, db, messageId)
+        if not message:
+            raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
+        return message
+
+    clientIp = get_client_ip(request)
+    if not dedup.reserve(clientIp, messageId, voteType):
+        raise HTTPException(status_code=409, detail=ERROR_MESSAGES["duplicate_vote"])
+    confirmed = False
+    try:
+        message = await runCrud(crudFunc, db, messageId)
+        if not message:
+            raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
+        dedup.confirm(clientIp, messageId, voteType)
+        confirmed = True
+        return message
+    finally:
+        if not confirmed:
+            dedup.release(clientIp, messageId, voteType)
+
+@app.post("/messages/{messageId}/like", response_model=schemas.PublicMessage, tags=["留言"])
+async def likeMessage(messageId: int, request: Request, db: DbSession = Depends(getDb)):
     """
     给留言点赞
 
@@ -325,13 +988,13 @@ def likeMessage(messageId: int, db: Session = Depends(getDb)):
 
     Args:
         messageId (int): 要点赞的留言ID
-        db (Session): 数据库会话
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
         JSONResponse: 包含更新后留言信息的响应
 
     Raises:
-        HTTPException: 当留言不存在时返回404错误
+        HTTPException: 当留言不存在时返回404错误,重复点赞时返回409错误
 
     Example:
         POST /messages/1/like
@@ -347,16 +1010,14 @@ def likeMessage(messageId: int, db: Session = Depends(getDb)):
         }
 
     Note:
-        - 当前版本没有限制点赞次数,同一用户可以多次点赞
-        - 建议生产环境添加IP限制或用户认证来防止刷票
+        - 同一IP的点赞/点踩次数受 RATE_LIMIT_CONFIG 限制,超过时返回429
+        - 同一IP在去重窗口内对同一留言只能点赞一次
     """
-    message = crud.likeMessage(db, messageId)
-    if not message:
-        raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
+    message = await applyVote(request, db, messageId, "like", crud.likeMessage)
     return api_response(message)
 
-@app.post("/messages/{messageId}/dislike", response_model=schemas.Message, tags=["留言"])
-def dislikeMessage(messageId: int, db: Session = Depends(getDb)):
+@app.post("/messages/{messageId}/dislike", response_model=schemas.PublicMessage, tags=["留言"])
+async def dislikeMessage(messageId: int, request: Request, db: DbSession = Depends(getDb)):
     """
     给留言点踩
 
@@ -364,13 +1025,13 @@ def dislikeMessage(messageId: int, db: Session = Depends(getDb)):
 
     Args:
         messageId (int): 要点踩的留言ID
-        db (Session): 数据库会话
+        db (Session | AsyncSession): 数据库会话
 
     Returns:
         JSONResponse: 包含更新后留言信息的响应
 
     Raises:
-        HTTPException: 当留言不存在时返回404错误
+        HTTPException: 当留言不存在时返回404错误,重复点踩时返回409错误
 
     Example:
         POST /messages/1/dislike
@@ -386,12 +1047,10 @@ def dislikeMessage(messageId: int, db: Session = Depends(getDb)):
         }
 
     Note:
-        - 当前版本没有限制点踩次数,同一用户可以多次点踩
-        - 建议生产环境添加IP限制或用户认证来防止刷票
+        - 同一IP的点赞/点踩次数受 RATE_LIMIT_CONFIG 限制,超过时返回429
+        - 同一IP在去重窗口内对同一留言只能点踩一次
     """
-    message = crud.dislikeMessage(db, messageId)
-    if not message:
-        raise HTTPException(status_code=404, detail=ERROR_MESSAGES["message_not_found"])
+    message = await applyVote(request, db, messageId, "dislike", crud.dislikeMessage)
     return api_response(message)
 
 # ==================== 应用启动 ====================
@@ -0,0 +1,368 @@
+"""
+Prometheus 指标
+
+进程内的计数器和直方图,通过 GET /metrics 以 Prometheus 文本格式导出
+
+为了可以在生产环境常开,记录指标时不加锁: 每个线程写入自己的分片(threading.local),
+只有线程第一次记录某个指标时才加锁登记分片;导出时再把所有分片合并。
+事件循环中的异步代码都在同一个线程,同样没有竞争
+
+指标:
+- treehole_http_requests_total / treehole_http_request_duration_seconds: 按路由、方法、状态码统计的请求数和耗时
+- treehole_db_statements_total / treehole_db_statement_duration_seconds: 按语句类型统计的SQL执行次数和耗时
+- treehole_geo_lookup_duration_seconds / treehole_geo_lookup_errors_total: 地理位置查询耗时和失败次数
+- 导出时读取的瞬时值: 线程池占用、后台队列深度、推送连接数、缓存命中等
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 请求耗时的分桶上限(秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL语句耗时的分桶上限(秒)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def formatLabels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """
+    生成Prometheus标签文本
+
+    Args:
+        names (Sequence[str]): 标签名
+        values (Sequence[str]): 标签值
+        extra (str): 追加的已格式化标签,如 le="0.5"
+
+    Returns:
+        str: 形如 {route="/messages/",method="GET"} 的文本,没有标签时为空字符串
+    """
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def formatValue(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class ShardedMetric:
+    """
+    按线程分片累加的指标基类
+
+    Attributes:
+        name (str): 指标名
+        help (str): 指标说明
+        labelNames (Tuple[str, ...]): 标签名
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelNames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def merged(self) -> Dict[Tuple[str, ...], list]:
+        """
+        合并所有线程的分片
+
+        Returns:
+            Dict[Tuple[str, ...], list]: 标签值到累加值的映射
+        """
+        with self._lock:
+            shards = list(self._shards)
+        result: Dict[Tuple[str, ...], list] = {}
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = result.get(labels)
+                if total is None:
+                    result[labels] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, values in sorted(self.merged().items()):
+            lines.extend(self.renderSeries(labels, values))
+        return lines
+
+    def renderSeries(self, labels: Tuple[str, ...], values: list) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(ShardedMetric):
+    """
+    计数器
+    """
+
+    kind = "counter"
+
+    def inc(self, *labelValues: str, amount: float = 1):
+        """
+        增加计数
+
+        Args:
+            *labelValues (str): 标签值,顺序与 labelNames 一致
+            amount (float): 增加的数量
+        """
+        shard = self._shard()
+        entry = shard.get(labelValues)
+        if entry is None:
+            shard[labelValues] = [amount]
+        else:
+            entry[0] += amount
+
+    def renderSeries(self, labels, values):
+        return [f"{self.name}{formatLabels(self.labelNames, labels)} {formatValue(values[0])}"]
+
+
+class Histogram(ShardedMetric):
+    """
+    直方图
+
+    Attributes:
+        buckets (Tuple[float, ...]): 分桶上限(不含 +Inf)
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelNames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelNames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelValues: str):
+        """
+        记录一次观测值
+
+        Args:
+            value (float): 观测值(秒)
+            *labelValues (str): 标签值,顺序与 labelNames 一致
+        """
+        shard = self._shard()
+        entry = shard.get(labelValues)
+        if entry is None:
+            # 各分桶计数(最后一个为 +Inf) + 总和
+            entry = shard[labelValues] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def renderSeries(self, labels, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+            cumulative += count
+            le = f'le="{formatValue(bound)}"'
+            lines.append(f"{self.name}_bucket{formatLabels(self.labelNames, labels, le)} {cumulative}")
+        labelText = formatLabels(self.labelNames, labels)
+        lines.append(f"{self.name}_sum{labelText} {formatValue(values[-1])}")
+        lines.append(f"{self.name}_count{labelText} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    除了累加型指标,还可以注册在导出时才计算的值: 瞬时值(gauge),
+    以及由其他模块自己累加、导出时读取的计数(counter)
+    """
+
+    def __init__(self):
+        self._metrics: List[ShardedMetric] = []
+        self._collected: List[Tuple[str, str, str, Callable[[], Dict[Tuple[str, ...], float]], Tuple[str, ...]]] = []
+
+    def counter(self, name: str, help: str, labelNames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelNames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelNames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelNames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, collect: Callable[[], float], labelNames: Sequence[str] = ()):
+        """
+        注册导出时计算的瞬时值
+
+        Args:
+            name (str): 指标名
+            help (str): 指标说明
+            collect (Callable): 返回数值;有标签时返回 {标签值元组: 数值}
+            labelNames (Sequence[str]): 标签名
+        """
+        self._collected.append((name, "gauge", help, collect, tuple(labelNames)))
+
+    def collectedCounter(self, name: str, help: str, collect: Callable[[], float], labelNames: Sequence[str] = ()):
+        """
+        注册导出时读取的计数,用于其他模块自己维护的只增不减的累计值
+
+        Args:
+            name (str): 指标名,以 _total 结尾
+            help (str): 指标说明
+            collect (Callable): 返回当前累计值;有标签时返回 {标签值元组: 数值}
+            labelNames (Sequence[str]): 标签名
+        """
+        self._collected.append((name, "counter", help, collect, tuple(labelNames)))
+
+    def render(self) -> str:
+        """
+        生成Prometheus文本格式的全部指标
+
+        Returns:
+            str: 指标文本
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, kind, help, collect, labelNames in self._collected:
+            try:
+                value = collect()
+            except Exception:
+                # 单个指标读取失败不影响其他指标
+                continue
+            series = value if labelNames else {(): value}
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, sample in sorted(series.items()):
+                lines.append(f"{name}{formatLabels(labelNames, labels)} {formatValue(sample)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表和指标
+registry = MetricsRegistry()
+
+httpRequests = registry.counter(
+    "treehole_http_requests_total", "HTTP请求数", ("route", "method", "status"))
+httpDuration = registry.histogram(
+    "treehole_http_request_duration_seconds", "HTTP请求耗时", ("route", "method"))
+dbStatements = registry.counter(
+    "treehole_db_statements_total", "SQL语句执行次数", ("statement",))
+dbDuration = registry.histogram(
+    "treehole_db_statement_duration_seconds", "SQL语句耗时", ("statement",), buckets=DB_BUCKETS)
+geoDuration = registry.histogram(
+    "treehole_geo_lookup_duration_seconds", "地理位置查询耗时(不含缓存命中)", ("source",))
+geoErrors = registry.counter(
+    "treehole_geo_lookup_errors_total", "地理位置查询失败次数", ("source",))
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求耗时和状态码的ASGI中间件
+
+    路由标签使用路由模板(如 /messages/{messageId}),未匹配任何路由的请求记为 unmatched,
+    避免标签数量随URL无限增长
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def sendWrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendWrapper)
+        finally:
+            route = scope.get("route")
+            routePath = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            httpDuration.observe(time.perf_counter() - start, routePath, method)
+            httpRequests.inc(routePath, method, str(status[0]))
+
+
+def instrumentEngine(targetEngine: Engine):
+    """
+    为数据库引擎注册SQL执行计时
+
+    Args:
+        targetEngine (Engine): 同步引擎(异步引擎传入其 sync_engine)
+    """
+    @event.listens_for(targetEngine, "before_cursor_execute")
+    def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(targetEngine, "after_cursor_execute")
+    def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        kind = statementKind(statement)
+        dbDuration.observe(elapsed, kind)
+        dbStatements.inc(kind)
+
+
+def statementKind(statement: str) -> str:
+    """
+    取SQL语句的类型作为标签
+
+    Args:
+        statement (str): SQL文本
+
+    Returns:
+        str: 大写的首个关键字,如 SELECT、INSERT
+    """
+    head = statement.lstrip()[:16].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def observeGeoLookup(source: str, start: float, failed: bool = False):
+    """
+    记录一次地理位置查询
+
+    Args:
+        source (str): 数据源,local 或 remote
+        start (float): time.perf_counter() 记录的开始时间
+        failed (bool): 是否查询失败(异常或接口返回错误)
+    """
+    geoDuration.observe(time.perf_counter() - start, source)
+    if failed:
+        geoErrors.inc(source)
+
+
+def threadpoolStats() -> Optional[Dict[str, float]]:
+    """
+    读取AnyIO默认线程池(同步路由和 run_in_threadpool 使用)的占用情况
+
+    只能在事件循环中调用
+
+    Returns:
+        Optional[Dict[str, float]]: borrowed(正在使用的线程数)和 total(上限)
+    """
+    from anyio.to_thread import current_default_thread_limiter
+
+    limiter = current_default_thread_limiter()
+    return {"borrowed": limiter.borrowed_tokens, "total": limiter.total_tokens}
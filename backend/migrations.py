@@ -0,0 +1,181 @@
+"""
+数据库结构迁移
+
+按编号顺序对已有数据库执行结构变更(加列、加索引等),无需重建数据库
+已执行的迁移版本记录在 schema_migrations 表中,每次启动只执行尚未执行的迁移
+
+新增迁移的约定:
+- 在 MIGRATIONS 末尾追加,编号递增,已发布的迁移不要修改
+- 迁移必须是幂等的: 新数据库由 create_all 直接建出完整结构,迁移需先检查再变更
+
+命令行用法:
+    python migrations.py          # 执行所有待执行的迁移
+    python migrations.py status   # 查看迁移状态
+"""
+
+import datetime
+import sys
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+import models
+from logger import setupLogger, logInfo, logError
+
+logger = setupLogger("migrations")
+
+# 迁移版本记录表,不属于业务模型,单独使用一个MetaData
+migrationMetadata = MetaData()
+
+schemaMigrations = Table(
+    "schema_migrations",
+    migrationMetadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    """
+    单个迁移
+
+    Attributes:
+        version (int): 迁移编号
+        description (str): 迁移说明
+        upgrade (Callable[[Connection], None]): 执行迁移的函数
+    """
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+# ==================== 迁移辅助函数 ====================
+
+def addColumnIfMissing(conn: Connection, table: str, column: str, ddl: str):
+    """
+    如果列不存在则添加
+
+    Args:
+        conn (Connection): 数据库连接
+        table (str): 表名
+        column (str): 列名
+        ddl (str): 列定义,如 "VARCHAR(45)"
+    """
+    existing = {col["name"] for col in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        logInfo(logger, f"添加列 {table}.{column}")
+
+def createModelIndex(conn: Connection, table, name: str):
+    """
+    按模型中定义的索引创建索引,已存在时跳过
+
+    Args:
+        conn (Connection): 数据库连接
+        table: SQLAlchemy Table 对象
+        name (str): 索引名称
+    """
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(conn, checkfirst=True)
+    logInfo(logger, f"确认索引 {name}")
+
+
+# ==================== 迁移定义 ====================
+
+def _addIpColumns(conn: Connection):
+    addColumnIfMissing(conn, "messages", "ip_address", "VARCHAR(45)")
+    addColumnIfMissing(conn, "messages", "location", "VARCHAR(100)")
+
+def _addMessageIndexes(conn: Connection):
+    table = models.Message.__table__
+    createModelIndex(conn, table, "ix_messages_parent_id_id")
+    createModelIndex(conn, table, "ix_messages_timestamp")
+
+def _createSearchTable(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        return
+    conn.exec_driver_sql(models.CREATE_SEARCH_TABLE)
+    logInfo(logger, f"确认全文索引表 {models.SEARCH_TABLE},已有留言请执行 python search.py backfill 建立索引")
+
+def _createArchiveTable(conn: Connection):
+    models.ArchivedMessage.__table__.create(conn, checkfirst=True)
+    logInfo(logger, "确认归档表 messages_archive")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "messages 添加 ip_address 和 location 列", _addIpColumns),
+    Migration(2, "messages 添加 (parent_id, id) 和 timestamp 索引", _addMessageIndexes),
+    Migration(3, "创建全文索引表 messages_fts(仅SQLite)", _createSearchTable),
+    Migration(4, "创建归档表 messages_archive", _createArchiveTable),
+]
+
+
+# ==================== 迁移执行 ====================
+
+def getAppliedVersions(engine: Engine) -> set:
+    """
+    获取已执行的迁移版本
+
+    Args:
+        engine (Engine): 数据库引擎
+
+    Returns:
+        set: 已执行的迁移编号集合
+    """
+    migrationMetadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schemaMigrations.c.version)).scalars())
+
+def runMigrations(engine: Engine) -> List[int]:
+    """
+    按编号顺序执行所有待执行的迁移
+
+    每个迁移及其版本记录在同一个事务中提交;
+    多个进程同时启动时,后到的进程写入版本记录冲突会被忽略
+
+    Args:
+        engine (Engine): 数据库引擎
+
+    Returns:
+        List[int]: 本次执行的迁移编号
+    """
+    applied = getAppliedVersions(engine)
+    executed = []
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                migration.upgrade(conn)
+                conn.execute(schemaMigrations.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.datetime.utcnow()
+                ))
+            executed.append(migration.version)
+            logInfo(logger, f"执行迁移 {migration.version}: {migration.description}")
+        except IntegrityError:
+            logInfo(logger, f"迁移 {migration.version} 已由其他进程执行")
+        except Exception as e:
+            logError(logger, e, f"执行迁移失败 {migration.version}")
+            raise
+
+    return executed
+
+
+if __name__ == "__main__":
+    from database import engine, createTables
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        applied = getAppliedVersions(engine)
+        for migration in MIGRATIONS:
+            state = "已执行" if migration.version in applied else "待执行"
+            print(f"{migration.version:>4}  {state}  {migration.description}")
+    else:
+        createTables()
+        done = runMigrations(engine)
+        print(f"执行了 {len(done)} 个迁移: {done}" if done else "数据库已是最新版本")
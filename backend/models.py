@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from database import Base
 from config import MESSAGE_CONFIG
@@ -20,8 +20,16 @@ class Message(Base):
         location (str): IP地理位置
         replies (List[Message]): 回复列表
         parent (Message): 父留言对象
+
+    Indexes:
+        ix_messages_parent_id_id: 覆盖顶层留言列表(parent_id IS NULL ORDER BY id)和回复查询
+        ix_messages_timestamp: 按时间范围查询
     """
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_parent_id_id", "parent_id", "id"),
+        Index("ix_messages_timestamp", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String(MESSAGE_CONFIG["max_content_length"]), nullable=False)
@@ -33,3 +41,68 @@ class Message(Base):
     ip_address = Column(String(45), nullable=True)  # 支持IPv6
     location = Column(String(100), nullable=True)  # 存储地理位置，如 "北京市"
     replies = relationship("Message", backref="parent", remote_side=[id])
+
+class MessageRow:
+    """
+    只读留言行
+
+    读接口只需要把留言编码一次后返回,不需要ORM实体的身份映射、变更跟踪和关联关系,
+    因此只查询对外公开的列(不含IP地址),每行保存为一个 __slots__ 对象
+
+    Attributes:
+        与 Message 同名,见 PUBLIC_FIELDS
+    """
+    __slots__ = ("id", "content", "timestamp", "like_count", "dislike_count", "reply_count", "parent_id", "location")
+
+    def __init__(self, id, content, timestamp, like_count, dislike_count, reply_count, parent_id, location):
+        self.id = id
+        self.content = content
+        self.timestamp = timestamp
+        self.like_count = like_count
+        self.dislike_count = dislike_count
+        self.reply_count = reply_count
+        self.parent_id = parent_id
+        self.location = location
+
+class ArchivedMessage(Base):
+    """
+    归档留言数据模型
+
+    长期没有新回复的帖子(顶层留言及其全部回复)由 archive.py 整帖从 messages 移入本表,
+    列与 Message 相同,ID保持不变。留言列表只读取 messages,按ID读取留言和回复时再回退到本表
+
+    Attributes:
+        与 Message 同名的列,另有:
+        archived_at (datetime): 归档时间
+
+    Indexes:
+        ix_messages_archive_parent_id_id: 回复查询
+    """
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index("ix_messages_archive_parent_id_id", "parent_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    content = Column(String(MESSAGE_CONFIG["max_content_length"]), nullable=False)
+    timestamp = Column(DateTime)
+    like_count = Column(Integer, default=0)
+    dislike_count = Column(Integer, default=0)
+    reply_count = Column(Integer, default=0)
+    parent_id = Column(Integer, nullable=True)
+    ip_address = Column(String(45), nullable=True)
+    location = Column(String(100), nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# 对外公开的留言字段,以及查询时选择的列(与字段一一对应)
+PUBLIC_FIELDS = MessageRow.__slots__
+PUBLIC_COLUMNS = tuple(getattr(Message, name) for name in PUBLIC_FIELDS)
+ARCHIVE_PUBLIC_COLUMNS = tuple(getattr(ArchivedMessage, name) for name in PUBLIC_FIELDS)
+
+# 全文搜索索引(SQLite FTS5),rowid 与 messages.id 相同,tokens 为 search.tokenize 生成的分词结果
+# 随 messages 表一起创建和删除;已有数据库由迁移创建,再用 python search.py backfill 补建索引
+SEARCH_TABLE = "messages_fts"
+CREATE_SEARCH_TABLE = f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(tokens)"
+
+event.listen(Message.__table__, "after_create", DDL(CREATE_SEARCH_TABLE).execute_if(dialect="sqlite"))
+event.listen(Message.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}").execute_if(dialect="sqlite"))
@@ -0,0 +1,226 @@
+"""
+单请求性能分析和慢查询日志
+
+单请求分析(需要管理员令牌):
+    请求带上 X-Admin-Token: <ADMIN_TOKEN> 和 X-Profile 头时,用 cProfile 分析这一次请求
+    - X-Profile: 1     分析结果保存为 PROFILE_DIR 下的 .prof 文件,文件名在响应头 X-Profile-File 中返回,
+                       可用 python -m pstats 或 snakeviz 查看
+    - X-Profile: text  直接返回按累计耗时排序的文本报告,替代原响应内容
+    分析期间该请求的数据库操作和地理位置查询在事件循环线程中直接执行(不进入线程池),
+    保证分析结果包含完整的调用链;同一时间事件循环上的其他请求也可能出现在结果中
+
+慢查询日志(始终开启):
+    执行时间超过 SLOW_QUERY_MS 毫秒的SQL语句记录到 slow_query 日志,
+    包含SQL文本、参数结构(只记录参数名和类型,不记录参数值)、耗时和调用它的 crud 函数
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import PROFILING_CONFIG
+from logger import setupLogger
+
+logger = setupLogger("slow_query")
+
+# 当前请求是否正在被分析
+profilingActive: contextvars.ContextVar[bool] = contextvars.ContextVar("profilingActive", default=False)
+
+# 当前正在执行的 crud 函数(含模块名,如 "crud_async.getMessages"),由 main.runCrud 设置,
+# 异步模式下无法从调用栈中找到调用方时使用
+currentCrudCall: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("currentCrudCall", default=None)
+
+# 慢查询日志中 SQL 文本的最大长度
+MAX_STATEMENT_LENGTH = 1000
+
+_CRUD_MODULES = ("crud", "crud_async")
+
+
+def isAdminRequest(headers: dict) -> bool:
+    """
+    检查请求是否带有正确的管理员令牌
+
+    Args:
+        headers (dict): 小写的请求头字典
+
+    Returns:
+        bool: 配置了 ADMIN_TOKEN 且请求头 X-Admin-Token 与之一致时为True
+    """
+    token = PROFILING_CONFIG["admin_token"]
+    provided = headers.get("x-admin-token", "")
+    return bool(token) and hmac.compare_digest(provided.encode(), token.encode())
+
+
+def saveProfile(profiler: cProfile.Profile, method: str, path: str) -> str:
+    """
+    保存分析结果
+
+    Args:
+        profiler (cProfile.Profile): 已停止的分析器
+        method (str): 请求方法
+        path (str): 请求路径
+
+    Returns:
+        str: 保存的文件名
+    """
+    os.makedirs(PROFILING_CONFIG["profile_dir"], exist_ok=True)
+    safePath = path.strip("/").replace("/", "_") or "root"
+    fileName = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{method}_{safePath}.prof"
+    profiler.dump_stats(os.path.join(PROFILING_CONFIG["profile_dir"], fileName))
+    return fileName
+
+
+def profileReport(profiler: cProfile.Profile, limit: int = 40) -> str:
+    """
+    生成按累计耗时排序的文本报告
+
+    Args:
+        profiler (cProfile.Profile): 已停止的分析器
+        limit (int): 报告的函数数
+
+    Returns:
+        str: 文本报告
+    """
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    按请求头触发 cProfile 的ASGI中间件
+
+    没有 X-Profile 头的请求只多一次字典查找
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        mode = headers.get("x-profile")
+        if not mode or not isAdminRequest(headers):
+            await self.app(scope, receive, send)
+            return
+
+        asText = mode == "text"
+        messages = []
+
+        async def sendWrapper(message):
+            # 分析结束前缓冲响应;文本报告模式丢弃原响应
+            if not asText:
+                messages.append(message)
+
+        profiler = cProfile.Profile()
+        token = profilingActive.set(True)
+        profiler.enable()
+        try:
+            await self.app(scope, receive, sendWrapper)
+        finally:
+            profiler.disable()
+            profilingActive.reset(token)
+
+        if asText:
+            body = profileReport(profiler).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                            (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # 保存文件后再发送缓冲的响应,以便在响应头中返回文件名
+        fileName = saveProfile(profiler, scope.get("method", ""), scope.get("path", ""))
+        for message in messages:
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-file", fileName.encode("latin-1"))
+                ]
+            await send(message)
+
+
+def describeParameters(parameters) -> str:
+    """
+    描述SQL参数的结构,不包含参数值
+
+    Args:
+        parameters: 单次执行的参数(字典或元组),或 executemany 的参数列表
+
+    Returns:
+        str: 如 "{content: str, parent_id: NoneType}" 或 "20 x (int, int)"
+    """
+    if isinstance(parameters, list):
+        if not parameters:
+            return "[]"
+        return f"{len(parameters)} x {describeParameters(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, tuple):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def findCrudCaller() -> str:
+    """
+    查找发起当前SQL的 crud 函数
+
+    先沿调用栈查找 crud / crud_async 模块中的函数;找不到时(如异步模式下在greenlet中执行)
+    使用 main.runCrud 记录的函数
+
+    Returns:
+        str: 如 "crud.getMessages"、"crud_async.getMessages",无法确定时为 "unknown"
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in _CRUD_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return currentCrudCall.get() or "unknown"
+
+
+def instrumentSlowQueries(targetEngine: Engine, thresholdMs: Optional[int] = None):
+    """
+    为数据库引擎注册慢查询日志
+
+    Args:
+        targetEngine (Engine): 同步引擎(异步引擎传入其 sync_engine)
+        thresholdMs (Optional[int]): 慢查询阈值(毫秒),默认使用 PROFILING_CONFIG["slow_query_ms"],0表示关闭
+    """
+    threshold = (PROFILING_CONFIG["slow_query_ms"] if thresholdMs is None else thresholdMs) / 1000
+    if threshold <= 0:
+        return
+
+    @event.listens_for(targetEngine, "before_cursor_execute")
+    def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(targetEngine, "after_cursor_execute")
+    def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if elapsed < threshold:
+            return
+        logger.warning(
+            f"慢查询 {elapsed * 1000:.1f}ms 调用方: {findCrudCaller()} "
+            f"参数: {describeParameters(parameters)} SQL: {' '.join(statement.split())[:MAX_STATEMENT_LENGTH]}"
+        )
@@ -0,0 +1,181 @@
+"""
+按客户端IP的写接口限流
+
+每个IP在每类写接口上有一个令牌桶:
+- message: 发表留言和回复 (POST /messages/)
+- vote: 点赞和点踩 (POST /messages/{id}/like, /dislike)
+
+令牌按配置的速率(每分钟)恢复,桶容量即允许的突发请求数。
+令牌不足时中间件直接返回429和 Retry-After,请求不会进入路由,也不会打开数据库会话。
+客户端IP由 ip_utils.get_client_ip 按可信代理层数(PROXY_CONFIG)从 X-Forwarded-For 右侧取得,
+客户端自己添加的地址不会换到新的令牌桶。
+
+令牌桶保存在按最近访问排序的 OrderedDict 中:
+- 每次访问把该IP移到末尾,并从头部清理已空闲到令牌回满的桶,这样的桶与新建的桶等价
+- 条目数超过上限时淘汰最久未访问的桶
+清理和淘汰都是 O(1) 摊还,内存占用有上限
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from config import RATE_LIMIT_CONFIG
+from ip_utils import get_client_ip
+from logger import setupLogger, logInfo
+
+logger = setupLogger("rate_limiter")
+
+
+class TokenBucketLimiter:
+    """
+    按键(客户端IP)计数的令牌桶限流器
+
+    Attributes:
+        ratePerMinute (int): 每分钟恢复的令牌数
+        burst (int): 桶容量
+        maxKeys (int): 最多保存的桶数
+    """
+
+    def __init__(self, ratePerMinute: int, burst: int, maxKeys: int, clock: Callable[[], float] = time.monotonic):
+        self.ratePerMinute = ratePerMinute
+        self.burst = max(burst, 1)
+        self.maxKeys = maxKeys
+        self._ratePerSecond = ratePerMinute / 60
+        # 令牌从0恢复到满所需的秒数,空闲超过该时间的桶可以直接删除
+        self._idleSeconds = self.burst / self._ratePerSecond if self._ratePerSecond else float("inf")
+        self._clock = clock
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: str) -> Tuple[bool, float]:
+        """
+        尝试取一个令牌
+
+        Args:
+            key (str): 客户端IP
+
+        Returns:
+            Tuple[bool, float]: (是否允许, 令牌不足时需要等待的秒数)
+        """
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(self.burst)
+                if len(self._buckets) >= self.maxKeys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self._ratePerSecond)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                self._buckets[key] = [tokens - 1, now]
+                self.allowed += 1
+                return True, 0.0
+
+            self._buckets[key] = [tokens, now]
+            self.rejected += 1
+            if not self._ratePerSecond:
+                return False, 60.0
+            return False, (1 - tokens) / self._ratePerSecond
+
+    def stats(self) -> dict:
+        """
+        获取限流统计
+
+        Returns:
+            dict: 当前桶数、放行和拒绝次数
+        """
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "max_buckets": self.maxKeys,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+            }
+
+    def _expire(self, now: float):
+        # 调用方需持有锁;桶按最近访问排序,遇到第一个未过期的桶即停止
+        buckets = self._buckets
+        while buckets:
+            key, (_, updatedAt) = next(iter(buckets.items()))
+            if now - updatedAt < self._idleSeconds:
+                break
+            del buckets[key]
+
+
+def routeClass(method: str, path: str) -> Optional[str]:
+    """
+    判断请求属于哪一类受限的写接口
+
+    Args:
+        method (str): 请求方法
+        path (str): 请求路径
+
+    Returns:
+        Optional[str]: "message" / "vote",不受限时为None
+    """
+    if method != "POST" or not path.startswith("/messages/"):
+        return None
+    if path == "/messages/":
+        return "message"
+    if path.endswith("/like") or path.endswith("/dislike"):
+        return "vote"
+    return None
+
+
+def createLimiters() -> Dict[str, TokenBucketLimiter]:
+    """
+    按 RATE_LIMIT_CONFIG 创建各类接口的限流器
+    """
+    return {
+        name: TokenBucketLimiter(
+            RATE_LIMIT_CONFIG[f"{name}_per_minute"],
+            RATE_LIMIT_CONFIG[f"{name}_burst"],
+            RATE_LIMIT_CONFIG["max_clients"],
+        )
+        for name in ("message", "vote")
+    }
+
+
+# 全局实例
+limiters = createLimiters()
+
+
+class RateLimitMiddleware:
+    """
+    写接口限流的ASGI中间件
+
+    非写接口的请求只做一次路径判断
+    """
+
+    def __init__(self, app, limiters: Dict[str, TokenBucketLimiter] = limiters):
+        self.app = app
+        self.limiters = limiters
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            limiter = self.limiters.get(routeClass(scope["method"], scope["path"]))
+            if limiter is not None:
+                clientIp = get_client_ip(Request(scope))
+                allowed, retryAfter = limiter.acquire(clientIp)
+                if not allowed:
+                    if limiter.rejected % 100 == 1:
+                        logInfo(logger, f"请求过于频繁被限流: {clientIp} {scope['path']}")
+                    response = JSONResponse(
+                        {"detail": "请求过于频繁,请稍后重试"},
+                        status_code=429,
+                        headers={"Retry-After": str(max(1, int(retryAfter + 0.999)))},
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
@@ -0,0 +1,106 @@
+"""
+回复数校对
+
+留言的 reply_count 是冗余计数,发表回复时在同一事务中用 SQL 原子加一维护。
+早期版本分两次提交并在 Python 中读改写,并发回复或进程中途退出都可能让计数与实际回复数不一致,
+手工修改数据库后也需要重新校对。本模块按实际的子回复数重新计算 reply_count 并报告偏差:
+
+- 按ID顺序分批处理,每批一个事务,可以在服务运行时执行
+- 每批先读取存储值和实际回复数,只更新不一致的行;
+  更新语句在SQL中重新计数,读取和更新之间新增的回复不会被覆盖
+
+命令行用法:
+    python reconcile.py            # 校对并修正
+    python reconcile.py --dry-run  # 只报告偏差,不修改
+"""
+
+import sys
+from typing import List, NamedTuple, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from logger import setupLogger, logInfo
+
+logger = setupLogger("reconcile")
+
+_ACTUAL_REPLIES = "(SELECT COUNT(*) FROM messages AS c WHERE c.parent_id = m.id)"
+
+_SCAN_STATEMENT = text(f"""
+    SELECT m.id, m.reply_count, {_ACTUAL_REPLIES} AS actual
+    FROM messages AS m
+    WHERE m.id > :lastId
+    ORDER BY m.id LIMIT :limit
+""")
+_FIX_STATEMENT = text(f"""
+    UPDATE messages AS m SET reply_count = {_ACTUAL_REPLIES}
+    WHERE m.id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+class ReconcileReport(NamedTuple):
+    """
+    校对结果
+
+    Attributes:
+        checked (int): 检查的留言数
+        drifted (int): 计数不一致的留言数
+        totalDrift (int): 存储值与实际值之差的绝对值之和
+        fixed (int): 已修正的留言数,只报告时为0
+        samples (List[Tuple[int, int, int]]): 部分不一致的 (留言ID, 存储值, 实际值)
+    """
+    checked: int
+    drifted: int
+    totalDrift: int
+    fixed: int
+    samples: List[Tuple[int, int, int]]
+
+
+def reconcileReplyCounts(engine: Engine, dryRun: bool = False, batchSize: int = 1000,
+                         sampleSize: int = 20) -> ReconcileReport:
+    """
+    按实际回复数校对所有留言的 reply_count
+
+    Args:
+        engine (Engine): 数据库引擎
+        dryRun (bool): 只报告偏差,不修改
+        batchSize (int): 每批处理的留言数
+        sampleSize (int): 报告中保留的不一致样例数
+
+    Returns:
+        ReconcileReport: 校对结果
+    """
+    lastId, checked, drifted, totalDrift, fixed = 0, 0, 0, 0, 0
+    samples = []
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(_SCAN_STATEMENT, {"lastId": lastId, "limit": batchSize}).all()
+            if not rows:
+                break
+            stale = [row for row in rows if row.reply_count != row.actual]
+            if stale and not dryRun:
+                fixed += conn.execute(_FIX_STATEMENT, {"ids": [row.id for row in stale]}).rowcount
+
+        lastId = rows[-1].id
+        checked += len(rows)
+        drifted += len(stale)
+        totalDrift += sum(abs((row.reply_count or 0) - row.actual) for row in stale)
+        samples.extend((row.id, row.reply_count, row.actual) for row in stale[:sampleSize - len(samples)])
+        if stale:
+            logInfo(logger, f"回复数不一致 {len(stale)} 条,当前ID: {lastId}")
+
+    logInfo(logger, f"回复数校对完成: 检查 {checked} 条,不一致 {drifted} 条,修正 {fixed} 条")
+    return ReconcileReport(checked, drifted, totalDrift, fixed, samples)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] != "--dry-run"):
+        print("用法: python reconcile.py [--dry-run]")
+        sys.exit(1)
+
+    report = reconcileReplyCounts(engine, dryRun=len(sys.argv) == 2)
+    for messageId, stored, actual in report.samples:
+        print(f"{messageId:>8}  存储: {stored}  实际: {actual}")
+    print(f"检查 {report.checked} 条,不一致 {report.drifted} 条,偏差合计 {report.totalDrift},修正 {report.fixed} 条")
@@ -0,0 +1,268 @@
+"""
+响应缓存
+
+缓存热点读接口(留言列表第一页、各帖子的第一页回复)最终编码好的响应字节,
+命中时直接返回,不再经过数据库查询和JSON序列化
+
+失效方式:
+- 每个缓存条目带有标签: "list" 表示留言列表首页, "replies:<父留言ID>" 表示某帖子的回复,
+  "msg:<留言ID>" 表示条目中包含该留言
+- crud 中的写操作按受影响的标签精确失效,例如点赞只失效包含该留言的条目
+- 写入缓存前检查代数(generation),读数据库期间如果发生过失效,本次结果不写入缓存,
+  避免把旧数据放回缓存
+
+代数在每次写操作时递增,同时作为留言板的版本号,用于生成读接口的ETag
+
+其他进程(gunicorn 的其他 worker、archive.py / backup.py / reconcile.py 等命令行工具)的写入
+不会经过本进程的 crud,由 DataVersionWatcher 检测: SQLite 的 PRAGMA data_version
+在其他连接提交写事务后会变化,检测到变化时清空整个缓存并递增代数。
+本进程的连接提交后重新记录 data_version(已按标签精确失效),不会因此清空整个缓存。
+其他数据库没有对应的机制,只能单进程部署
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import CACHE_CONFIG
+
+
+class ResponseCache:
+    """
+    按总字节数限制大小的LRU响应缓存
+
+    Attributes:
+        maxBytes (int): 缓存内容总字节数上限,超出时淘汰最久未使用的条目
+    """
+
+    def __init__(self, maxBytes: int):
+        self.maxBytes = maxBytes
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, frozenset]]" = OrderedDict()
+        self._tagIndex: Dict[str, Set[Hashable]] = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        当前缓存代数,每次失效操作加一
+        """
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """
+        读取缓存的响应
+
+        Args:
+            key (Hashable): 缓存键
+
+        Returns:
+            Optional[bytes]: 响应内容,未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, body: bytes, tags: Iterable[str], generation: int) -> bool:
+        """
+        写入缓存
+
+        Args:
+            key (Hashable): 缓存键
+            body (bytes): 响应内容
+            tags (Iterable[str]): 条目标签
+            generation (int): 读取数据前记录的缓存代数
+
+        Returns:
+            bool: 是否写入,读取数据期间发生过失效或内容过大时不写入
+        """
+        if self.maxBytes <= 0 or len(body) > self.maxBytes:
+            return False
+        tags = frozenset(tags)
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._remove(key)
+            self._entries[key] = (body, tags)
+            self._bytes += len(body)
+            for tag in tags:
+                self._tagIndex.setdefault(tag, set()).add(key)
+            while self._bytes > self.maxBytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidateTags(self, *tags: str):
+        """
+        失效带有任一指定标签的缓存条目
+
+        Args:
+            *tags (str): 标签
+        """
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tagIndex.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tagIndex.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 条目数、占用字节数、命中率、淘汰和失效次数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.maxBytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable):
+        # 调用方需持有锁
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        body, tags = entry
+        self._bytes -= len(body)
+        for tag in tags:
+            keys = self._tagIndex.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagIndex[tag]
+
+
+class DataVersionWatcher:
+    """
+    检测数据库是否有新提交的写入(仅SQLite文件数据库)
+
+    使用一个专用连接反复读取 PRAGMA data_version: 同一连接两次读取之间,
+    只要有其他连接(包括其他进程)提交过写事务,返回值就会不同。
+    读取只访问共享内存或文件头,不执行查询,可以在每个读请求中调用。
+
+    本进程的连接同样是"其他连接",用 ignoreLocalCommits 登记本进程的引擎后,
+    这些连接提交完成时重新记录 data_version,changed() 只报告其他进程的写入。
+    提交语句执行期间恰好提交的其他进程写入会被一并记录而漏检,直到其他进程下一次写入
+    """
+
+    def __init__(self, targetEngine: Engine):
+        url = targetEngine.url
+        self._connection = None
+        if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+            self._connection = sqlite3.connect(url.database, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._version = self._read()
+
+    @property
+    def supported(self) -> bool:
+        """
+        当前数据库是否支持检测
+        """
+        return self._connection is not None
+
+    def changed(self) -> bool:
+        """
+        自上次调用以来是否有新提交的写入
+
+        Returns:
+            bool: 有新写入时返回True;不支持检测的数据库总是返回False
+        """
+        if self._connection is None:
+            return False
+        with self._lock:
+            version = self._read()
+            if version == self._version:
+                return False
+            self._version = version
+            return True
+
+    def acknowledge(self):
+        """
+        重新记录当前的 data_version,此前的写入不再被 changed() 报告
+        """
+        if self._connection is None:
+            return
+        with self._lock:
+            self._version = self._read()
+
+    def ignoreLocalCommits(self, targetEngine: Engine, onChange: Callable[[], None]):
+        """
+        不把本进程通过 targetEngine 提交的写入当作其他进程的写入
+
+        提交前先检查一次,此前其他进程的写入照常调用 onChange;
+        提交后连接归还连接池时调用 acknowledge
+
+        Args:
+            targetEngine (Engine): 本进程的同步引擎(异步引擎传入 sync_engine)
+            onChange (Callable[[], None]): 检测到其他进程写入时的回调,如清空响应缓存
+        """
+        if self._connection is None:
+            return
+
+        @event.listens_for(targetEngine, "commit")
+        def beforeCommit(conn):
+            if self.changed():
+                onChange()
+            conn.info["data_version_commit"] = True
+
+        @event.listens_for(targetEngine, "checkin")
+        def afterCommit(dbapiConnection, connectionRecord):
+            if connectionRecord.info.pop("data_version_commit", False):
+                self.acknowledge()
+
+    def _read(self) -> Optional[int]:
+        if self._connection is None:
+            return None
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+
+def messageTags(items) -> Set[str]:
+    """
+    生成响应中每条留言对应的标签
+
+    Args:
+        items: 留言对象列表
+
+    Returns:
+        Set[str]: "msg:<ID>" 形式的标签集合
+    """
+    return {f"msg:{item.id}" for item in items}
+
+
+# 全局实例
+responseCache = ResponseCache(CACHE_CONFIG["max_bytes"] if CACHE_CONFIG["enabled"] else 0)
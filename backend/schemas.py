@@ -43,9 +43,9 @@ class MessageCreate(MessageBase):
     """
     pass
 
-class Message(MessageBase):
+class PublicMessage(MessageBase):
     """
-    留言响应模型
+    对外公开的留言响应模型,不包含IP地址
 
     Attributes:
         id (int): 留言唯一标识符
@@ -54,7 +54,6 @@ class Message(MessageBase):
         dislike_count (int): 踩数量
         reply_count (int): 回复数量
         parent_id (Optional[int]): 父留言ID
-        ip_address (Optional[str]): IP地址
         location (Optional[str]): IP地理位置
     """
     id: int
@@ -63,8 +62,16 @@ class Message(MessageBase):
     dislike_count: int
     reply_count: int
     parent_id: Optional[int] = None
-    ip_address: Optional[str] = None
     location: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+class Message(PublicMessage):
+    """
+    留言完整模型,包含IP地址,仅供服务端内部使用
+
+    Attributes:
+        ip_address (Optional[str]): IP地址
+    """
+    ip_address: Optional[str] = None
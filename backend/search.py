@@ -0,0 +1,241 @@
+"""
+留言全文搜索
+
+使用 SQLite FTS5 虚拟表 messages_fts 建立倒排索引,rowid 与留言ID相同
+
+中文没有空格分词,FTS5 自带的分词器会把整段中文当成一个词,因此写入索引前先在 Python 中分词:
+- 中日韩文字按相邻两个字切分(二元组),每段文字的最后一个字再单独作为一个词
+- 其他文字按字母数字切分为单词,统一转为小写
+例如 "今天天气好 ok" 切分为 "今天 天天 天气 气好 好 ok"
+
+查询时同样把关键词切分为二元组,要求全部命中;单个汉字按前缀匹配
+(以该字开头的二元组,或作为一段结尾的单字)。结果按 bm25 相关度排序
+
+bm25 分数依赖全表的统计量(文档数、平均长度、各词的文档频率),每新增一条留言所有分数都会变化,
+不能用 (分数, ID) 作为翻页游标。翻页使用绑定快照的偏移量: 第一页记录当时索引中的最大ID,
+后续页只在ID不大于该值的留言中按偏移量读取,翻页期间新发表的留言不会出现在后面的页中。
+快照只固定结果的范围,不固定顺序: 每页仍按请求时的统计量重新计算分数,
+两次翻页之间有新留言时,分数接近的结果可能交换先后,跨越页边界的结果会重复或遗漏,
+调用方需要按留言ID去重
+
+归档的留言(messages_archive)保留在索引中,搜索结果依次从 messages 和归档表读取
+
+索引随 crud 的写操作在同一事务中更新,已有数据用命令行补建:
+    python search.py backfill          # 为尚未建立索引的留言补建索引
+    python search.py rebuild           # 清空后重建全部索引
+    python search.py query 关键词      # 在命令行中搜索
+"""
+
+import re
+import sys
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+import models
+from config import SEARCH_CONFIG
+from logger import setupLogger, logInfo
+
+logger = setupLogger("search")
+
+# 中日韩文字: 平假名/片假名、CJK扩展A、CJK统一汉字、兼容汉字、韩文音节
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(f"([{_CJK}]+)|((?:(?![{_CJK}])[^\\W_])+)")
+
+# 留言只会在其中一张表中,另一张表左连接得到的列全为NULL
+_SELECT_COLUMNS = ", ".join(f"COALESCE(m.{name}, a.{name})" for name in models.PUBLIC_FIELDS)
+_ARCHIVE_TABLE = models.ArchivedMessage.__tablename__
+
+# 先在全文索引中按相关度取一页ID,再回表读取公开字段
+_SEARCH_SQL = f"""
+    SELECT {_SELECT_COLUMNS}, hits.score
+    FROM (
+        SELECT rowid AS id, bm25({models.SEARCH_TABLE}) AS score
+        FROM {models.SEARCH_TABLE}
+        WHERE {models.SEARCH_TABLE} MATCH :query {{snapshot}}
+        ORDER BY score, id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS hits
+    LEFT JOIN messages AS m ON m.id = hits.id
+    LEFT JOIN {_ARCHIVE_TABLE} AS a ON a.id = hits.id
+    WHERE m.id IS NOT NULL OR a.id IS NOT NULL
+    ORDER BY hits.score, hits.id DESC
+"""
+
+SEARCH_STATEMENT = text(_SEARCH_SQL.format(snapshot=""))
+SEARCH_SNAPSHOT_STATEMENT = text(_SEARCH_SQL.format(snapshot="AND rowid <= :snapshotId"))
+# 第一页的快照: 当前索引中的最大ID
+SNAPSHOT_STATEMENT = text(f"SELECT COALESCE(MAX(rowid), 0) FROM {models.SEARCH_TABLE}")
+INDEX_STATEMENT = text(f"INSERT OR REPLACE INTO {models.SEARCH_TABLE} (rowid, tokens) VALUES (:id, :tokens)")
+
+
+def tokenize(content: str) -> str:
+    """
+    把文本切分为写入索引的词
+
+    Args:
+        content (str): 留言内容
+
+    Returns:
+        str: 以空格分隔的词
+    """
+    tokens = []
+    for cjk, word in _TOKEN_PATTERN.findall(content or ""):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        tokens.append(cjk[-1])
+    return " ".join(tokens)
+
+
+def buildMatchQuery(keywords: str) -> Optional[str]:
+    """
+    把用户输入的关键词转换为 FTS5 查询表达式
+
+    所有词都加引号作为字面量,用户输入中的 FTS5 语法(AND/OR/NEAR/*)不会生效
+
+    Args:
+        keywords (str): 用户输入
+
+    Returns:
+        Optional[str]: 查询表达式,没有可搜索的词时返回None
+    """
+    terms = []
+    for cjk, word in _TOKEN_PATTERN.findall(keywords):
+        if word:
+            terms.append(f'"{word.lower()}"')
+        elif len(cjk) == 1:
+            terms.append(f'"{cjk}" *')
+        else:
+            terms.extend(f'"{cjk[i:i + 2]}"' for i in range(len(cjk) - 1))
+    return " AND ".join(terms) if terms else None
+
+
+def isSearchSupported(dialectName: str) -> bool:
+    """
+    当前数据库是否支持全文搜索(仅 SQLite)
+
+    Args:
+        dialectName (str): 数据库方言名称
+
+    Returns:
+        bool: 是否支持
+    """
+    return SEARCH_CONFIG["enabled"] and dialectName == "sqlite"
+
+
+def indexParams(message) -> dict:
+    """
+    生成写入索引的参数
+
+    Args:
+        message: 已分配ID的留言对象
+
+    Returns:
+        dict: INDEX_STATEMENT 的参数
+    """
+    return {"id": message.id, "tokens": tokenize(message.content)}
+
+
+def searchStatement(matchQuery: str, limit: int, snapshotId: Optional[int] = None, offset: int = 0):
+    """
+    构造搜索语句
+
+    Args:
+        matchQuery (str): buildMatchQuery 生成的查询表达式
+        limit (int): 返回的结果数
+        snapshotId (Optional[int]): 快照的最大留言ID,只搜索ID不大于该值的留言;None表示不限制
+        offset (int): 在快照的结果中跳过的条数
+
+    Returns:
+        Tuple[TextClause, dict]: 语句和参数,每行为公开字段加相关度分数
+    """
+    params = {"query": matchQuery, "limit": limit, "offset": offset}
+    if snapshotId is None:
+        return SEARCH_STATEMENT, params
+    params["snapshotId"] = snapshotId
+    return SEARCH_SNAPSHOT_STATEMENT, params
+
+
+def toResults(rows) -> List[Tuple[models.MessageRow, float]]:
+    """
+    把查询结果转换为 (留言行, 相关度分数) 列表
+
+    Args:
+        rows: searchStatement 的查询结果
+
+    Returns:
+        List[Tuple[MessageRow, float]]: 按相关度排序的结果
+    """
+    fieldCount = len(models.PUBLIC_FIELDS)
+    return [(models.MessageRow(*row[:fieldCount]), row[fieldCount]) for row in rows]
+
+
+# ==================== 索引维护 ====================
+
+def backfill(engine: Engine, rebuild: bool = False, batchSize: int = 1000) -> int:
+    """
+    为已有留言(包括归档的留言)建立全文索引
+
+    按ID顺序分批处理,每批一个事务,可以在服务运行时执行,中断后重新执行会从未建立索引的留言继续
+
+    Args:
+        engine (Engine): 数据库引擎
+        rebuild (bool): 是否先清空索引再全部重建
+        batchSize (int): 每批处理的留言数
+
+    Returns:
+        int: 建立索引的留言数
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql(models.CREATE_SEARCH_TABLE)
+        if rebuild:
+            conn.exec_driver_sql(f"DELETE FROM {models.SEARCH_TABLE}")
+
+    missing = text(f"""
+        SELECT id, content FROM (
+            SELECT id, content FROM messages WHERE id > :lastId
+            UNION ALL
+            SELECT id, content FROM {_ARCHIVE_TABLE} WHERE id > :lastId
+        )
+        WHERE id NOT IN (SELECT rowid FROM {models.SEARCH_TABLE} WHERE rowid > :lastId)
+        ORDER BY id LIMIT :limit
+    """)
+    lastId, total = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(missing, {"lastId": lastId, "limit": batchSize}).all()
+            if not rows:
+                break
+            conn.execute(INDEX_STATEMENT, [{"id": row.id, "tokens": tokenize(row.content)} for row in rows])
+        lastId = rows[-1].id
+        total += len(rows)
+        logInfo(logger, f"已建立索引 {total} 条,当前ID: {lastId}")
+    return total
+
+
+if __name__ == "__main__":
+    from database import engine, createTables
+    from migrations import runMigrations
+
+    if len(sys.argv) == 2 and sys.argv[1] in ("backfill", "rebuild"):
+        createTables()
+        runMigrations(engine)
+        count = backfill(engine, rebuild=sys.argv[1] == "rebuild")
+        print(f"建立索引 {count} 条")
+    elif len(sys.argv) == 3 and sys.argv[1] == "query":
+        matchQuery = buildMatchQuery(sys.argv[2])
+        with engine.connect() as conn:
+            statement, params = searchStatement(matchQuery, 20) if matchQuery else (None, None)
+            results = toResults(conn.execute(statement, params)) if statement is not None else []
+        for row, score in results:
+            print(f"{row.id:>8}  {score:8.3f}  {row.content[:60]}")
+        print(f"共 {len(results)} 条")
+    else:
+        print("用法:")
+        print("  python search.py backfill")
+        print("  python search.py rebuild")
+        print("  python search.py query <关键词>")
+        sys.exit(1)
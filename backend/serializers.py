@@ -0,0 +1,211 @@
+"""
+API响应序列化
+
+api_response 原先把数据交给 jsonable_encoder 逐个对象通用遍历,再由 JSONResponse 编码一次。
+这里直接读取留言对外公开的字段(models.PUBLIC_FIELDS,不含IP地址)组装字典,
+再用预先构建的编码器一次性编码出 {code, message, data} 响应体字节
+
+编码后端由 API_CONFIG["json_backend"] 选择:
+- orjson: 需要安装 orjson(可选依赖),速度最快
+- pydantic: 使用按 schemas.PublicMessage 预先编译的 TypeAdapter.dump_json,无额外依赖;
+  单条留言、留言列表、嵌入回复的帖子列表和按父留言分组的回复各有一个编译好的响应体结构,
+  其他数据(统计信息等)使用通用的 TypeAdapter(Any)
+- json: 原来的 jsonable_encoder + json.dumps,用于对照
+
+性能对比见 benchmarks/serialization.py
+"""
+
+import datetime
+import json
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from typing_extensions import NotRequired, TypedDict
+
+import models
+import schemas
+from config import API_CONFIG
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# 响应中留言的字段,与 schemas.PublicMessage 保持一致
+MESSAGE_FIELDS = models.PUBLIC_FIELDS
+_getMessageFields = attrgetter(*MESSAGE_FIELDS)
+
+# 按公开字段编码的留言类型: ORM实体和只读查询行
+_MESSAGE_TYPES = (models.Message, models.MessageRow)
+
+# 可以原样交给编码器的类型
+_PLAIN_TYPES = (str, int, float, bool, type(None), datetime.datetime)
+
+
+def messageToDict(message) -> dict:
+    """
+    按公开字段把留言对象转换为字典,不包含IP地址
+
+    Args:
+        message: 留言实体或只读查询行
+
+    Returns:
+        dict: 字段字典,时间字段保持 datetime 类型由编码器处理
+    """
+    return dict(zip(MESSAGE_FIELDS, _getMessageFields(message)))
+
+
+def toSerializable(data: Any) -> Any:
+    """
+    把响应数据中的留言对象转换为字典
+
+    支持留言对象、列表、字典的任意嵌套,其他对象交给 jsonable_encoder 处理
+
+    Args:
+        data: 响应数据
+
+    Returns:
+        Any: 只包含基本类型、datetime、列表和字典的数据
+    """
+    if isinstance(data, _MESSAGE_TYPES):
+        return messageToDict(data)
+    if isinstance(data, (list, tuple)):
+        return [toSerializable(item) for item in data]
+    if isinstance(data, dict):
+        return {key: toSerializable(value) for key, value in data.items()}
+    if isinstance(data, _PLAIN_TYPES):
+        return data
+    return jsonable_encoder(data)
+
+
+# messageToDict 生成的字典结构,字段类型取自 schemas.PublicMessage,顺序与 MESSAGE_FIELDS 相同
+_messageFieldTypes = {name: schemas.PublicMessage.model_fields[name].annotation for name in MESSAGE_FIELDS}
+MessageDict = TypedDict("MessageDict", _messageFieldTypes)
+ThreadDict = TypedDict("ThreadDict", {**_messageFieldTypes, "replies": List[MessageDict]})
+
+_MESSAGE_KEYS = tuple(MESSAGE_FIELDS)
+_THREAD_KEYS = _MESSAGE_KEYS + ("replies",)
+_ENVELOPE_KEYS = frozenset(("code", "message", "data", "next_cursor", "next_cursors"))
+
+
+def _envelopeAdapter(name: str, dataType) -> TypeAdapter:
+    return TypeAdapter(TypedDict(name, {
+        "code": int,
+        "message": str,
+        "data": dataType,
+        "next_cursor": NotRequired[Optional[str]],
+        "next_cursors": NotRequired[Dict[int, Optional[str]]],
+    }))
+
+
+_messageEnvelope = _envelopeAdapter("MessageEnvelope", MessageDict)
+_messageListEnvelope = _envelopeAdapter("MessageListEnvelope", List[MessageDict])
+_threadListEnvelope = _envelopeAdapter("ThreadListEnvelope", List[ThreadDict])
+_groupedEnvelope = _envelopeAdapter("GroupedRepliesEnvelope", Dict[int, List[MessageDict]])
+_anyAdapter = TypeAdapter(Any)
+
+
+def _keysOf(item) -> Optional[tuple]:
+    return tuple(item) if isinstance(item, dict) else None
+
+
+def envelopeAdapter(content: dict) -> Optional[TypeAdapter]:
+    """
+    按响应体的结构选择预先编译的编码器
+
+    列表只检查第一项,接口返回的列表总是同一种结构
+
+    Args:
+        content (dict): toSerializable 处理后的响应体
+
+    Returns:
+        Optional[TypeAdapter]: 对应的编码器,不是留言数据或含有其他顶层字段时为None
+    """
+    if not content.keys() <= _ENVELOPE_KEYS:
+        return None
+    data = content["data"]
+    if isinstance(data, list):
+        if not data or _keysOf(data[0]) == _MESSAGE_KEYS:
+            return _messageListEnvelope
+        if _keysOf(data[0]) == _THREAD_KEYS:
+            return _threadListEnvelope
+    elif isinstance(data, dict):
+        if _keysOf(data) == _MESSAGE_KEYS:
+            return _messageEnvelope
+        groups = list(data.values())
+        if data and all(isinstance(key, int) for key in data) and all(isinstance(group, list) for group in groups):
+            sample = next((group[0] for group in groups if group), None)
+            if sample is None or _keysOf(sample) == _MESSAGE_KEYS:
+                return _groupedEnvelope
+    return None
+
+
+def _dumpsOrjson(content: dict) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _dumpsPydantic(content: dict) -> bytes:
+    return (envelopeAdapter(content) or _anyAdapter).dump_json(content)
+
+
+def _dumpsJson(content: dict) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+_BACKENDS = {
+    "orjson": _dumpsOrjson,
+    "pydantic": _dumpsPydantic,
+    "json": _dumpsJson,
+}
+
+
+def getEncoder(backend: str = "auto") -> Callable[[dict], bytes]:
+    """
+    获取编码函数
+
+    Args:
+        backend (str): 编码后端,auto 表示已安装orjson时使用orjson,否则使用pydantic
+
+    Returns:
+        Callable[[dict], bytes]: 编码函数
+
+    Raises:
+        ValueError: 当后端名称未知,或指定了orjson但未安装时
+    """
+    if backend == "auto":
+        backend = "orjson" if orjson is not None else "pydantic"
+    if backend not in _BACKENDS:
+        raise ValueError(f"未知的JSON编码方式: {backend}")
+    if backend == "orjson" and orjson is None:
+        raise ValueError("JSON_BACKEND=orjson 需要先安装 orjson")
+    return _BACKENDS[backend]
+
+
+_dumps = getEncoder(API_CONFIG["json_backend"])
+
+
+def encodeResponse(data: Any = None, code: int = 0, message: str = "success", **extra) -> bytes:
+    """
+    把数据编码为统一格式的响应体
+
+    Args:
+        data: 响应数据,可以包含留言对象
+        code (int): 响应状态码
+        message (str): 响应消息
+        **extra: 附加到响应顶层的字段
+
+    Returns:
+        bytes: {code, message, data, ...} 的UTF-8 JSON
+    """
+    content = {"code": code, "message": message, "data": toSerializable(data)}
+    if extra:
+        content.update(toSerializable(extra))
+    return _dumps(content)
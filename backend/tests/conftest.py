@@ -3,13 +3,21 @@ pytest配置文件
 定义测试夹具(Fixtures)
 """
 
+import os
+
+# 功能测试会在短时间内连续发表大量留言、反复点赞,关闭写接口限流和投票去重
+# (两者分别在 test_rate_limiter.py 和 test_vote_dedup.py 中单独测试)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+os.environ.setdefault("VOTE_DEDUP_ENABLED", "False")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from main import app
+from main import app, getDb
 from database import Base, getDatabase
+from response_cache import responseCache
 
 # ==================== 测试数据库配置 ====================
 
@@ -60,8 +68,12 @@ def client(db):
         finally:
             pass
 
-    # 覆盖数据库依赖
+    # 覆盖数据库依赖(main.py 中的路由使用 getDb)
     app.dependency_overrides[getDatabase] = overrideGetDatabase
+    app.dependency_overrides[getDb] = overrideGetDatabase
+
+    # 每个测试使用新的数据库,清空上一个测试留下的响应缓存
+    responseCache.clear()
 
     # 创建测试客户端
     testClient = TestClient(app)
@@ -85,3 +97,23 @@ def clean_db(db):
     db.commit()
 
     yield db
+
+
+class FakeClock:
+    """可手动推进的时钟,设置 now 属性推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """
+    从0开始、只在测试中手动推进的时钟
+
+    传给限流器、投票去重和地理位置缓存的 clock 参数
+    """
+    return FakeClock()
@@ -133,6 +133,17 @@ class TestGetMessages:
         # 检查至少有一些数据
         assert len(data["data"]) >= 0
 
+    def test_ip_address_not_exposed(self, client: TestClient, clean_db):
+        """测试留言列表、回复和单条留言都不返回IP地址"""
+        parent_id = client.post("/messages/", json={"content": "父留言"}).json()["data"]["id"]
+        client.post("/messages/", json={"content": "回复", "parent_id": parent_id})
+
+        for url in ("/messages/", f"/messages/{parent_id}/replies", f"/messages/replies?parent_ids={parent_id}"):
+            assert b"ip_address" not in client.get(url).content
+        item = client.get(f"/messages/{parent_id}").json()["data"]
+        assert "ip_address" not in item
+        assert item["reply_count"] == 1
+
 
 class TestGetMessageById:
     """获取单条留言测试"""
@@ -232,3 +243,179 @@ class TestLikeDislikeMessage:
         data = response.json()
 
         assert data["data"]["like_count"] == 3
+
+
+class TestCursorPagination:
+    """游标分页测试"""
+
+    def test_messages_cursor_walks_all_pages(self, client: TestClient, clean_db):
+        """测试使用 next_cursor 逐页遍历留言列表"""
+        for i in range(7):
+            client.post("/messages/", json={"content": f"留言{i}"})
+
+        seen = []
+        cursor = None
+        while True:
+            url = "/messages/?limit=3" + (f"&before_id={cursor}" if cursor else "")
+            data = client.get(url).json()
+            seen.extend(item["id"] for item in data["data"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        assert len(seen) == 7
+        assert seen == sorted(seen, reverse=True)
+
+    def test_messages_after_cursor(self, client: TestClient, clean_db):
+        """测试 after_id 只返回更新的留言"""
+        ids = [client.post("/messages/", json={"content": f"留言{i}"}).json()["data"]["id"] for i in range(4)]
+
+        first = client.get("/messages/?limit=2").json()
+        assert [item["id"] for item in first["data"]] == [ids[3], ids[2]]
+
+        newer = client.get(f"/messages/?after_id={first['next_cursor']}").json()
+        assert [item["id"] for item in newer["data"]] == [ids[3]]
+
+    def test_replies_are_paginated(self, client: TestClient, clean_db):
+        """测试回复列表分页"""
+        parent_id = client.post("/messages/", json={"content": "父留言"}).json()["data"]["id"]
+        for i in range(5):
+            client.post("/messages/", json={"content": f"回复{i}", "parent_id": parent_id})
+
+        page = client.get(f"/messages/{parent_id}/replies?limit=3").json()
+        assert len(page["data"]) == 3
+        assert page["next_cursor"]
+
+        rest = client.get(f"/messages/{parent_id}/replies?limit=3&after_id={page['next_cursor']}").json()
+        assert len(rest["data"]) == 2
+        assert rest["next_cursor"] is None
+        assert rest["data"][0]["id"] > page["data"][-1]["id"]
+
+    def test_invalid_cursor(self, client: TestClient):
+        """测试无效游标返回400"""
+        response = client.get("/messages/?before_id=not-a-cursor")
+
+        assert response.status_code == 400
+
+
+class TestBatchReplies:
+    """批量获取回复测试"""
+
+    def test_replies_grouped_by_parent(self, client: TestClient, clean_db):
+        """测试按父留言分组返回,每组受 limit 限制"""
+        first = client.post("/messages/", json={"content": "帖子1"}).json()["data"]["id"]
+        second = client.post("/messages/", json={"content": "帖子2"}).json()["data"]["id"]
+        empty = client.post("/messages/", json={"content": "帖子3"}).json()["data"]["id"]
+        for i in range(3):
+            client.post("/messages/", json={"content": f"回复1-{i}", "parent_id": first})
+        client.post("/messages/", json={"content": "回复2-0", "parent_id": second})
+
+        data = client.get(f"/messages/replies?parent_ids={first},{second},{empty}&limit=2").json()
+
+        assert [item["content"] for item in data["data"][str(first)]] == ["回复1-0", "回复1-1"]
+        assert [item["content"] for item in data["data"][str(second)]] == ["回复2-0"]
+        assert data["data"][str(empty)] == []
+        assert data["next_cursors"][str(first)]
+        assert data["next_cursors"][str(second)] is None
+
+    def test_invalid_parent_ids(self, client: TestClient):
+        """测试无效的 parent_ids 返回400"""
+        assert client.get("/messages/replies?parent_ids=1,abc").status_code == 400
+        assert client.get("/messages/replies?parent_ids=").status_code == 400
+
+    def test_parent_ids_limited_to_max_page_size(self, client: TestClient, clean_db):
+        """测试 parent_ids 数量不能超过最大分页大小"""
+        from config import MESSAGE_CONFIG
+
+        max_ids = MESSAGE_CONFIG["max_page_size"]
+        ids = ",".join(str(i) for i in range(1, max_ids + 2))
+        assert client.get(f"/messages/replies?parent_ids={ids}").status_code == 400
+        ids = ",".join(str(i) for i in range(1, max_ids + 1))
+        assert client.get(f"/messages/replies?parent_ids={ids}").status_code == 200
+
+    def test_embed_replies_in_list(self, client: TestClient, clean_db):
+        """测试留言列表嵌入回复,新回复使缓存的列表失效"""
+        parent_id = client.post("/messages/", json={"content": "父留言"}).json()["data"]["id"]
+        client.post("/messages/", json={"content": "无回复"})
+        client.post("/messages/", json={"content": "回复0", "parent_id": parent_id})
+
+        data = client.get("/messages/?embed_replies=2").json()["data"]
+        embedded = {item["id"]: item["replies"] for item in data}
+        assert [item["content"] for item in embedded[parent_id]] == ["回复0"]
+        assert sum(len(replies) for replies in embedded.values()) == 1
+
+        client.post("/messages/", json={"content": "回复1", "parent_id": parent_id})
+        data = client.get("/messages/?embed_replies=2").json()["data"]
+        assert len({item["id"]: item["replies"] for item in data}[parent_id]) == 2
+        assert "replies" not in client.get("/messages/").json()["data"][0]
+
+
+class TestResponseCache:
+    """响应缓存测试"""
+
+    def test_first_page_served_from_cache(self, client: TestClient, clean_db):
+        """测试重复请求首页命中缓存,新留言使缓存失效"""
+        from response_cache import responseCache
+
+        client.post("/messages/", json={"content": "第一条"})
+        first = client.get("/messages/").json()
+        hits = responseCache.stats()["hits"]
+
+        assert client.get("/messages/").json() == first
+        assert responseCache.stats()["hits"] == hits + 1
+
+        client.post("/messages/", json={"content": "第二条"})
+        assert len(client.get("/messages/").json()["data"]) == 2
+
+    def test_like_invalidates_cached_page(self, client: TestClient, clean_db):
+        """测试点赞后缓存的列表和回复都能看到最新计数"""
+        parent_id = client.post("/messages/", json={"content": "父留言"}).json()["data"]["id"]
+        reply_id = client.post("/messages/", json={"content": "回复", "parent_id": parent_id}).json()["data"]["id"]
+        client.get("/messages/")
+        client.get(f"/messages/{parent_id}/replies")
+
+        client.post(f"/messages/{parent_id}/like")
+        client.post(f"/messages/{reply_id}/like")
+
+        assert client.get("/messages/").json()["data"][0]["like_count"] == 1
+        assert client.get(f"/messages/{parent_id}/replies").json()["data"][0]["like_count"] == 1
+
+
+class TestConditionalRequests:
+    """ETag条件请求测试"""
+
+    def test_unchanged_list_returns_304(self, client: TestClient, clean_db):
+        """测试未发生写操作时返回304,写操作后返回新内容"""
+        client.post("/messages/", json={"content": "第一条"})
+        response = client.get("/messages/")
+        etag = response.headers["ETag"]
+
+        unchanged = client.get("/messages/", headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+
+        client.post("/messages/", json={"content": "第二条"})
+        changed = client.get("/messages/", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    def test_message_and_replies_etag(self, client: TestClient, clean_db):
+        """测试单条留言和回复列表同样支持304"""
+        message_id = client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+
+        for url in (f"/messages/{message_id}", f"/messages/{message_id}/replies"):
+            etag = client.get(url).headers["ETag"]
+            assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        etag = client.get(f"/messages/{message_id}").headers["ETag"]
+        client.post(f"/messages/{message_id}/like")
+        assert client.get(f"/messages/{message_id}", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_wildcard_matches_existing_only(self, client: TestClient, clean_db):
+        """测试 If-None-Match: * 只匹配存在的留言"""
+        message_id = client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+
+        for url in (f"/messages/{message_id}", f"/messages/{message_id}/replies"):
+            assert client.get(url, headers={"If-None-Match": "*"}).status_code == 304
+        for url in ("/messages/99999", "/messages/99999/replies"):
+            assert client.get(url, headers={"If-None-Match": "*"}).status_code == 404
@@ -0,0 +1,139 @@
+"""
+冷数据归档测试
+"""
+
+import datetime
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+from archive import archiveThreads
+from backup import exportMessages
+from config import ERROR_MESSAGES
+from hot_ranking import HotRanking
+from tests.conftest import TestingSessionLocal, engine
+
+NOW = datetime.datetime(2025, 6, 1)
+
+
+def addThread(db, content: str, daysAgo: int, replyDaysAgo=()) -> int:
+    """写入一个帖子及其回复,返回帖子ID"""
+    parent = models.Message(content=content, timestamp=NOW - datetime.timedelta(days=daysAgo),
+                            reply_count=len(replyDaysAgo))
+    db.add(parent)
+    db.flush()
+    for i, days in enumerate(replyDaysAgo):
+        db.add(models.Message(content=f"{content}的回复{i}", parent_id=parent.id,
+                              timestamp=NOW - datetime.timedelta(days=days)))
+    db.commit()
+    return parent.id
+
+
+@pytest.fixture
+def threads(db):
+    """一个可归档的旧帖子、一个有新回复的旧帖子、一个新帖子"""
+    return {
+        "old": addThread(db, "归档的旧帖子", 400, (390, 300)),
+        "active": addThread(db, "还有人回复的旧帖子", 400, (10,)),
+        "new": addThread(db, "新帖子", 1),
+    }
+
+
+class TestArchive:
+    """归档测试"""
+
+    def test_moves_whole_old_threads(self, db, threads):
+        """测试只归档帖子和回复都足够旧的整帖,重复执行不会再次移动"""
+        assert archiveThreads(engine, afterDays=180, pauseMs=0, dryRun=True, now=NOW) == (1, 0)
+        assert archiveThreads(engine, afterDays=180, chunkThreads=1, pauseMs=0, now=NOW) == (1, 3)
+
+        hotIds = {row.id for row in db.query(models.Message.id)}
+        archived = db.query(models.ArchivedMessage).order_by(models.ArchivedMessage.id).all()
+        assert threads["old"] not in hotIds and {threads["active"], threads["new"]} <= hotIds
+        assert [item.id for item in archived if item.parent_id is None] == [threads["old"]]
+        assert all(item.archived_at == NOW for item in archived)
+
+        assert archiveThreads(engine, afterDays=180, pauseMs=0, now=NOW) == (0, 0)
+
+    def test_moves_nested_replies(self, db, threads):
+        """测试回复的回复随帖子一起归档,任何一层的新回复都使整帖保留"""
+        def addReply(parentId: int, daysAgo: int) -> int:
+            reply = models.Message(content="楼中楼", parent_id=parentId, timestamp=NOW - datetime.timedelta(days=daysAgo))
+            db.add(reply)
+            db.commit()
+            return reply.id
+
+        oldReply = db.query(models.Message.id).filter(models.Message.parent_id == threads["old"]).first().id
+        nested = addReply(addReply(oldReply, 380), 370)
+        activeThread = addThread(db, "楼中楼还有人回复的旧帖子", 400, (390,))
+        activeReply = db.query(models.Message.id).filter(models.Message.parent_id == activeThread).first().id
+        addReply(addReply(activeReply, 380), 5)
+        # 排在全部活跃的一批之后,仍要继续检查
+        laterThread = addThread(db, "更后面的旧帖子", 400, (390,))
+
+        assert archiveThreads(engine, afterDays=180, chunkThreads=1, pauseMs=0, now=NOW) == (2, 7)
+
+        remaining = {row.id for row in db.query(models.Message.id)}
+        archived = {row.id for row in db.query(models.ArchivedMessage.id)}
+        assert nested in archived and nested not in remaining
+        assert activeThread in remaining and activeThread not in archived
+        assert laterThread in archived
+        orphans = db.query(models.Message).filter(models.Message.parent_id.in_(archived)).count()
+        assert orphans == 0
+
+    def test_reads_fall_back_to_archive(self, client: TestClient, threads):
+        """测试列表只读取热数据,按ID读取留言、回复和搜索仍能找到归档的帖子"""
+        archiveThreads(engine, afterDays=180, pauseMs=0, now=NOW)
+        oldId = threads["old"]
+
+        listed = [item["id"] for item in client.get("/messages/").json()["data"]]
+        assert listed == [threads["new"], threads["active"]]
+
+        message = client.get(f"/messages/{oldId}").json()["data"]
+        assert (message["content"], message["reply_count"]) == ("归档的旧帖子", 2)
+        replies = client.get(f"/messages/{oldId}/replies?limit=1").json()
+        assert [item["content"] for item in replies["data"]] == ["归档的旧帖子的回复0"]
+        rest = client.get(f"/messages/{oldId}/replies?after_id={replies['next_cursor']}").json()["data"]
+        assert [item["content"] for item in rest] == ["归档的旧帖子的回复1"]
+
+        batch = client.get(f"/messages/replies?parent_ids={oldId},{threads['active']}").json()["data"]
+        assert (len(batch[str(oldId)]), len(batch[str(threads["active"])])) == (2, 1)
+
+    def test_archived_threads_are_read_only(self, client: TestClient, threads):
+        """测试不能回复归档的帖子,投票按留言不存在处理"""
+        archiveThreads(engine, afterDays=180, pauseMs=0, now=NOW)
+
+        response = client.post("/messages/", json={"content": "回复", "parent_id": threads["old"]})
+        assert response.status_code == 400
+        assert response.json()["detail"] == ERROR_MESSAGES["message_archived"]
+        assert client.post(f"/messages/{threads['old']}/like").status_code == 404
+
+    def test_search_finds_archived(self, client: TestClient, clean_db):
+        """测试归档后全文索引仍能搜到帖子和回复"""
+        parentId = client.post("/messages/", json={"content": "很久以前的树洞"}).json()["data"]["id"]
+        client.post("/messages/", json={"content": "树洞的回复", "parent_id": parentId})
+
+        archiveThreads(engine, afterDays=0, pauseMs=0, now=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+        contents = {item["content"] for item in client.get("/messages/search?q=树洞").json()["data"]}
+        assert contents == {"很久以前的树洞", "树洞的回复"}
+        assert client.get("/messages/").json()["data"] == []
+
+    def test_export_includes_archive(self, db, threads, tmp_path):
+        """测试导出按ID顺序合并热数据和归档的留言"""
+        archiveThreads(engine, afterDays=180, pauseMs=0, now=NOW)
+        path = tmp_path / "messages.ndjson"
+        assert exportMessages(str(path), TestingSessionLocal, batchSize=2) == 6
+        ids = [json.loads(line)["id"] for line in path.read_bytes().splitlines()]
+        assert ids == sorted(ids) and len(set(ids)) == 6
+
+
+def test_ranking_remove():
+    """测试归档的帖子从热门排行中移除"""
+    ranking = HotRanking(sessionFactory=None, capacity=3, rebuildIntervalSeconds=0)
+    ranking._built = True
+    for messageId in (1, 2, 3):
+        ranking.update(models.MessageRow(messageId, "", NOW, messageId, 0, 0, None, None))
+    ranking.remove([2, 99])
+    assert [messageId for messageId, _ in ranking.page(10)] == [3, 1]
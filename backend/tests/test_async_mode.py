@@ -0,0 +1,114 @@
+"""
+异步模式测试
+
+路由使用 AsyncSession 时应调用 crud_async,行为与同步模式一致
+"""
+
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import NullPool
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from archive import archiveThreads  # noqa: E402
+from main import ASYNC_CRUD, app, getDb  # noqa: E402
+from response_cache import responseCache  # noqa: E402
+from tests.conftest import SQLALCHEMY_TEST_DATABASE_URL, engine  # noqa: E402
+
+
+@pytest.fixture(scope="function")
+def async_client(clean_db):
+    """
+    使用异步会话的测试客户端
+
+    与 conftest 的 db 夹具使用同一个测试数据库文件
+    """
+    engine = create_async_engine(
+        SQLALCHEMY_TEST_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"),
+        poolclass=NullPool
+    )
+    AsyncTestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def overrideGetDb():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[getDb] = overrideGetDb
+    responseCache.clear()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+class TestAsyncRoutes:
+    """异步会话下的接口测试"""
+
+    def test_create_list_and_reply(self, async_client: TestClient):
+        """测试发帖、回复、列表和批量回复"""
+        parent = async_client.post("/messages/", json={"content": "父留言"}).json()["data"]
+        async_client.post("/messages/", json={"content": "回复", "parent_id": parent["id"]})
+
+        messages = async_client.get("/messages/?embed_replies=5").json()["data"]
+        assert [item["content"] for item in messages] == ["父留言"]
+        assert messages[0]["reply_count"] == 1
+        assert [item["content"] for item in messages[0]["replies"]] == ["回复"]
+
+        replies = async_client.get(f"/messages/{parent['id']}/replies").json()["data"]
+        assert len(replies) == 1
+        batch = async_client.get(f"/messages/replies?parent_ids={parent['id']}").json()["data"]
+        assert batch[str(parent["id"])] == replies
+
+    def test_search(self, async_client: TestClient):
+        """测试异步模式下写入的留言可以被搜索到"""
+        async_client.post("/messages/", json={"content": "异步模式的树洞"})
+        async_client.post("/messages/", json={"content": "无关内容"})
+
+        data = async_client.get("/messages/search?q=树洞").json()["data"]
+        assert [item["content"] for item in data] == ["异步模式的树洞"]
+
+    def test_archived_thread(self, async_client: TestClient):
+        """测试异步模式下按ID读取归档的帖子和回复,不能再回复"""
+        parent = async_client.post("/messages/", json={"content": "旧帖子"}).json()["data"]
+        async_client.post("/messages/", json={"content": "回复", "parent_id": parent["id"]})
+        archiveThreads(engine, afterDays=0, pauseMs=0, now=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+
+        assert async_client.get("/messages/").json()["data"] == []
+        assert async_client.get(f"/messages/{parent['id']}").json()["data"]["reply_count"] == 1
+        replies = async_client.get(f"/messages/{parent['id']}/replies").json()["data"]
+        assert [item["content"] for item in replies] == ["回复"]
+        reply = async_client.post("/messages/", json={"content": "回复", "parent_id": parent["id"]})
+        assert reply.status_code == 400
+
+    def test_like_and_dislike(self, async_client: TestClient):
+        """测试点赞、点踩原子更新计数"""
+        message_id = async_client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+
+        async_client.post(f"/messages/{message_id}/like")
+        liked = async_client.post(f"/messages/{message_id}/like").json()["data"]
+        disliked = async_client.post(f"/messages/{message_id}/dislike").json()["data"]
+
+        assert liked["like_count"] == 2
+        assert disliked["dislike_count"] == 1
+        assert async_client.get(f"/messages/{message_id}").json()["data"]["like_count"] == 2
+
+    def test_missing_message(self, async_client: TestClient):
+        """测试不存在的留言返回404"""
+        assert async_client.get("/messages/999999").status_code == 404
+        assert async_client.get("/messages/999999/replies").status_code == 404
+        assert async_client.post("/messages/999999/like").status_code == 404
+        reply = async_client.post("/messages/", json={"content": "回复", "parent_id": 999999})
+        assert reply.status_code == 400
+
+
+def test_async_crud_mapping():
+    """测试每个同步 crud 函数都映射到同名的异步实现"""
+    import inspect
+
+    for func, asyncFunc in ASYNC_CRUD.items():
+        assert asyncFunc.__name__ == func.__name__
+        assert inspect.iscoroutinefunction(asyncFunc)
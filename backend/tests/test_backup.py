@@ -0,0 +1,81 @@
+"""
+留言导出/导入测试
+"""
+
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+from backup import exportMessages, importMessages, importCheckpoints
+from database import Base
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def targetSession(tmp_path):
+    """导入目标: 独立的SQLite数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def seedMessages(db, count: int):
+    """写入 count 条顶层留言,每条带一条回复"""
+    for i in range(1, count + 1):
+        parent = models.Message(content=f"留言{i}", ip_address="1.2.3.4", location="北京", like_count=i,
+                                reply_count=1, timestamp=datetime.datetime(2024, 1, 1, 12, 0, i))
+        db.add(parent)
+        db.flush()
+        db.add(models.Message(content=f"回复{i}", parent_id=parent.id))
+    db.commit()
+
+
+class TestBackup:
+    """导出/导入测试"""
+
+    def test_roundtrip(self, db, targetSession, tmp_path):
+        """测试压缩导出后导入,ID、回复关系、时间、IP和全文索引都保留"""
+        seedMessages(db, 3)
+        path = str(tmp_path / "messages.ndjson.gz")
+
+        assert exportMessages(path, TestingSessionLocal, batchSize=2) == 6
+        assert importMessages(path, targetSession, batchSize=2, transactionRows=3) == 6
+
+        columns = "id, content, timestamp, like_count, parent_id, ip_address, location"
+        source = db.execute(text(f"SELECT {columns} FROM messages ORDER BY id")).all()
+        target = targetSession()
+        try:
+            assert target.execute(text(f"SELECT {columns} FROM messages ORDER BY id")).all() == source
+            hits = target.execute(text(f"SELECT rowid FROM {models.SEARCH_TABLE} WHERE tokens MATCH '回复'")).all()
+            assert len(hits) == 3
+        finally:
+            target.close()
+
+    def test_resume_from_checkpoint(self, db, targetSession, tmp_path):
+        """测试导入中断后从断点继续,已提交的留言不会重复导入"""
+        seedMessages(db, 3)
+        path = tmp_path / "messages.ndjson"
+        exportMessages(str(path), TestingSessionLocal)
+        lines = path.read_bytes().splitlines()
+
+        # 第5行损坏: 前两个事务(4条)已提交,第三个事务回滚
+        path.write_bytes(b"\n".join(lines[:4] + [b"{broken"] + lines[4:]) + b"\n")
+        with pytest.raises(ValueError):
+            importMessages(str(path), targetSession, batchSize=1, transactionRows=2)
+
+        path.write_bytes(b"\n".join(lines) + b"\n")
+        assert importMessages(str(path), targetSession, batchSize=1, transactionRows=2) == 2
+
+        target = targetSession()
+        try:
+            assert target.execute(text("SELECT COUNT(*) FROM messages")).scalar() == 6
+            checkpoint = target.execute(importCheckpoints.select()).one()
+            assert (checkpoint.last_id, checkpoint.imported) == (6, 6)
+        finally:
+            target.close()
+
+        assert importMessages(str(path), targetSession) == 0
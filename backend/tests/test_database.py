@@ -0,0 +1,58 @@
+"""
+数据库引擎配置测试
+"""
+
+import asyncio
+
+import pytest
+
+from database import createAsyncDatabaseEngine, createDatabaseEngine, getStorageSettings, toAsyncUrl
+
+
+class TestStorageProfile:
+    """SQLite存储配置测试"""
+
+    def test_pragmas_applied_on_connect(self, tmp_path):
+        """测试每个新连接都应用了存储配置"""
+        engine = createDatabaseEngine(
+            f"sqlite:///{tmp_path / 'profile.db'}",
+            pragmas={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 1234}
+        )
+
+        settings = getStorageSettings(engine)
+
+        assert settings["journal_mode"] == "wal"
+        assert settings["synchronous"] == 1
+        assert settings["busy_timeout"] == 1234
+        assert settings["pool"] == "QueuePool"
+
+    def test_memory_database_uses_default_pool(self):
+        """测试内存数据库不使用连接池大小配置"""
+        engine = createDatabaseEngine("sqlite://", pragmas={})
+
+        assert getStorageSettings(engine)["pool"] != "QueuePool"
+
+
+class TestAsyncEngine:
+    """异步引擎测试"""
+
+    def test_async_url(self):
+        """测试同步驱动URL转换为异步驱动URL"""
+        assert toAsyncUrl("sqlite:///./treehole.db") == "sqlite+aiosqlite:///./treehole.db"
+        assert toAsyncUrl("postgresql://u:p@db/treehole") == "postgresql+asyncpg://u:p@db/treehole"
+        assert toAsyncUrl("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+        with pytest.raises(ValueError):
+            toAsyncUrl("oracle://db")
+
+    def test_async_engine_applies_pragmas(self, tmp_path):
+        """测试异步引擎的新连接同样应用存储配置"""
+        pytest.importorskip("aiosqlite")
+        engine = createAsyncDatabaseEngine(f"sqlite:///{tmp_path / 'async.db'}", pragmas={"busy_timeout": 4321})
+
+        async def readBusyTimeout():
+            async with engine.connect() as conn:
+                value = (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar()
+            await engine.dispose()
+            return value
+
+        assert asyncio.run(readBusyTimeout()) == 4321
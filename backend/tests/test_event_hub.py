@@ -0,0 +1,82 @@
+"""
+实时推送测试
+"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from event_hub import EventHub
+
+
+async def neverDisconnected():
+    return False
+
+
+def runAsync(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class TestEventHub:
+    """事件分发测试"""
+
+    def test_publish_from_worker_thread(self):
+        """测试线程池中发布的事件推送给订阅者"""
+        async def scenario():
+            hub = EventHub(coalesceMs=10)
+            subscriber = hub.subscribe()
+            stream = hub.stream(subscriber, neverDisconnected)
+            assert await stream.__anext__() == b"retry: 3000\n\n"
+
+            message = SimpleNamespace(id=1, content="新留言", timestamp=None, like_count=0,
+                                      dislike_count=0, reply_count=0, parent_id=None, location=None)
+            thread = threading.Thread(target=hub.publishMessage, args=(message,))
+            thread.start()
+            thread.join()
+
+            chunk = await asyncio.wait_for(stream.__anext__(), timeout=1)
+            assert b"event: message" in chunk
+            assert "新留言".encode("utf-8") in chunk
+            assert b"ip_address" not in chunk
+            await stream.aclose()
+            assert hub.subscriberCount == 0
+
+        runAsync(scenario())
+
+    def test_counts_are_coalesced(self):
+        """测试合并窗口内同一留言只推送最新计数"""
+        async def scenario():
+            hub = EventHub(coalesceMs=20)
+            subscriber = hub.subscribe()
+            for likes in range(1, 6):
+                hub.publishCounts(SimpleNamespace(id=7, like_count=likes, dislike_count=0, reply_count=0))
+            await asyncio.sleep(0.1)
+
+            assert len(subscriber.buffer) == 1
+            assert b'"like_count":5' in subscriber.buffer[0]
+
+        runAsync(scenario())
+
+    def test_slow_subscriber_evicted(self):
+        """测试缓冲写满的订阅者被断开,其他订阅者不受影响"""
+        async def scenario():
+            hub = EventHub(bufferSize=2)
+            slow = hub.subscribe()
+            for i in range(3):
+                hub.publish("message", {"id": i})
+            await asyncio.sleep(0)
+
+            assert slow.closed
+            assert hub.subscriberCount == 0
+            assert hub.getStats()["evicted"] == 1
+
+        runAsync(scenario())
+
+    def test_subscriber_limit(self):
+        """测试超过最大订阅数时拒绝订阅"""
+        async def scenario():
+            hub = EventHub(maxSubscribers=1)
+            assert hub.subscribe() is not None
+            assert hub.subscribe() is None
+
+        runAsync(scenario())
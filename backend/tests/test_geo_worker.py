@@ -0,0 +1,48 @@
+"""
+地理位置后台补全测试
+"""
+
+import crud
+import models
+import schemas
+from geo_worker import GeoEnrichmentWorker
+from tests.conftest import TestingSessionLocal
+
+
+class TestGeoEnrichmentWorker:
+    """后台补全队列测试"""
+
+    def test_location_filled_in_background(self, clean_db):
+        """测试留言先无位置入库,随后由后台线程补全"""
+        message = crud.createMessage(clean_db, schemas.MessageCreate(content="测试留言"), ip_address="1.2.3.4")
+        assert message.location is None
+
+        worker = GeoEnrichmentWorker(sessionFactory=TestingSessionLocal, lookup=lambda ip: "北京市")
+        assert worker.submit(message.id, "1.2.3.4")
+        worker.join()
+
+        clean_db.expire_all()
+        assert clean_db.get(models.Message, message.id).location == "北京市"
+        stats = worker.getStats()
+        assert stats["resolved"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_lookup_failure_is_counted(self, clean_db):
+        """测试查询失败只计数,不影响后续任务"""
+        def failingLookup(ip):
+            raise RuntimeError("timeout")
+
+        worker = GeoEnrichmentWorker(sessionFactory=TestingSessionLocal, lookup=failingLookup)
+        worker.submit(1, "1.2.3.4")
+        worker.join()
+
+        assert worker.getStats()["failed"] == 1
+
+    def test_full_queue_drops_tasks(self):
+        """测试队列已满时丢弃任务而不是阻塞"""
+        worker = GeoEnrichmentWorker(lookup=lambda ip: None, queueSize=1)
+        worker._threads = ["stopped"]  # 不启动线程,让任务留在队列中
+
+        assert worker.submit(1, "1.2.3.4")
+        assert not worker.submit(2, "1.2.3.4")
+        assert worker.getStats()["dropped"] == 1
@@ -0,0 +1,138 @@
+"""
+热门排行测试
+"""
+
+import datetime
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from hot_ranking import HotRanking, hotRanking, hotScore
+from tests.conftest import TestingSessionLocal
+
+
+class FakeMessage:
+    """排行只需要的留言字段"""
+
+    def __init__(self, id, likes=0, dislikes=0, minutes=0, parent_id=None):
+        self.id = id
+        self.like_count = likes
+        self.dislike_count = dislikes
+        self.timestamp = datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=minutes)
+        self.parent_id = parent_id
+
+
+@pytest.fixture
+def ranking(db, monkeypatch):
+    """使用测试数据库、不启动后台线程的全局排行,测试结束后清空"""
+    monkeypatch.setattr(hotRanking, "sessionFactory", TestingSessionLocal)
+    monkeypatch.setattr(hotRanking, "rebuildIntervalSeconds", 0)
+    hotRanking.rebuild()
+    yield hotRanking
+    hotRanking.clear()
+
+
+class TestHotScore:
+    """热度分数测试"""
+
+    def test_votes_and_recency(self):
+        """测试净赞数多10倍抵消 gravity 秒的时间差"""
+        base = datetime.datetime(2025, 1, 1)
+        assert hotScore(10, 0, base) > hotScore(1, 0, base)
+        assert hotScore(0, 5, base) < hotScore(0, 0, base)
+        later = base + datetime.timedelta(seconds=45000)
+        assert hotScore(10, 0, base) == pytest.approx(hotScore(1, 0, later))
+
+
+class TestHotRanking:
+    """增量排行测试"""
+
+    def createRanking(self, capacity=3):
+        ranking = HotRanking(sessionFactory=None, capacity=capacity, rebuildIntervalSeconds=0)
+        ranking._built = True
+        return ranking
+
+    def test_incremental_updates(self):
+        """测试投票后名次变化,回复不进入排行"""
+        ranking = self.createRanking()
+        ranking.update(FakeMessage(1, minutes=0))
+        ranking.update(FakeMessage(2, minutes=1))
+        ranking.update(FakeMessage(3, minutes=2, parent_id=1))
+        assert [messageId for messageId, _ in ranking.page(10)] == [2, 1]
+
+        ranking.update(FakeMessage(1, likes=100, minutes=0))
+        assert [messageId for messageId, _ in ranking.page(10)] == [1, 2]
+
+    def test_bounded_capacity(self):
+        """测试排行只保留分数最高的留言"""
+        ranking = self.createRanking(capacity=2)
+        for messageId in range(1, 5):
+            ranking.update(FakeMessage(messageId, minutes=messageId))
+        ranking.update(FakeMessage(1, dislikes=10, minutes=1))
+
+        assert [messageId for messageId, _ in ranking.page(10)] == [4, 3]
+        assert ranking.getStats()["entries"] == 2
+
+    def test_cursor_pages(self):
+        """测试游标翻页"""
+        ranking = self.createRanking(capacity=10)
+        for messageId in range(1, 6):
+            ranking.update(FakeMessage(messageId, minutes=messageId))
+
+        first = ranking.page(2)
+        second = ranking.page(2, (first[-1][1], first[-1][0]))
+        assert [messageId for messageId, _ in first + second] == [5, 4, 3, 2]
+
+
+class TestHotEndpoint:
+    """热门接口测试"""
+
+    def test_votes_reorder_feed(self, client: TestClient, clean_db, ranking):
+        """测试点赞后热门排序立即变化,回复不出现在热门中"""
+        older = client.post("/messages/", json={"content": "较早的留言"}).json()["data"]["id"]
+        newer = client.post("/messages/", json={"content": "较新的留言"}).json()["data"]["id"]
+        client.post("/messages/", json={"content": "回复", "parent_id": older})
+
+        ids = [item["id"] for item in client.get("/messages/hot").json()["data"]]
+        assert ids == [newer, older]
+
+        for _ in range(20):
+            client.post(f"/messages/{older}/like")
+        data = client.get("/messages/hot").json()["data"]
+        assert [item["id"] for item in data] == [older, newer]
+        assert data[0]["like_count"] == 20
+        assert "ip_address" not in data[0]
+
+    def test_rebuild_reads_database(self, client: TestClient, clean_db, ranking):
+        """测试重建从数据库读取其他进程写入的票数"""
+        first = client.post("/messages/", json={"content": "第一条"}).json()["data"]["id"]
+        second = client.post("/messages/", json={"content": "第二条"}).json()["data"]["id"]
+        clean_db.execute(text("UPDATE messages SET like_count = 1000 WHERE id = :id"), {"id": first})
+        clean_db.commit()
+
+        ranking.rebuild()
+        page = client.get("/messages/hot?limit=1").json()
+        assert [item["id"] for item in page["data"]] == [first]
+
+        page = client.get("/messages/hot", params={"limit": 1, "cursor": page["next_cursor"]}).json()
+        assert [item["id"] for item in page["data"]] == [second]
+
+    def test_background_thread_builds_on_start(self, db):
+        """测试后台线程启动后立即建立排行,停止后可以再次启动"""
+        ranking = HotRanking(sessionFactory=TestingSessionLocal, capacity=3, rebuildIntervalSeconds=3600)
+        ranking.start()
+        try:
+            for _ in range(100):
+                if ranking.built:
+                    break
+                time.sleep(0.01)
+            assert ranking.built
+        finally:
+            ranking.stop()
+        assert ranking._thread is None
+
+        ranking.start()
+        ranking.stop()
+        assert ranking.getStats()["rebuilds"] >= 1
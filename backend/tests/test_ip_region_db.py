@@ -0,0 +1,64 @@
+"""
+本地IP区段数据库测试
+"""
+
+import pytest
+
+from ip_region_db import IpRegionDatabase, buildFromCsv
+
+
+@pytest.fixture
+def regionDb(tmp_path):
+    """由一个小型CSV区段表生成数据库"""
+    csvPath = tmp_path / "ranges.csv"
+    csvPath.write_text(
+        "start_ip,end_ip,country,region,city\n"
+        "1.0.1.0,1.0.3.255,中国,福建省,福州市\n"
+        "8.8.8.0,8.8.8.255,美国,加利福尼亚,山景城\n"
+        "36.110.0.0,36.110.255.255,中国,北京市,北京市\n"
+        "2400:da00::,2400:da00:ffff:ffff:ffff:ffff:ffff:ffff,中国,上海市,\n",
+        encoding="utf-8"
+    )
+    outputPath = tmp_path / "ip_region.db"
+    assert buildFromCsv(str(csvPath), str(outputPath)) == (3, 1)
+
+    database = IpRegionDatabase(str(outputPath))
+    yield database
+    database.close()
+
+
+class TestIpRegionDatabase:
+    """区段查询测试"""
+
+    def test_lookup_ipv4(self, regionDb):
+        """测试IPv4查询,位置格式与远程API一致"""
+        assert regionDb.lookup("1.0.2.3") == "福建省 福州市"
+        assert regionDb.lookup("36.110.1.1") == "北京市"
+        assert regionDb.lookup("8.8.8.8") == "美国 加利福尼亚 山景城"
+
+    def test_lookup_boundaries_and_misses(self, regionDb):
+        """测试区段边界和未收录的地址"""
+        assert regionDb.lookup("1.0.1.0") == "福建省 福州市"
+        assert regionDb.lookup("1.0.3.255") == "福建省 福州市"
+        assert regionDb.lookup("1.0.4.0") is None
+        assert regionDb.lookup("0.0.0.1") is None
+        assert regionDb.lookup("255.255.255.255") is None
+
+    def test_lookup_ipv6(self, regionDb):
+        """测试IPv6和IPv4映射地址查询"""
+        assert regionDb.lookup("2400:da00::1") == "上海市"
+        assert regionDb.lookup("2400:db00::1") is None
+        assert regionDb.lookup("::ffff:8.8.8.8") == "美国 加利福尼亚 山景城"
+
+    def test_invalid_ip(self, regionDb):
+        """测试无效IP抛出ValueError"""
+        with pytest.raises(ValueError):
+            regionDb.lookup("未知")
+
+    def test_overlapping_ranges_rejected(self, tmp_path):
+        """测试重叠区段无法生成数据库"""
+        csvPath = tmp_path / "bad.csv"
+        csvPath.write_text("1.0.0.0,1.0.0.255,中国,福建省,\n1.0.0.128,1.0.1.0,中国,广东省,\n", encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            buildFromCsv(str(csvPath), str(tmp_path / "bad.db"))
@@ -0,0 +1,133 @@
+"""
+IP地理位置工具测试
+"""
+
+import logging
+import os
+
+import ip_utils
+from ip_utils import LocationCache, location_cache_key
+
+
+class TestLocationCache:
+    """地理位置缓存测试"""
+
+    def test_ttl_and_negative_ttl(self, clock):
+        """测试有结果和无结果使用不同的过期时间"""
+        cache = LocationCache(10, ttl=100, negative_ttl=10, clock=clock)
+        cache.set("a", "北京市")
+        cache.set("b", None)
+
+        clock.now = 50
+        assert cache.get("a") == (True, "北京市")
+        assert cache.get("b") == (False, None)
+
+        clock.now = 150
+        assert cache.get("a") == (False, None)
+        assert cache.stats()["expirations"] == 2
+
+    def test_lru_eviction(self, clock):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = LocationCache(2, ttl=100, negative_ttl=10, clock=clock)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        cache.get("a")
+        cache.set("c", "C")
+
+        assert cache.get("b") == (False, None)
+        assert cache.get("a") == (True, "A")
+        assert cache.stats()["evictions"] == 1
+
+    def test_cache_key_grouping(self):
+        """测试只有公网IPv4按/24分组"""
+        assert location_cache_key("8.8.8.8") == location_cache_key("8.8.8.200")
+        assert location_cache_key("8.8.8.8") != location_cache_key("8.8.9.8")
+        assert location_cache_key("192.168.1.2") == "192.168.1.2"
+        assert location_cache_key("2400:da00::1") == "2400:da00::1"
+
+    def test_get_ip_location_uses_cache(self, monkeypatch):
+        """测试同一网段和失败结果都不会重复查询"""
+        calls = []
+
+        def fakeResolve(ip):
+            calls.append(ip)
+            return None if ip.startswith("9.") else "美国"
+
+        monkeypatch.setattr(ip_utils, "resolve_location", fakeResolve)
+        monkeypatch.setattr(ip_utils, "location_cache", LocationCache(100, ttl=100, negative_ttl=10))
+
+        assert ip_utils.get_ip_location("8.8.8.8") == "美国"
+        assert ip_utils.get_ip_location("8.8.8.9") == "美国"
+        assert ip_utils.get_ip_location("9.9.9.9") is None
+        assert ip_utils.get_ip_location("9.9.9.9") is None
+        assert calls == ["8.8.8.8", "9.9.9.9"]
+
+    def test_remote_lookup_observed_once(self, monkeypatch):
+        """测试解析响应失败时查询只被记录一次,并计为失败"""
+        from metrics import geoDuration, geoErrors
+
+        class BrokenResponse:
+            status_code = 200
+
+            def json(self):
+                raise ValueError("不是JSON")
+
+        monkeypatch.setattr(ip_utils.requests, "get", lambda *args, **kwargs: BrokenResponse())
+        observed = sum(geoDuration.merged().get(("remote",), [0, 0.0])[:-1])
+        errors = geoErrors.merged().get(("remote",), [0])[0]
+
+        assert ip_utils.query_remote_location("8.8.8.8") is None
+        assert sum(geoDuration.merged()[("remote",)][:-1]) == observed + 1
+        assert geoErrors.merged()[("remote",)][0] == errors + 1
+
+
+class TestClientIp:
+    """客户端IP识别测试"""
+
+    def createRequest(self, headers: dict, client=("127.0.0.1", 50000)):
+        from starlette.requests import Request
+
+        rawHeaders = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        return Request({"type": "http", "headers": rawHeaders, "client": client})
+
+    def test_headers_ignored_without_trusted_proxy(self):
+        """测试没有可信代理时忽略代理请求头"""
+        request = self.createRequest({"X-Forwarded-For": "1.1.1.1", "X-Real-IP": "2.2.2.2"})
+        assert ip_utils.get_client_ip(request, trusted_proxy_count=0) == "127.0.0.1"
+
+    def test_rightmost_untrusted_hop(self):
+        """测试取从右数第 trusted_proxy_count 个地址,客户端伪造的前缀被忽略"""
+        request = self.createRequest({"X-Forwarded-For": "6.6.6.6, 1.1.1.1, 10.0.0.2"})
+        assert ip_utils.get_client_ip(request, trusted_proxy_count=1) == "10.0.0.2"
+        assert ip_utils.get_client_ip(request, trusted_proxy_count=2) == "1.1.1.1"
+        assert ip_utils.get_client_ip(request, trusted_proxy_count=5) == "6.6.6.6"
+
+    def test_real_ip_and_client_fallback(self):
+        """测试没有 X-Forwarded-For 时依次使用 X-Real-IP 和连接地址"""
+        assert ip_utils.get_client_ip(self.createRequest({"X-Real-IP": "2.2.2.2"}), trusted_proxy_count=1) == "2.2.2.2"
+        assert ip_utils.get_client_ip(self.createRequest({}), trusted_proxy_count=1) == "127.0.0.1"
+        assert ip_utils.get_client_ip(self.createRequest({}, client=None), trusted_proxy_count=1) == "未知"
+
+    def test_nginx_topology(self):
+        """测试部署配置下经 nginx 代理的请求识别为客户端IP,而不是 nginx 的回环地址"""
+        deployDir = os.path.join(os.path.dirname(__file__), "..", "..", "deploy")
+        # src/nginx.conf: X-Real-IP $remote_addr; X-Forwarded-For $proxy_add_x_forwarded_for
+        request = self.createRequest({"X-Forwarded-For": "6.6.6.6, 203.0.113.7", "X-Real-IP": "203.0.113.7"})
+        for name in ("production.env", "production.env.example"):
+            with open(os.path.join(deployDir, name), encoding="utf-8") as envFile:
+                settings = dict(line.strip().split("=", 1) for line in envFile if "=" in line and not line.startswith("#"))
+            trusted_proxy_count = int(settings["TRUSTED_PROXY_COUNT"])
+            assert ip_utils.get_client_ip(request, trusted_proxy_count=trusted_proxy_count) == "203.0.113.7"
+
+    def test_warns_once_when_proxy_headers_ignored(self, monkeypatch, caplog):
+        """测试没有可信代理却收到代理请求头时只警告一次"""
+        monkeypatch.setattr(ip_utils, "_proxy_headers_warned", False)
+        request = self.createRequest({"X-Forwarded-For": "203.0.113.7"})
+
+        with caplog.at_level(logging.WARNING, logger=ip_utils.logger.name):
+            ip_utils.get_client_ip(self.createRequest({}), trusted_proxy_count=0)
+            assert not caplog.records
+            ip_utils.get_client_ip(request, trusted_proxy_count=0)
+            ip_utils.get_client_ip(request, trusted_proxy_count=0)
+
+        assert len([record for record in caplog.records if "TRUSTED_PROXY_COUNT" in record.getMessage()]) == 1
@@ -0,0 +1,56 @@
+"""
+日志系统测试
+"""
+
+import logging
+import queue
+
+from config import parseLogLevels
+from logger import DroppingQueueHandler, SamplingFilter, logInfo
+
+
+def makeRecord(lineno: int, sample: bool = True, level: int = logging.INFO) -> logging.LogRecord:
+    record = logging.LogRecord("crud", level, "crud.py", lineno, "成功获取 20 条留言", None, None)
+    record.sample = sample
+    return record
+
+
+class TestSamplingFilter:
+    """高频日志采样测试"""
+
+    def test_keeps_one_in_n_per_statement(self):
+        """测试同一条日志语句每N次只放行1次,不同语句分别计数"""
+        sampling = SamplingFilter(every=10)
+
+        kept = [sampling.filter(makeRecord(lineno=1)) for _ in range(25)]
+        assert kept.count(True) == 3
+        assert sampling.filter(makeRecord(lineno=2)) is True
+
+    def test_unmarked_and_warning_records_always_kept(self):
+        """测试未标记采样的日志和警告以上级别不受影响"""
+        sampling = SamplingFilter(every=10)
+
+        assert all(sampling.filter(makeRecord(lineno=1, sample=False)) for _ in range(5))
+        assert all(sampling.filter(makeRecord(lineno=1, level=logging.WARNING)) for _ in range(5))
+
+
+class TestQueueHandler:
+    """队列日志处理器测试"""
+
+    def test_drops_when_queue_full(self):
+        """测试队列满时丢弃日志而不是阻塞"""
+        handler = DroppingQueueHandler(queue.Queue(2))
+        testLogger = logging.getLogger("test_logger.drop")
+        testLogger.propagate = False
+        testLogger.addHandler(handler)
+        testLogger.setLevel(logging.INFO)
+
+        for i in range(5):
+            logInfo(testLogger, f"消息{i}")
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+
+    def test_parse_log_levels(self):
+        """测试解析按日志记录器设置的级别"""
+        assert parseLogLevels("crud=warning, ip_utils=DEBUG,,bad") == {"crud": "WARNING", "ip_utils": "DEBUG"}
@@ -0,0 +1,84 @@
+"""
+监控指标测试
+"""
+
+import threading
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from metrics import Counter, Histogram, instrumentEngine, dbStatements, statementKind
+
+
+class TestShardedMetrics:
+    """按线程分片累加的指标测试"""
+
+    def test_counter_merges_thread_shards(self):
+        """测试多个线程的计数在导出时合并"""
+        counter = Counter("test_total", "测试", ("kind",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.merged()[("a",)] == [4000]
+        assert 'test_total{kind="a"} 4000' in counter.render()
+
+    def test_histogram_buckets_are_cumulative(self):
+        """测试直方图分桶按Prometheus格式累计"""
+        histogram = Histogram("test_seconds", "测试", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5.0):
+            histogram.observe(value, "/x")
+
+        lines = histogram.render()
+        assert 'test_seconds_bucket{route="/x",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{route="/x",le="1.0"} 3' in lines
+        assert 'test_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+        assert 'test_seconds_count{route="/x"} 4' in lines
+
+    def test_sql_statements_counted(self):
+        """测试SQL执行事件按语句类型计数"""
+        engine = create_engine("sqlite://")
+        instrumentEngine(engine)
+        before = dbStatements.merged().get(("SELECT",), [0])[0]
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("  select 2"))
+
+        assert dbStatements.merged()[("SELECT",)][0] == before + 2
+        assert statementKind("\n insert into t values (1)") == "INSERT"
+
+
+class TestMetricsEndpoint:
+    """/metrics 接口测试"""
+
+    def test_route_template_labels(self, client: TestClient, clean_db):
+        """测试请求按路由模板统计,并导出线程池占用"""
+        message_id = client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+        client.get(f"/messages/{message_id}")
+        client.get("/no-such-path")
+
+        response = client.get("/metrics")
+        body = response.text
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'treehole_http_requests_total{route="/messages/{messageId}",method="GET",status="200"}' in body
+        assert 'route="unmatched"' in body
+        assert "treehole_threadpool_max_threads" in body
+
+    def test_accumulated_totals_are_counters(self, client: TestClient):
+        """测试由其他模块累加的 _total 值按counter导出"""
+        body = client.get("/metrics").text
+
+        assert "# TYPE treehole_geo_dropped_total counter" in body
+        assert "# TYPE treehole_rate_limited_total counter" in body
+        assert "# TYPE treehole_log_dropped_total counter" in body
+        assert "# TYPE treehole_geo_queue_depth gauge" in body
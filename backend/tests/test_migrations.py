@@ -0,0 +1,56 @@
+"""
+数据库迁移测试
+
+验证迁移可以在旧结构的数据库上执行,并且可以重复执行
+"""
+
+from sqlalchemy import create_engine, inspect
+
+from migrations import MIGRATIONS, runMigrations
+from database import Base
+
+
+def createLegacyEngine(tmp_path):
+    """创建一个只有最初版本 messages 表的数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("""
+            CREATE TABLE messages (
+                id INTEGER NOT NULL PRIMARY KEY,
+                content VARCHAR(140) NOT NULL,
+                timestamp DATETIME,
+                like_count INTEGER,
+                dislike_count INTEGER,
+                reply_count INTEGER,
+                parent_id INTEGER REFERENCES messages (id)
+            )
+        """)
+        conn.exec_driver_sql("INSERT INTO messages (id, content) VALUES (1, '旧留言')")
+    return engine
+
+
+class TestMigrations:
+    """迁移执行测试"""
+
+    def test_upgrade_legacy_database(self, tmp_path):
+        """测试旧数据库升级后包含新列和索引,且数据保留"""
+        engine = createLegacyEngine(tmp_path)
+
+        executed = runMigrations(engine)
+
+        assert executed == [m.version for m in MIGRATIONS]
+        inspector = inspect(engine)
+        columns = {col["name"] for col in inspector.get_columns("messages")}
+        assert {"ip_address", "location"} <= columns
+        indexes = {index["name"] for index in inspector.get_indexes("messages")}
+        assert {"ix_messages_parent_id_id", "ix_messages_timestamp"} <= indexes
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT content FROM messages").scalar() == "旧留言"
+
+    def test_migrations_are_idempotent(self, tmp_path):
+        """测试新建数据库执行迁移不报错,重复执行无操作"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        Base.metadata.create_all(bind=engine)
+
+        assert len(runMigrations(engine)) == len(MIGRATIONS)
+        assert runMigrations(engine) == []
@@ -0,0 +1,107 @@
+"""
+性能分析和慢查询日志测试
+"""
+
+import logging
+import pstats
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import profiling
+from response_cache import responseCache
+from profiling import describeParameters, instrumentSlowQueries
+
+
+class TestRequestProfiling:
+    """X-Profile 单请求分析测试"""
+
+    def test_requires_admin_token(self, client: TestClient, clean_db, monkeypatch):
+        """测试没有正确令牌时忽略 X-Profile 头"""
+        monkeypatch.setitem(profiling.PROFILING_CONFIG, "admin_token", "secret")
+
+        response = client.get("/messages/", headers={"X-Profile": "text", "X-Admin-Token": "wrong"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/json")
+        assert "x-profile-file" not in response.headers
+
+    def test_disabled_without_configured_token(self, client: TestClient, clean_db, monkeypatch):
+        """测试未配置 ADMIN_TOKEN 时不能开启分析"""
+        monkeypatch.setitem(profiling.PROFILING_CONFIG, "admin_token", "")
+
+        response = client.get("/messages/", headers={"X-Profile": "text", "X-Admin-Token": ""})
+
+        assert response.headers["content-type"].startswith("application/json")
+
+    def test_text_report(self, client: TestClient, clean_db, monkeypatch):
+        """测试文本报告替代原响应,报告包含数据库操作"""
+        monkeypatch.setitem(profiling.PROFILING_CONFIG, "admin_token", "secret")
+        # 列表首页可能由响应缓存直接返回,清空后确保请求会查询数据库
+        responseCache.clear()
+
+        response = client.get("/messages/", headers={"X-Profile": "text", "X-Admin-Token": "secret"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "cumulative" in response.text
+        assert "getMessages" in response.text
+
+    def test_profile_saved_to_file(self, client: TestClient, clean_db, monkeypatch, tmp_path):
+        """测试分析结果保存为文件,原响应不变,分析结果包含数据库操作"""
+        monkeypatch.setitem(profiling.PROFILING_CONFIG, "admin_token", "secret")
+        monkeypatch.setitem(profiling.PROFILING_CONFIG, "profile_dir", str(tmp_path))
+
+        response = client.post(
+            "/messages/", json={"content": "留言"}, headers={"X-Profile": "1", "X-Admin-Token": "secret"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["data"]["content"] == "留言"
+        fileName = response.headers["x-profile-file"]
+        assert fileName.endswith("_POST_messages.prof")
+        stats = pstats.Stats(str(tmp_path / fileName))
+        assert any(name == "createMessage" for _, _, name in stats.stats)
+
+
+class TestSlowQueryLog:
+    """慢查询日志测试"""
+
+    def test_parameter_shape_hides_values(self):
+        """测试参数只记录名称和类型"""
+        assert describeParameters({"content": "秘密", "parent_id": None}) == "{content: str, parent_id: NoneType}"
+        assert describeParameters([(1, 2), (3, 4)]) == "2 x (int, int)"
+        assert describeParameters(()) == "()"
+
+    def test_slow_query_logged_with_caller(self, caplog, monkeypatch):
+        """测试超过阈值的语句记录SQL、参数结构和调用方"""
+        engine = create_engine("sqlite://")
+        instrumentSlowQueries(engine, thresholdMs=1)
+        monkeypatch.setattr(profiling.logger, "propagate", True)
+        token = profiling.currentCrudCall.set("crud_async.getMessages")
+
+        try:
+            with caplog.at_level(logging.WARNING, logger=profiling.logger.name):
+                with engine.connect() as conn:
+                    conn.execute(
+                        text(
+                            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 50000) "
+                            "SELECT count(*), :value FROM n"
+                        ),
+                        {"value": "秘密"},
+                    )
+        finally:
+            profiling.currentCrudCall.reset(token)
+
+        record = next(r for r in caplog.records if "慢查询" in r.getMessage())
+        assert "调用方: crud_async.getMessages" in record.getMessage()
+        assert "参数: (str)" in record.getMessage()
+        assert "秘密" not in record.getMessage()
+
+    def test_zero_threshold_disables(self):
+        """测试阈值为0时不注册事件"""
+        engine = create_engine("sqlite://")
+        instrumentSlowQueries(engine, thresholdMs=0)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert "slow_query_start" not in conn.info
@@ -0,0 +1,119 @@
+"""
+写接口限流测试
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import PROXY_CONFIG
+from rate_limiter import RateLimitMiddleware, TokenBucketLimiter, routeClass
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_burst_then_refill(self, clock):
+        """测试突发用尽后按速率恢复"""
+        limiter = TokenBucketLimiter(ratePerMinute=60, burst=3, maxKeys=10, clock=clock)
+
+        assert [limiter.acquire("1.1.1.1")[0] for _ in range(3)] == [True, True, True]
+        allowed, retryAfter = limiter.acquire("1.1.1.1")
+        assert not allowed
+        assert retryAfter == 1.0
+
+        clock.now = 1.0
+        assert limiter.acquire("1.1.1.1")[0]
+        assert limiter.acquire("2.2.2.2")[0]
+
+    def test_idle_buckets_expire(self, clock):
+        """测试令牌已回满的空闲桶被清理"""
+        limiter = TokenBucketLimiter(ratePerMinute=60, burst=2, maxKeys=10, clock=clock)
+        limiter.acquire("1.1.1.1")
+        clock.now = 1.0
+        limiter.acquire("2.2.2.2")
+
+        clock.now = 2.5
+        limiter.acquire("3.3.3.3")
+
+        assert limiter.stats()["buckets"] == 2
+
+    def test_bounded_keys(self, clock):
+        """测试超过上限时淘汰最久未访问的桶"""
+        limiter = TokenBucketLimiter(ratePerMinute=1, burst=1, maxKeys=2, clock=clock)
+        for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+            limiter.acquire(ip)
+
+        assert limiter.stats()["buckets"] == 2
+        # 1.1.1.1 已被淘汰,重新获得完整的桶
+        assert limiter.acquire("1.1.1.1")[0]
+        assert not limiter.acquire("3.3.3.3")[0]
+
+    def test_route_classes(self):
+        """测试只有写接口受限"""
+        assert routeClass("POST", "/messages/") == "message"
+        assert routeClass("POST", "/messages/5/like") == "vote"
+        assert routeClass("POST", "/messages/5/dislike") == "vote"
+        assert routeClass("GET", "/messages/") is None
+        assert routeClass("GET", "/messages/5/replies") is None
+
+
+class TestRateLimitMiddleware:
+    """限流中间件测试"""
+
+    @pytest.fixture(autouse=True)
+    def behindProxy(self, monkeypatch):
+        """模拟服务部署在一层反向代理之后"""
+        monkeypatch.setitem(PROXY_CONFIG, "trusted_proxy_count", 1)
+
+    def createClient(self):
+        calls = []
+        app = FastAPI()
+
+        @app.post("/messages/{messageId}/like")
+        def like(messageId: int):
+            calls.append(messageId)
+            return {"ok": True}
+
+        @app.get("/messages/")
+        def read():
+            return {"ok": True}
+
+        limiters = {"vote": TokenBucketLimiter(ratePerMinute=6, burst=2, maxKeys=100)}
+        app.add_middleware(RateLimitMiddleware, limiters=limiters)
+        return TestClient(app), calls
+
+    def test_returns_429_before_route(self):
+        """测试超过限制时返回429,路由不会被调用"""
+        client, calls = self.createClient()
+        headers = {"X-Forwarded-For": "8.8.8.8"}
+
+        statuses = [client.post("/messages/1/like", headers=headers).status_code for _ in range(3)]
+
+        assert statuses == [200, 200, 429]
+        assert len(calls) == 2
+        response = client.post("/messages/1/like", headers=headers)
+        assert response.headers["retry-after"] == "10"
+        assert response.json()["detail"]
+
+    def test_limits_per_client_ip(self):
+        """测试不同IP分别计数,读接口不受限"""
+        client, calls = self.createClient()
+        for _ in range(2):
+            client.post("/messages/1/like", headers={"X-Forwarded-For": "8.8.8.8"})
+
+        assert client.post("/messages/1/like", headers={"X-Forwarded-For": "9.9.9.9"}).status_code == 200
+        assert all(client.get("/messages/", headers={"X-Forwarded-For": "8.8.8.8"}).status_code == 200
+                   for _ in range(5))
+
+    def test_spoofed_forwarded_for_shares_bucket(self):
+        """测试客户端伪造的 X-Forwarded-For 前缀不会得到新的令牌桶"""
+        client, calls = self.createClient()
+
+        statuses = [
+            client.post("/messages/1/like", headers={"X-Forwarded-For": f"10.0.0.{i}, 8.8.8.8"}).status_code
+            for i in range(3)
+        ]
+
+        assert statuses == [200, 200, 429]
+        assert len(calls) == 2
@@ -0,0 +1,53 @@
+"""
+回复数校对测试
+"""
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import models
+from reconcile import reconcileReplyCounts
+from tests.conftest import engine
+
+
+class TestReplyCreation:
+    """发表回复测试"""
+
+    def test_reply_to_missing_parent(self, client: TestClient, db):
+        """测试回复不存在的留言返回400,且不写入回复"""
+        response = client.post("/messages/", json={"content": "回复", "parent_id": 99999})
+        assert response.status_code == 400
+        assert db.query(models.Message).count() == 0
+
+    def test_reply_count_incremented(self, client: TestClient, db):
+        """测试发表回复后父留言回复数加一,回复本身的计数字段完整"""
+        parentId = client.post("/messages/", json={"content": "父留言"}).json()["data"]["id"]
+        for i in range(3):
+            reply = client.post("/messages/", json={"content": f"回复{i}", "parent_id": parentId}).json()["data"]
+            assert reply["parent_id"] == parentId
+            assert reply["reply_count"] == 0
+        assert client.get(f"/messages/{parentId}").json()["data"]["reply_count"] == 3
+
+
+class TestReconcile:
+    """回复数校对测试"""
+
+    def test_reconcile_fixes_drift(self, client: TestClient, db):
+        """测试按实际回复数修正不一致的计数,只报告时不修改"""
+        first = client.post("/messages/", json={"content": "父留言1"}).json()["data"]["id"]
+        second = client.post("/messages/", json={"content": "父留言2"}).json()["data"]["id"]
+        for i in range(2):
+            client.post("/messages/", json={"content": f"回复{i}", "parent_id": first})
+        db.execute(text("UPDATE messages SET reply_count = 5 WHERE id = :id"), {"id": first})
+        db.execute(text("UPDATE messages SET reply_count = NULL WHERE id = :id"), {"id": second})
+        db.commit()
+
+        report = reconcileReplyCounts(engine, dryRun=True, batchSize=2)
+        assert (report.checked, report.drifted, report.totalDrift, report.fixed) == (4, 2, 3, 0)
+        assert report.samples == [(first, 5, 2), (second, None, 0)]
+
+        report = reconcileReplyCounts(engine, batchSize=2)
+        assert (report.drifted, report.fixed) == (2, 2)
+        counts = dict(db.execute(text("SELECT id, reply_count FROM messages")).all())
+        assert (counts[first], counts[second]) == (2, 0)
+        assert reconcileReplyCounts(engine).drifted == 0
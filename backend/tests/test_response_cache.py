@@ -0,0 +1,159 @@
+"""
+响应缓存测试
+"""
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from response_cache import DataVersionWatcher, ResponseCache, responseCache
+
+
+class TestResponseCacheUnit:
+    """缓存淘汰与失效测试"""
+
+    def test_evicts_by_total_bytes(self):
+        """测试超出字节上限时淘汰最久未使用的条目"""
+        cache = ResponseCache(maxBytes=10)
+        cache.set("a", b"aaaa", [], cache.generation)
+        cache.set("b", b"bbbb", [], cache.generation)
+        cache.get("a")
+        cache.set("c", b"cccc", [], cache.generation)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"aaaa"
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 8
+
+    def test_invalidate_by_tag(self):
+        """测试只失效带有对应标签的条目"""
+        cache = ResponseCache(maxBytes=1024)
+        cache.set("list", b"[1,2]", ["list", "msg:1", "msg:2"], cache.generation)
+        cache.set("replies:3", b"[4]", ["replies:3", "msg:4"], cache.generation)
+
+        cache.invalidateTags("msg:2")
+
+        assert cache.get("list") is None
+        assert cache.get("replies:3") == b"[4]"
+
+    def test_stale_result_not_cached(self):
+        """测试读取数据期间发生失效时不写入缓存"""
+        cache = ResponseCache(maxBytes=1024)
+        generation = cache.generation
+        cache.invalidateTags("msg:1")
+
+        assert not cache.set("list", b"[1]", ["list"], generation)
+        assert cache.get("list") is None
+
+
+class TestDataVersionWatcher:
+    """其他进程写入检测测试"""
+
+    def test_detects_other_connections(self, tmp_path):
+        """测试其他连接提交写事务后检测到变化,只读取不算变化"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+        watcher = DataVersionWatcher(engine)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (id INTEGER)"))
+
+        assert watcher.supported
+        assert watcher.changed()
+        assert not watcher.changed()
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM t")).all()
+        assert not watcher.changed()
+
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+        assert watcher.changed()
+        engine.dispose()
+
+    def test_local_commits_ignored(self, tmp_path):
+        """测试登记的引擎提交后不算变化,提交前其他连接的写入照常报告"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+        other = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+        with other.begin() as conn:
+            conn.execute(text("CREATE TABLE t (id INTEGER)"))
+        watcher = DataVersionWatcher(engine)
+        changes = []
+        watcher.ignoreLocalCommits(engine, lambda: changes.append(True))
+
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (0)"))
+        assert not watcher.changed()
+
+        with other.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (2)"))
+        assert changes == [True]
+        assert not watcher.changed()
+
+        with other.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (3)"))
+        assert watcher.changed()
+        engine.dispose()
+        other.dispose()
+
+    def test_memory_database_unsupported(self):
+        """测试内存数据库不支持检测"""
+        watcher = DataVersionWatcher(create_engine("sqlite://"))
+        assert not watcher.supported
+        assert not watcher.changed()
+
+    def test_external_write_changes_etag(self, client, clean_db, monkeypatch, tmp_path):
+        """测试其他进程写入后ETag变化,缓存的列表首页被清空"""
+        import main
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+        monkeypatch.setattr(main, "dataVersionWatcher", DataVersionWatcher(engine))
+        client.post("/messages/", json={"content": "留言"})
+        etag = client.get("/messages/").headers["ETag"]
+        assert client.get("/messages/", headers={"If-None-Match": etag}).status_code == 304
+
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (id INTEGER)"))
+        response = client.get("/messages/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        engine.dispose()
+
+    def test_local_write_keeps_other_entries(self, client, monkeypatch, tmp_path):
+        """测试本进程的点赞只失效相关条目,其他帖子缓存的回复仍然命中"""
+        import main
+        from database import Base
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'board.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine)
+        sessionFactory = sessionmaker(bind=engine, autoflush=False)
+
+        def overrideGetDb():
+            db = sessionFactory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        watcher = DataVersionWatcher(engine)
+        watcher.ignoreLocalCommits(engine, responseCache.clear)
+        monkeypatch.setattr(main, "dataVersionWatcher", watcher)
+        monkeypatch.setitem(main.app.dependency_overrides, main.getDb, overrideGetDb)
+
+        thread_a = client.post("/messages/", json={"content": "帖子A"}).json()["data"]["id"]
+        thread_b = client.post("/messages/", json={"content": "帖子B"}).json()["data"]["id"]
+        client.post("/messages/", json={"content": "回复A", "parent_id": thread_a})
+        client.get(f"/messages/{thread_a}/replies")
+
+        assert client.post(f"/messages/{thread_b}/like").status_code == 200
+        hits = responseCache.hits
+        client.get(f"/messages/{thread_a}/replies")
+        assert responseCache.hits == hits + 1
+
+        # 其他进程的写入仍然清空整个缓存
+        other = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+        with other.begin() as conn:
+            conn.execute(text("UPDATE messages SET like_count = like_count + 1"))
+        client.get(f"/messages/{thread_a}/replies")
+        assert responseCache.hits == hits + 1
+        other.dispose()
+        engine.dispose()
@@ -0,0 +1,111 @@
+"""
+全文搜索测试
+"""
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import search
+from database import Base
+from search import buildMatchQuery, tokenize
+
+
+class TestTokenize:
+    """分词测试"""
+
+    def test_cjk_bigrams(self):
+        """测试中文按二元组切分,每段末字单独成词,英文转小写"""
+        assert tokenize("今天天气好 OK, hello世界!") == "今天 天天 天气 气好 好 ok hello 世界 界"
+        assert tokenize("") == ""
+
+    def test_match_query_is_literal(self):
+        """测试关键词中的FTS5语法不会生效"""
+        assert buildMatchQuery("天气 好") == '"天气" AND "好" *'
+        assert buildMatchQuery('a" OR b*') == '"a" AND "or" AND "b"'
+        assert buildMatchQuery("!!! ...") is None
+
+
+class TestSearchEndpoint:
+    """搜索接口测试"""
+
+    def test_search_chinese(self, client: TestClient, clean_db):
+        """测试中文关键词匹配留言和回复,不匹配的留言不返回"""
+        parent = client.post("/messages/", json={"content": "今天天气真好"}).json()["data"]
+        client.post("/messages/", json={"content": "天气预报说明天下雨", "parent_id": parent["id"]})
+        client.post("/messages/", json={"content": "晚饭吃什么"})
+
+        contents = {item["content"] for item in client.get("/messages/search?q=天气").json()["data"]}
+        assert contents == {"今天天气真好", "天气预报说明天下雨"}
+
+        contents = [item["content"] for item in client.get("/messages/search?q=雨").json()["data"]]
+        assert contents == ["天气预报说明天下雨"]
+        assert client.get("/messages/search?q=天气 晚饭").json()["data"] == []
+
+    def test_results_hide_ip(self, client: TestClient, clean_db):
+        """测试搜索结果不包含IP地址"""
+        client.post("/messages/", json={"content": "树洞"})
+        item = client.get("/messages/search?q=树洞").json()["data"][0]
+        assert "ip_address" not in item
+
+    def test_cursor_pagination(self, client: TestClient, clean_db):
+        """测试游标翻页不重复、不遗漏"""
+        for i in range(5):
+            client.post("/messages/", json={"content": f"树洞第{i}条 " + "树洞" * i})
+
+        seen, cursor = [], None
+        while True:
+            params = {"q": "树洞", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            body = client.get("/messages/search", params=params).json()
+            seen.extend(item["id"] for item in body["data"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+
+    def test_pagination_excludes_later_inserts(self, client: TestClient, clean_db):
+        """测试两次翻页之间发表的新留言不会出现在后面的页中"""
+        ids = [client.post("/messages/", json={"content": f"树洞第{i}条 " + "树洞" * i}).json()["data"]["id"]
+               for i in range(6)]
+
+        first = client.get("/messages/search", params={"q": "树洞", "limit": 3}).json()
+        # 新留言的相关度最高,并且改变了所有留言的 bm25 分数
+        for _ in range(3):
+            client.post("/messages/", json={"content": "树洞" * 10})
+        second = client.get("/messages/search", params={"q": "树洞", "limit": 3, "cursor": first["next_cursor"]}).json()
+
+        seen = [item["id"] for item in first["data"] + second["data"]]
+        assert sorted(seen) == ids
+        assert second["next_cursor"] is None or not client.get(
+            "/messages/search", params={"q": "树洞", "limit": 3, "cursor": second["next_cursor"]}
+        ).json()["data"]
+
+    def test_invalid_input(self, client: TestClient, clean_db):
+        """测试空关键词、过长关键词和无效游标"""
+        assert client.get("/messages/search?q=%20!").status_code == 400
+        assert client.get("/messages/search", params={"q": "长" * 200}).status_code == 400
+        assert client.get("/messages/search?q=树洞&cursor=bad").status_code == 400
+
+
+class TestBackfill:
+    """补建索引测试"""
+
+    def test_backfill_existing_rows(self, tmp_path):
+        """测试为没有索引的已有留言补建索引,重复执行不会重复建立"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO messages (content, like_count, dislike_count, reply_count) "
+                              "VALUES ('旧的留言', 0, 0, 0), ('另一条', 0, 0, 0)"))
+
+        assert search.backfill(engine, batchSize=1) == 2
+        assert search.backfill(engine) == 0
+
+        with engine.connect() as conn:
+            statement, params = search.searchStatement(buildMatchQuery("旧的"), 10)
+            results = search.toResults(conn.execute(statement, params))
+        assert [row.content for row, _ in results] == ["旧的留言"]
+        assert search.backfill(engine, rebuild=True) == 2
@@ -0,0 +1,110 @@
+"""
+响应序列化测试
+"""
+
+import datetime
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import models
+import schemas
+import serializers
+
+
+def makeMessage(messageId: int, **fields) -> models.Message:
+    values = dict(
+        id=messageId,
+        content="树洞留言<内容>",
+        timestamp=datetime.datetime(2025, 12, 30, 10, 30, 0, 123456),
+        like_count=3,
+        dislike_count=1,
+        reply_count=0,
+        parent_id=None,
+        ip_address="1.2.3.4",
+        location=None,
+    )
+    values.update(fields)
+    return models.Message(**values)
+
+
+class TestEncodeResponse:
+    """各编码后端的输出一致性测试"""
+
+    @pytest.mark.parametrize("backend", ["pydantic", "json", "orjson"])
+    def test_backends_match_generic_encoder(self, backend):
+        """测试各后端与通用编码方式输出相同的JSON"""
+        if backend == "orjson":
+            pytest.importorskip("orjson")
+        dumps = serializers.getEncoder(backend)
+        messages = [makeMessage(1), makeMessage(2, parent_id=1, timestamp=datetime.datetime(2025, 1, 1))]
+        data = {"items": messages, 7: [messages[1]]}
+
+        content = {"code": 0, "message": "success", "data": serializers.toSerializable(data), "next_cursor": None}
+        expected = {
+            "code": 0,
+            "message": "success",
+            "data": {
+                "items": [serializers.messageToDict(item) for item in messages],
+                "7": [serializers.messageToDict(messages[1])],
+            },
+            "next_cursor": None,
+        }
+        for item in expected["data"]["items"] + expected["data"]["7"]:
+            item["timestamp"] = item["timestamp"].isoformat()
+
+        assert json.loads(dumps(content)) == expected
+
+    def test_schema_adapters_match_default_encoder(self):
+        """测试按留言结构预先编译的编码器与 jsonable_encoder 的默认输出相同"""
+        messages = [makeMessage(1, reply_count=1), makeMessage(2, parent_id=1, location="北京市")]
+        threads = [{**serializers.messageToDict(messages[0]), "replies": [messages[1]]}]
+        shapes = [
+            (messages[0], {}),
+            (messages, {"next_cursor": "bzoy"}),
+            ([], {"next_cursor": None}),
+            (threads, {"next_cursor": None}),
+            ({1: [messages[1]], 5: []}, {"next_cursors": {1: "bzoy", 5: None}}),
+        ]
+        dumpsPydantic = serializers.getEncoder("pydantic")
+        dumpsJson = serializers.getEncoder("json")
+
+        def public(data):
+            # FastAPI 默认的编码方式: 按 response_model 校验后交给 jsonable_encoder
+            if isinstance(data, models.Message):
+                return schemas.PublicMessage.model_validate(data)
+            if isinstance(data, list):
+                return [public(item) for item in data]
+            if isinstance(data, dict):
+                return {key: public(value) for key, value in data.items()}
+            return data
+
+        for data, extra in shapes:
+            content = {"code": 0, "message": "success", "data": serializers.toSerializable(data), **extra}
+            assert serializers.envelopeAdapter(content) is not None
+            expected = jsonable_encoder({"code": 0, "message": "success", "data": public(data), **extra})
+            assert json.loads(dumpsPydantic(content)) == json.loads(json.dumps(expected))
+            assert dumpsPydantic(content) == dumpsJson(content)
+
+    def test_other_data_uses_generic_adapter(self):
+        """测试统计信息等非留言数据和未知的顶层字段使用通用编码器"""
+        stats = {"code": 0, "message": "success", "data": {"hits": 3, "hit_rate": 0.5}}
+        assert serializers.envelopeAdapter(stats) is None
+        extra = {"code": 0, "message": "success", "data": [], "total": 3}
+        assert serializers.envelopeAdapter(extra) is None
+        assert json.loads(serializers.getEncoder("pydantic")(extra)) == extra
+
+    def test_message_fields_follow_schema(self):
+        """测试留言按公开字段编码,不包含IP地址"""
+        encoded = json.loads(serializers.encodeResponse(makeMessage(1)))
+
+        assert encoded["code"] == 0
+        assert set(encoded["data"]) == set(serializers.MESSAGE_FIELDS)
+        assert "ip_address" not in encoded["data"]
+        assert encoded["data"]["timestamp"] == "2025-12-30T10:30:00.123456"
+
+    def test_unknown_backend(self):
+        """测试未知后端名称抛出异常"""
+        with pytest.raises(ValueError):
+            serializers.getEncoder("yaml")
@@ -0,0 +1,47 @@
+"""
+票数聚合测试
+"""
+
+import crud
+import models
+import schemas
+from vote_buffer import VoteBuffer
+from tests.conftest import TestingSessionLocal
+
+
+class TestVoteBuffer:
+    """buffered 模式测试"""
+
+    def test_votes_flushed_in_batch(self, clean_db, monkeypatch):
+        """测试票数先累积在内存中,刷新后一次写入"""
+        message = crud.createMessage(clean_db, schemas.MessageCreate(content="热门留言"))
+        buffer = VoteBuffer(sessionFactory=TestingSessionLocal, flushIntervalMs=60000)
+        monkeypatch.setitem(crud.VOTE_CONFIG, "mode", "buffered")
+        monkeypatch.setattr(crud, "voteBuffer", buffer)
+        flushed = []
+        buffer.addFlushListener(flushed.extend)
+
+        for _ in range(5):
+            result = crud.likeMessage(clean_db, message.id)
+        crud.dislikeMessage(clean_db, message.id)
+
+        # 响应中的计数包含未写入的票数,数据库中尚未变化
+        assert result.like_count == 5
+        clean_db.expire_all()
+        assert clean_db.get(models.Message, message.id).like_count == 0
+
+        assert buffer.flush() == 1
+        clean_db.expire_all()
+        stored = clean_db.get(models.Message, message.id)
+        assert (stored.like_count, stored.dislike_count) == (5, 1)
+        assert flushed == [message.id]
+        assert buffer.pending(message.id) == (0, 0)
+
+    def test_buffered_vote_on_missing_message(self, clean_db, monkeypatch):
+        """测试不存在的留言不会进入缓冲"""
+        buffer = VoteBuffer(sessionFactory=TestingSessionLocal, flushIntervalMs=60000)
+        monkeypatch.setitem(crud.VOTE_CONFIG, "mode", "buffered")
+        monkeypatch.setattr(crud, "voteBuffer", buffer)
+
+        assert crud.likeMessage(clean_db, 99999) is None
+        assert buffer.getStats()["pending_messages"] == 0
@@ -0,0 +1,160 @@
+"""
+投票去重测试
+"""
+
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+import models
+from config import PROXY_CONFIG
+from response_cache import responseCache
+from tests.conftest import TestingSessionLocal
+from vote_dedup import BloomFilter, VoteDeduplicator
+
+
+def vote(dedup: VoteDeduplicator, clientIp: str, messageId: int, voteType: str) -> bool:
+    """按接口的顺序占用并确认一次投票,首次投票返回True"""
+    if not dedup.reserve(clientIp, messageId, voteType):
+        return False
+    dedup.confirm(clientIp, messageId, voteType)
+    return True
+
+
+class TestBloomFilter:
+    """布隆过滤器测试"""
+
+    def test_sizing_follows_false_positive_rate(self):
+        """测试误判率越低,同样内存下容量越小"""
+        loose = BloomFilter(1024, 0.01)
+        strict = BloomFilter(1024, 0.0001)
+
+        assert loose.bitCount == strict.bitCount == 8192
+        assert strict.capacity < loose.capacity
+        assert strict.hashCount > loose.hashCount
+
+    def test_false_positive_rate_within_capacity(self):
+        """测试写满容量时误判率接近配置值"""
+        bloom = BloomFilter(4096, 0.01)
+        for i in range(bloom.capacity):
+            bloom.add(bloom.positions(f"in-{i}".encode()))
+
+        falsePositives = sum(bloom.contains(bloom.positions(f"out-{i}".encode())) for i in range(10000))
+        assert falsePositives / 10000 < 0.02
+
+
+class TestVoteDeduplicator:
+    """轮换去重测试"""
+
+    def test_rejects_duplicates_within_window(self, clock):
+        """测试窗口内重复投票被拒绝,不同类型和不同留言互不影响"""
+        dedup = VoteDeduplicator(windowSeconds=60, maxBytes=4096, falsePositiveRate=0.001, clock=clock)
+
+        assert vote(dedup, "1.1.1.1", 1, "like")
+        assert not vote(dedup, "1.1.1.1", 1, "like")
+        assert vote(dedup, "1.1.1.1", 1, "dislike")
+        assert vote(dedup, "1.1.1.1", 2, "like")
+        assert vote(dedup, "2.2.2.2", 1, "like")
+        assert dedup.stats()["rejected"] == 1
+
+    def test_forgets_after_two_windows(self, clock):
+        """测试记录至少保留一个窗口,两个窗口后被遗忘"""
+        dedup = VoteDeduplicator(windowSeconds=60, maxBytes=4096, falsePositiveRate=0.001, clock=clock)
+        vote(dedup, "1.1.1.1", 1, "like")
+
+        clock.now = 90
+        assert not vote(dedup, "1.1.1.1", 1, "like")
+        clock.now = 151
+        assert vote(dedup, "1.1.1.1", 1, "like")
+
+    def test_pending_vote_blocks_duplicates_until_released(self, clock):
+        """测试占用中的投票拒绝重复请求,释放后可以重试且不计入放行次数"""
+        dedup = VoteDeduplicator(windowSeconds=60, maxBytes=4096, falsePositiveRate=0.001, clock=clock)
+
+        assert dedup.reserve("1.1.1.1", 1, "like")
+        assert not dedup.reserve("1.1.1.1", 1, "like")
+        dedup.release("1.1.1.1", 1, "like")
+        assert dedup.stats()["pending"] == 0
+        assert dedup.stats()["accepted"] == 0
+
+        assert vote(dedup, "1.1.1.1", 1, "like")
+        assert dedup.stats()["pending"] == 0
+        assert not vote(dedup, "1.1.1.1", 1, "like")
+
+    def test_rotates_early_when_full(self, clock):
+        """测试写满容量时提前轮换"""
+        dedup = VoteDeduplicator(windowSeconds=3600, maxBytes=64, falsePositiveRate=0.01, clock=clock)
+        capacity = dedup.stats()["capacity"]
+        for i in range(capacity + 1):
+            vote(dedup, "1.1.1.1", i, "like")
+
+        assert dedup.stats()["rotations"] == 1
+        assert dedup.stats()["memory_bytes"] == 64
+
+
+class TestDuplicateVoteEndpoint:
+    """接口去重测试"""
+
+    def test_duplicate_like_returns_409(self, client: TestClient, clean_db, monkeypatch):
+        """测试同一IP重复点赞返回409且计数不变"""
+        monkeypatch.setattr(main, "voteDeduplicator", VoteDeduplicator(3600, 4096, 0.001))
+        monkeypatch.setitem(PROXY_CONFIG, "trusted_proxy_count", 1)
+        message_id = client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+        headers = {"X-Forwarded-For": "8.8.8.8"}
+
+        assert client.post(f"/messages/{message_id}/like", headers=headers).status_code == 200
+        assert client.post(f"/messages/{message_id}/like", headers=headers).status_code == 409
+        assert client.post(f"/messages/{message_id}/dislike", headers=headers).status_code == 200
+        assert client.post(f"/messages/{message_id}/like", headers={"X-Forwarded-For": "9.9.9.9"}).status_code == 200
+
+        data = client.get(f"/messages/{message_id}").json()["data"]
+        assert data["like_count"] == 2
+        assert data["dislike_count"] == 1
+
+    def test_failed_vote_not_recorded(self, client: TestClient, clean_db, monkeypatch):
+        """测试不存在的留言返回404且不记录投票,重试和伪造的 X-Forwarded-For 前缀都按同一IP去重"""
+        monkeypatch.setattr(main, "voteDeduplicator", VoteDeduplicator(3600, 4096, 0.001))
+        monkeypatch.setitem(PROXY_CONFIG, "trusted_proxy_count", 1)
+
+        assert client.post("/messages/99999/like").status_code == 404
+        assert client.post("/messages/99999/like").status_code == 404
+
+        message_id = client.post("/messages/", json={"content": "留言"}).json()["data"]["id"]
+        assert client.post(f"/messages/{message_id}/like", headers={"X-Forwarded-For": "8.8.8.8"}).status_code == 200
+        spoofed = {"X-Forwarded-For": "10.0.0.1, 8.8.8.8"}
+        assert client.post(f"/messages/{message_id}/like", headers=spoofed).status_code == 409
+        assert client.get(f"/messages/{message_id}").json()["data"]["like_count"] == 1
+
+    def test_concurrent_duplicate_likes(self, clean_db, monkeypatch):
+        """测试同一IP并发重复点赞只有一次生效"""
+        monkeypatch.setattr(main, "voteDeduplicator", VoteDeduplicator(3600, 4096, 0.001))
+        monkeypatch.setitem(PROXY_CONFIG, "trusted_proxy_count", 1)
+        message = models.Message(content="留言")
+        clean_db.add(message)
+        clean_db.commit()
+        message_id = message.id
+
+        def sessionPerRequest():
+            session = TestingSessionLocal()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        async def likeConcurrently():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                responses = await asyncio.gather(*[
+                    client.post(f"/messages/{message_id}/like", headers={"X-Forwarded-For": "8.8.8.8"})
+                    for _ in range(20)
+                ])
+            return sorted(response.status_code for response in responses)
+
+        monkeypatch.setitem(main.app.dependency_overrides, main.getDb, sessionPerRequest)
+        responseCache.clear()
+        assert asyncio.run(likeConcurrently()) == [200] + [409] * 19
+
+        clean_db.expire_all()
+        assert clean_db.get(models.Message, message_id).like_count == 1
@@ -3,6 +3,7 @@
 """
 import re
 import html
+import base64
 
 
 def sanitize_html(content: str) -> str:
@@ -59,3 +60,122 @@ def validate_content(content: str) -> tuple[bool, str]:
             return False, "内容包含不允许的字符"
 
     return True, ""
+
+
+def encode_cursor(message_id: int) -> str:
+    """
+    将留言ID编码为不透明的分页游标
+
+    游标只是对ID的简单封装,客户端不应解析其内容,
+    原样回传给 before_id / after_id 参数即可
+
+    Args:
+        message_id (int): 留言ID
+
+    Returns:
+        str: URL安全的游标字符串
+    """
+    raw = f"m:{message_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    解析分页游标,还原出留言ID
+
+    Args:
+        cursor (str): encode_cursor 生成的游标
+
+    Returns:
+        int: 留言ID
+
+    Raises:
+        ValueError: 当游标格式无效时
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+        prefix, _, value = raw.partition(":")
+        if prefix != "m" or not value.isdigit():
+            raise ValueError(cursor)
+        return int(value)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("无效的分页游标") from e
+
+
+def encode_score_cursor(score: float, message_id: int) -> str:
+    """
+    将按分数排序的结果(搜索相关度、热度)的分数和留言ID编码为分页游标
+
+    Args:
+        score (float): 本页最后一条结果的分数
+        message_id (int): 本页最后一条结果的留言ID
+
+    Returns:
+        str: URL安全的游标字符串
+    """
+    raw = f"s:{score!r}:{message_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_score_cursor(cursor: str) -> tuple:
+    """
+    解析按分数排序的分页游标
+
+    Args:
+        cursor (str): encode_score_cursor 生成的游标
+
+    Returns:
+        tuple: (分数, 留言ID)
+
+    Raises:
+        ValueError: 当游标格式无效时
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+        prefix, score, messageId = raw.split(":")
+        if prefix != "s" or not messageId.isdigit():
+            raise ValueError(cursor)
+        return float(score), int(messageId)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("无效的分页游标") from e
+
+
+def encode_snapshot_cursor(snapshot_id: int, offset: int) -> str:
+    """
+    将快照ID和偏移量编码为分页游标(用于分数会随新数据变化的搜索结果)
+
+    Args:
+        snapshot_id (int): 第一页时的最大留言ID,后续页只包含不大于该ID的留言
+        offset (int): 下一页在快照结果中的起始位置
+
+    Returns:
+        str: URL安全的游标字符串
+    """
+    raw = f"o:{snapshot_id}:{offset}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_snapshot_cursor(cursor: str) -> tuple:
+    """
+    解析快照分页游标
+
+    Args:
+        cursor (str): encode_snapshot_cursor 生成的游标
+
+    Returns:
+        tuple: (快照ID, 偏移量)
+
+    Raises:
+        ValueError: 当游标格式无效时
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+        prefix, snapshotId, offset = raw.split(":")
+        if prefix != "o" or not snapshotId.isdigit() or not offset.isdigit():
+            raise ValueError(cursor)
+        return int(snapshotId), int(offset)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("无效的分页游标") from e
@@ -0,0 +1,188 @@
+"""
+点赞/点踩聚合缓冲
+
+VOTE_CONFIG["mode"] 为 buffered 时,点赞和点踩不再逐条提交,
+而是先在内存中按留言累加,由后台线程每隔 flush_interval_ms 毫秒
+在一个事务里批量执行 like_count = like_count + N 的更新
+
+热门留言每分钟上千次点击只会变成每个刷新周期一条UPDATE;
+代价是进程异常退出时最多丢失一个刷新周期内的票数
+"""
+
+import atexit
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import bindparam, update
+
+import models
+from config import VOTE_CONFIG
+from database import SessionLocal
+from logger import setupLogger, logError, logInfo
+
+logger = setupLogger("vote_buffer")
+
+_messages = models.Message.__table__
+
+# 批量更新语句,配合参数列表以 executemany 方式执行
+_flushStatement = (
+    update(_messages)
+    .where(_messages.c.id == bindparam("message_id"))
+    .values(
+        like_count=_messages.c.like_count + bindparam("likes"),
+        dislike_count=_messages.c.dislike_count + bindparam("dislikes"),
+    )
+)
+
+
+class VoteBuffer:
+    """
+    按留言聚合票数的内存缓冲
+
+    Attributes:
+        flushIntervalMs (int): 刷新间隔(毫秒)
+    """
+
+    def __init__(self, sessionFactory: Callable = SessionLocal, flushIntervalMs: int = VOTE_CONFIG["flush_interval_ms"]):
+        self.sessionFactory = sessionFactory
+        self.flushIntervalMs = flushIntervalMs
+        self._pending: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._thread = None
+        self._stopEvent = threading.Event()
+        self._flushListeners: List[Callable[[List[int]], None]] = []
+
+        self.flushes = 0
+        self.flushedRows = 0
+        self.failedFlushes = 0
+
+    def add(self, messageId: int, likes: int = 0, dislikes: int = 0):
+        """
+        累加票数,首次调用时启动刷新线程
+
+        Args:
+            messageId (int): 留言ID
+            likes (int): 增加的点赞数
+            dislikes (int): 增加的点踩数
+        """
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            counts = self._pending.setdefault(messageId, [0, 0])
+            counts[0] += likes
+            counts[1] += dislikes
+
+    def pending(self, messageId: int) -> Tuple[int, int]:
+        """
+        获取尚未写入数据库的票数
+
+        Args:
+            messageId (int): 留言ID
+
+        Returns:
+            Tuple[int, int]: (点赞数, 点踩数)
+        """
+        with self._lock:
+            likes, dislikes = self._pending.get(messageId, (0, 0))
+            return likes, dislikes
+
+    def addFlushListener(self, listener: Callable[[List[int]], None]):
+        """
+        注册刷新回调,每次成功写入后以本次更新的留言ID列表调用
+
+        Args:
+            listener (Callable[[List[int]], None]): 回调函数
+        """
+        self._flushListeners.append(listener)
+
+    def flush(self) -> int:
+        """
+        把缓冲中的票数在一个事务内写入数据库
+
+        写入失败时票数会合并回缓冲,等待下一次刷新
+
+        Returns:
+            int: 本次更新的留言数
+        """
+        with self._flushLock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            params = [
+                {"message_id": messageId, "likes": likes, "dislikes": dislikes}
+                for messageId, (likes, dislikes) in batch.items()
+            ]
+            db = self.sessionFactory()
+            try:
+                db.execute(_flushStatement, params)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self.failedFlushes += 1
+                logError(logger, e, f"批量写入票数失败,{len(batch)} 条留言等待重试")
+                with self._lock:
+                    for messageId, (likes, dislikes) in batch.items():
+                        counts = self._pending.setdefault(messageId, [0, 0])
+                        counts[0] += likes
+                        counts[1] += dislikes
+                return 0
+            finally:
+                db.close()
+
+            self.flushes += 1
+            self.flushedRows += len(batch)
+
+        messageIds = list(batch)
+        for listener in self._flushListeners:
+            try:
+                listener(messageIds)
+            except Exception as e:
+                logError(logger, e, "票数刷新回调失败")
+        return len(batch)
+
+    def start(self):
+        """
+        启动后台刷新线程(重复调用无副作用)
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="vote-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        logInfo(logger, f"票数聚合已启用,刷新间隔: {self.flushIntervalMs}ms")
+
+    def stop(self):
+        """
+        停止刷新线程并写入剩余票数
+        """
+        self._stopEvent.set()
+        self.flush()
+
+    def getStats(self) -> dict:
+        """
+        获取缓冲统计
+
+        Returns:
+            dict: 待写入留言数、刷新次数、写入行数、失败次数
+        """
+        with self._lock:
+            pendingMessages = len(self._pending)
+        return {
+            "pending_messages": pendingMessages,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushedRows,
+            "failed_flushes": self.failedFlushes,
+        }
+
+    def _run(self):
+        interval = self.flushIntervalMs / 1000
+        while not self._stopEvent.wait(interval):
+            self.flush()
+
+
+# 全局实例,仅在 buffered 模式下由 crud 使用
+voteBuffer = VoteBuffer()
@@ -0,0 +1,196 @@
+"""
+点赞/点踩去重
+
+同一客户端IP在去重窗口内对同一留言重复点赞(或重复点踩)时,直接在内存中拒绝,
+不查询也不写入数据库
+
+使用一对轮换的布隆过滤器记录 (IP, 留言ID, 投票类型):
+- 查询时同时检查当前和上一个过滤器,新记录只写入当前过滤器
+- 接口先用 reserve 在锁内检查并占用该投票(记入进行中的集合),同一投票的并发请求只有一个能占用;
+  写入数据库成功后用 confirm 记入过滤器,留言不存在或写入失败时用 release 释放,
+  不会留下记录,重试不会被误判为重复投票
+- 每经过一个窗口,丢弃上一个过滤器,当前过滤器变为上一个,再新建一个空的当前过滤器,
+  因此一条记录至少被记住一个窗口、最多两个窗口
+- 当前过滤器写入的记录数达到容量时提前轮换,误判率不会超过配置值;
+  代价是投票量特别大时实际窗口会缩短
+
+过滤器大小由内存上限和误判率决定: 每个过滤器占内存上限的一半,
+容量 n = m * ln2² / -ln(p),其中 m 为位数, p 为误判率。
+误判会把少量首次投票当成重复投票拒绝,但不会放过重复投票
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Callable, Set
+
+from config import VOTE_CONFIG
+
+
+class BloomFilter:
+    """
+    定长布隆过滤器
+
+    Attributes:
+        bitCount (int): 位数
+        hashCount (int): 每条记录设置的位数
+        capacity (int): 保证误判率的最大记录数
+        count (int): 已写入的记录数
+    """
+
+    def __init__(self, maxBytes: int, falsePositiveRate: float):
+        self.bitCount = max(maxBytes, 1) * 8
+        self.capacity = max(1, int(self.bitCount * math.log(2) ** 2 / -math.log(falsePositiveRate)))
+        self.hashCount = max(1, round(self.bitCount / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(self.bitCount // 8)
+
+    def positions(self, key: bytes):
+        """
+        计算记录对应的位位置(双重哈希)
+
+        Args:
+            key (bytes): 记录
+
+        Returns:
+            List[int]: 位位置
+        """
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bitCount for i in range(self.hashCount)]
+
+    def contains(self, positions) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions):
+        bits = self._bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class VoteDeduplicator:
+    """
+    轮换布隆过滤器实现的投票去重
+
+    Attributes:
+        windowSeconds (int): 去重窗口(秒)
+        maxBytes (int): 两个过滤器合计的内存上限(字节)
+        falsePositiveRate (float): 单个过滤器在容量内的误判率
+    """
+
+    def __init__(self, windowSeconds: int, maxBytes: int, falsePositiveRate: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.windowSeconds = windowSeconds
+        self.maxBytes = maxBytes
+        self.falsePositiveRate = falsePositiveRate
+        self._clock = clock
+        self._current = self._newFilter()
+        self._previous = self._newFilter()
+        self._rotatedAt = clock()
+        self._lock = threading.Lock()
+        # 已占用、尚未写入数据库的投票
+        self._pending: Set[bytes] = set()
+
+        self.accepted = 0
+        self.rejected = 0
+        self.rotations = 0
+
+    def reserve(self, clientIp: str, messageId: int, voteType: str) -> bool:
+        """
+        检查并占用一次投票,窗口内已记录或正在处理的同一投票计入拒绝次数
+
+        Args:
+            clientIp (str): 客户端IP
+            messageId (int): 留言ID
+            voteType (str): like / dislike
+
+        Returns:
+            bool: 占用成功返回True,重复投票返回False
+        """
+        key = self._key(clientIp, messageId, voteType)
+        positions = self._current.positions(key)
+        with self._lock:
+            self._rotateIfDue()
+            if key in self._pending or self._current.contains(positions) or self._previous.contains(positions):
+                self.rejected += 1
+                return False
+            self._pending.add(key)
+            return True
+
+    def confirm(self, clientIp: str, messageId: int, voteType: str):
+        """
+        投票写入成功后把占用转为记录
+
+        Args:
+            clientIp (str): 客户端IP
+            messageId (int): 留言ID
+            voteType (str): like / dislike
+        """
+        key = self._key(clientIp, messageId, voteType)
+        positions = self._current.positions(key)
+        with self._lock:
+            self._pending.discard(key)
+            self._rotateIfDue()
+            self._current.add(positions)
+            self.accepted += 1
+
+    def release(self, clientIp: str, messageId: int, voteType: str):
+        """
+        投票失败时释放占用,不留下记录
+
+        Args:
+            clientIp (str): 客户端IP
+            messageId (int): 留言ID
+            voteType (str): like / dislike
+        """
+        with self._lock:
+            self._pending.discard(self._key(clientIp, messageId, voteType))
+
+    def stats(self) -> dict:
+        """
+        获取去重统计
+
+        Returns:
+            dict: 放行和拒绝次数、轮换次数、进行中的投票数、当前过滤器的记录数和容量
+        """
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "rotations": self.rotations,
+                "pending": len(self._pending),
+                "current_count": self._current.count,
+                "capacity": self._current.capacity,
+                "memory_bytes": len(self._current._bits) + len(self._previous._bits),
+            }
+
+    def _newFilter(self) -> BloomFilter:
+        return BloomFilter(self.maxBytes // 2, self.falsePositiveRate)
+
+    def _key(self, clientIp: str, messageId: int, voteType: str) -> bytes:
+        return f"{clientIp}|{messageId}|{voteType}".encode("utf-8")
+
+    def _rotateIfDue(self):
+        # 调用方需持有锁
+        now = self._clock()
+        if now - self._rotatedAt >= self.windowSeconds or self._current.count >= self._current.capacity:
+            self._rotate(now)
+
+    def _rotate(self, now: float):
+        # 调用方需持有锁
+        self._previous = self._current
+        self._current = self._newFilter()
+        self._rotatedAt = now
+        self.rotations += 1
+
+
+# 全局实例,关闭去重时为None
+voteDeduplicator = VoteDeduplicator(
+    VOTE_CONFIG["dedup_window_seconds"],
+    VOTE_CONFIG["dedup_max_bytes"],
+    VOTE_CONFIG["dedup_false_positive_rate"],
+) if VOTE_CONFIG["dedup_enabled"] else None
@@ -72,6 +72,7 @@ DATABASE_URL=sqlite:///./treehole.db
 MAX_CONTENT_LENGTH=140
 DEFAULT_PAGE_SIZE=20
 MAX_PAGE_SIZE=100
+TRUSTED_PROXY_COUNT=1
 EOF
     echo "请编辑 deploy/production.env 配置你的域名"
 fi
@@ -72,6 +72,7 @@ DATABASE_URL=sqlite:///./treehole.db
 MAX_CONTENT_LENGTH=140
 DEFAULT_PAGE_SIZE=20
 MAX_PAGE_SIZE=100
+TRUSTED_PROXY_COUNT=1
 EOF
 
 # 安装后端依赖